@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 
 import os
+import tempfile
 from pathlib import Path
 
 
@@ -32,8 +33,12 @@ ALLOWED_HOSTS = ['.vercel.app', 'localhost', '127.0.0.1','silent-tables-play.loc
 
 # Application definition
 
+# Lean boot for serverless cold starts (see myapi/startup.py): admin models
+# are discovered on the first /admin/ request instead of at startup.
+LEAN_BOOT = os.environ.get('LEAN_BOOT', '1' if os.environ.get('VERCEL') else '') in ('1', 'true', 'yes')
+
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'django.contrib.admin.apps.SimpleAdminConfig' if LEAN_BOOT else 'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -52,6 +57,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'myapi.routers.ReplicaPinningMiddleware',
 ]
 
 ROOT_URLCONF = 'lyriclib.urls'
@@ -78,13 +84,67 @@ WSGI_APPLICATION = 'lyriclib.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds (0 closes them after
+# every request) and health-checked before reuse.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: a comma separated list of SQLite files, e.g.
+# DATABASE_REPLICAS=replica1.sqlite3,replica2.sqlite3, refreshed from the
+# primary with `manage.py sync_sqlite_replicas`. See myapi/routers.py
+REPLICA_DATABASES = []
+for number, path in enumerate(filter(None, os.environ.get('DATABASE_REPLICAS', '').split(',')), start=1):
+    REPLICA_DATABASES.append(f'replica_{number}')
+    DATABASES[f'replica_{number}'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / path.strip(),
+        'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {'MIRROR': 'default'},
+    }
+
+# SQLite production profile: WAL and tuned pragmas on every connection, and
+# reaction/comment writes serialized through a retrying queue (myapi/sqlite.py)
+SQLITE_PRODUCTION = os.environ.get('SQLITE_PRODUCTION', '') in ('1', 'true', 'yes')
+if SQLITE_PRODUCTION:
+    for database in DATABASES.values():
+        # seconds a connection waits on a lock before "database is locked"
+        database['OPTIONS'] = {'timeout': 20}
+
+DATABASE_ROUTERS = ['myapi.routers.PrimaryReplicaRouter']
+# how long a user reads from the primary after a write
+REPLICA_LAG_SECONDS = int(os.environ.get('REPLICA_LAG_SECONDS', 5))
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.0/topics/cache/
+# 'responses' holds serialized song data (myapi/cache.py). Point it at
+# django.core.cache.backends.filebased.FileBasedCache or
+# django.core.cache.backends.redis.RedisCache with the env vars below.
+
+RESPONSE_CACHE_BACKEND = os.environ.get('RESPONSE_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'responses': {
+        'BACKEND': RESPONSE_CACHE_BACKEND,
+        'LOCATION': os.environ.get('RESPONSE_CACHE_LOCATION', 'responses'),
+        'TIMEOUT': 60 * 60,
+    },
+}
+if 'redis' not in RESPONSE_CACHE_BACKEND:
+    CACHES['responses']['OPTIONS'] = {'MAX_ENTRIES': 10000}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -129,6 +189,17 @@ STATICFILES_DIRS = [
     # Add other paths here if you have static files in different directories
 ]
 
+# Uploaded media (profile images, see myapi/images.py), served from
+# MEDIA_URL. Uploads are streamed to a temporary file, never held in memory.
+# A MEDIA_ROOT of your own needs a copy of media/profile_pics/default.jpg.
+MEDIA_ROOT = Path(os.environ.get('MEDIA_ROOT', BASE_DIR / 'media'))
+MEDIA_URL = '/media/'
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
+
+# OpenAPI document written by `manage.py generate_schema` at deploy time (not
+# committed), see myapi/schema.py
+SCHEMA_DIR = BASE_DIR / 'static' / 'schema'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -149,4 +220,28 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
-}
\ No newline at end of file
+    'DEFAULT_PAGINATION_CLASS': 'myapi.pagination.KeysetPagination',
+    'PAGE_SIZE': 20,
+}
+
+# Lyric search backend: 'auto' uses SQLite FTS5 when the table exists,
+# 'fts5' or 'inverted' force one of them (see myapi/search.py)
+LYRIC_SEARCH_BACKEND = os.environ.get('LYRIC_SEARCH_BACKEND', 'auto')
+
+# Home feed strategy: 'read' merges followed authors' songs per request,
+# 'write' materializes a FeedEntry row per follower when a song is created
+# (run `manage.py rebuild_feeds` after switching to it). See myapi/feed.py
+FEED_STRATEGY = os.environ.get('FEED_STRATEGY', 'read')
+
+# Trending scores are buffered in memory and written to TrendingScore at most
+# this many seconds apart (0 writes every event through). See myapi/trending.py
+TRENDING_CHECKPOINT_INTERVAL = float(os.environ.get('TRENDING_CHECKPOINT_INTERVAL', 10))
+
+# Background tasks (myapi/taskqueue.py): worker threads per web process, 0
+# leaves every job to `manage.py run_task_workers`. TASK_QUEUE_EAGER runs
+# tasks inline when they are queued (the test suite turns it on).
+# Uploads handed to a task are staged in TASK_STAGING_DIR, which dedicated
+# workers must share with the web processes.
+TASK_QUEUE_WORKERS = int(os.environ.get('TASK_QUEUE_WORKERS', 2))
+TASK_QUEUE_EAGER = os.environ.get('TASK_QUEUE_EAGER', '') in ('1', 'true', 'yes')
+TASK_STAGING_DIR = Path(os.environ.get('TASK_STAGING_DIR', Path(tempfile.gettempdir()) / 'lyriclib-uploads'))
@@ -14,10 +14,48 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import threading
+
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
 
+
+class LazyAdminURLs:
+    """
+    admin.site's URL patterns, built on first use: the first /admin/ request
+    or the first reverse() (Django walks every included URLconf when it
+    builds its reverse lookup). With LEAN_BOOT the admin modules are only
+    discovered then, instead of at startup.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.patterns = None
+
+    def load(self):
+        with self.lock:
+            if self.patterns is None:
+                admin.autodiscover()
+                self.patterns = admin.site.get_urls()
+        return self.patterns
+
+    def __iter__(self):
+        return iter(self.load())
+
+    def __reversed__(self):
+        return reversed(self.load())
+
+    def __len__(self):
+        return len(self.load())
+
+    def __getitem__(self, index):
+        return self.load()[index]
+
+
+admin_urls = (LazyAdminURLs(), 'admin', admin.site.name) if settings.LEAN_BOOT else admin.site.urls
+
 urlpatterns = [
-    path('admin/', admin.site.urls),
+    path('admin/', admin_urls),
     path('', include('myapi.urls')),
 ]
@@ -1,5 +1,31 @@
 from django.contrib import admin
-from .models import SongModel
+from .models import SongModel, SongArtist, SongComposer, SongLyricist, SongLanguage, SongTag
 # Register your models here.
 
-admin.site.register(SongModel)
+
+# Credits have explicit through models, which the default admin form can't
+# edit, so they are edited inline.
+class SongArtistInline(admin.TabularInline):
+    model = SongArtist
+    extra = 1
+
+class SongComposerInline(admin.TabularInline):
+    model = SongComposer
+    extra = 1
+
+class SongLyricistInline(admin.TabularInline):
+    model = SongLyricist
+    extra = 1
+
+class SongLanguageInline(admin.TabularInline):
+    model = SongLanguage
+    extra = 1
+
+class SongTagInline(admin.TabularInline):
+    model = SongTag
+    extra = 1
+
+class SongModelAdmin(admin.ModelAdmin):
+    inlines = [SongArtistInline, SongComposerInline, SongLyricistInline, SongLanguageInline, SongTagInline]
+
+admin.site.register(SongModel, SongModelAdmin)
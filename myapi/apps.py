@@ -6,4 +6,5 @@ class MyapiConfig(AppConfig):
     name = 'myapi'
 
     def ready(self):
-        import myapi.signals
\ No newline at end of file
+        import myapi.signals
+        import myapi.sqlite  # connection pragmas
@@ -0,0 +1,110 @@
+# async_views.py
+"""
+Async read endpoints for ASGI deployments, mirroring the GET side of
+SongViewSet, CommentViewSet and FollowViewSet:
+
+    /async/songs/  /async/songs/<id>/  /async/comments/  /async/follows/
+
+including the ?post= and ?followed= relation filters.
+
+Queries run on the async ORM (afirst(), async for), so a worker waiting on a
+slow client or the database keeps serving other requests. DRF serializers
+and the cache API are synchronous and may touch the database through related
+managers, so serialization is handed to a thread with sync_to_async.
+Responses have the same shape as the DRF endpoints.
+"""
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, JsonResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.exceptions import AuthenticationFailed, NotFound, ValidationError
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from .counters import COUNTER_FIELDS
+from .models import SongModel, Comment, Follow
+from .pagination import KeysetPagination
+from .serializers import CommentSerializer, FollowSerializer
+from .views import (
+    SongViewSet, CommentViewSet, FollowViewSet, cached_song_data, filter_relations, song_etag, with_validators,
+)
+
+
+def _authenticate(request):
+    # JWT like the DRF endpoints, falling back to the session like login_required
+    try:
+        authenticated = JWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return AnonymousUser()
+    if authenticated is not None:
+        return authenticated[0]
+    return request.user if request.user.is_authenticated else AnonymousUser()
+
+
+def login_required_async(view):
+    async def wrapper(request, *args, **kwargs):
+        request.user = await sync_to_async(_authenticate)(request)
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+        try:
+            return await view(request, *args, **kwargs)
+        except NotFound as error:
+            return JsonResponse({'detail': str(error.detail)}, status=404)
+        except ValidationError as error:
+            return JsonResponse(error.detail, status=400)
+    return wrapper
+
+
+async def _paginated(request, queryset, viewset, serialize):
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(queryset, request, view=viewset)
+    results = await sync_to_async(serialize)(page)
+    return JsonResponse({
+        'next': paginator.get_next_link(),
+        'previous': paginator.get_previous_link(),
+        'results': results,
+    })
+
+
+@login_required_async
+async def song_list(request):
+    queryset = SongModel.objects.filter(song_created_by=request.user).only('pk')
+    return await _paginated(
+        request, queryset, SongViewSet, lambda songs: cached_song_data([song.pk for song in songs], {'request': request}),
+    )
+
+
+@login_required_async
+async def song_detail(request, song_id):
+    row = await (
+        SongModel.objects.filter(song_created_by=request.user, pk=song_id)
+        .values('song_updated_at', *COUNTER_FIELDS).afirst()
+    )
+    if row is None:
+        raise Http404
+    etag = song_etag(song_id, *row.values())
+    data = None
+    if get_conditional_response(request, etag=etag) is None:
+        data = (await sync_to_async(cached_song_data)([song_id], {'request': request}))[0]
+    return with_validators(request, etag, row['song_updated_at'], lambda: JsonResponse(data))
+
+
+@login_required_async
+async def comment_list(request):
+    context = {'request': request}
+    # the same ?post= filter as CommentViewSet
+    queryset = filter_relations(Comment.objects.all(), CommentViewSet.relation_filters, request.GET)
+    queryset = CommentSerializer.setup_eager_loading(queryset, CommentSerializer(context=context))
+    return await _paginated(
+        request, queryset, CommentViewSet, lambda page: CommentSerializer(page, many=True, context=context).data,
+    )
+
+
+@login_required_async
+async def follow_list(request):
+    context = {'request': request}
+    # the same ?followed= filter as FollowViewSet
+    queryset = filter_relations(Follow.objects.all(), FollowViewSet.relation_filters, request.GET)
+    queryset = FollowSerializer.setup_eager_loading(queryset, FollowSerializer(context=context))
+    return await _paginated(
+        request, queryset, FollowViewSet, lambda page: FollowSerializer(page, many=True, context=context).data,
+    )
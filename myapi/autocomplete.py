@@ -0,0 +1,87 @@
+# autocomplete.py
+"""
+Lazy option loading for the song and credit forms.
+
+The forms used to render every artist, composer, ... (or every song) as a
+checkbox. AutocompleteSelectMultiple only renders the options that are
+already selected; static/js/autocomplete.js fetches the rest page by page
+from /autocomplete/<kind>/?q=<prefix>&after=<last id>, which reads a range
+of an indexed column: normalized_name for credits, so "beyo" finds
+"Beyoncé", and falls back to the trigram lookup when no credit starts with
+the prefix.
+"""
+from django import forms
+from django.urls import reverse
+
+from .credits import CREDIT_MODELS, lookup as credit_lookup
+from .models import SongModel, Artist, Composer, Lyricist, Language, Tag, Urls
+from .names import normalize_name
+from .pagination import KeysetPagination
+
+# kind -> (model, label field, indexed field the prefix is matched on)
+KINDS = {
+    'artist': (Artist, 'name', 'normalized_name'),
+    'composer': (Composer, 'name', 'normalized_name'),
+    'lyricist': (Lyricist, 'name', 'normalized_name'),
+    'language': (Language, 'name', 'normalized_name'),
+    'tag': (Tag, 'name', 'normalized_name'),
+    'url': (Urls, 'url', 'url'),
+    'song': (SongModel, 'song_title', 'song_title'),
+}
+PAGE_SIZE = 20
+_MAX_CHAR = '\U0010ffff'
+
+
+def lookup(kind, prefix='', after=None, limit=PAGE_SIZE):
+    """
+    One page of {'id', 'text'} options whose label starts with `prefix`,
+    ordered by (key, id), plus the id to pass as `after` for the next page
+    (None on the last page). Raises KeyError for an unknown kind.
+    """
+    model, field, key = KINDS[kind]
+    if key == 'normalized_name':
+        prefix = normalize_name(prefix)
+    queryset = model.objects.all()
+    if prefix:
+        # a range instead of LIKE so every backend can seek the index
+        queryset = queryset.filter(**{f'{key}__gte': prefix, f'{key}__lt': prefix + _MAX_CHAR})
+    if after is not None:
+        position = model.objects.filter(pk=after).values_list(key, flat=True).first()
+        if position is not None:
+            queryset = queryset.filter(KeysetPagination.keyset_filter((key, 'pk'), (position, after)))
+    rows = list(queryset.order_by(key, 'pk').values_list('pk', field)[:limit + 1])
+    results = [{'id': pk, 'text': label} for pk, label in rows[:limit]]
+    if not results and prefix and after is None and kind in CREDIT_MODELS:
+        # nothing starts with it, maybe it's misspelt
+        matches = credit_lookup(prefix, kinds=[kind], limit=limit)
+        return [{'id': match['id'], 'text': match['name']} for match in matches], None
+    return results, results[-1]['id'] if len(rows) > limit else None
+
+
+class AutocompleteSelectMultiple(forms.SelectMultiple):
+    """
+    Multiple select that only renders the selected options and loads the
+    others from the autocomplete endpoint of `kind`.
+    """
+
+    class Media:
+        js = ('js/autocomplete.js',)
+
+    def __init__(self, kind, attrs=None):
+        super().__init__(attrs)
+        self.kind = kind
+
+    def build_attrs(self, base_attrs, extra_attrs=None):
+        attrs = super().build_attrs(base_attrs, extra_attrs)
+        attrs['data-autocomplete-url'] = reverse('autocomplete', args=[self.kind])
+        return attrs
+
+    def optgroups(self, name, value, attrs=None):
+        model, field, _ = KINDS[self.kind]
+        selected = [v for v in value if str(v).isdigit()]  # a bound invalid form may echo anything
+        rows = model.objects.filter(pk__in=selected).order_by(field, 'pk').values_list('pk', field) if selected else []
+        options = [
+            self.create_option(name, pk, label, True, index, attrs=attrs)
+            for index, (pk, label) in enumerate(rows)
+        ]
+        return [(None, options, 0)]
@@ -0,0 +1,104 @@
+# cache.py
+"""
+Serialized response cache for songs.
+
+Rendered SongSerializer data is cached per song ("song:<format>:<id>");
+list pages only cache the ordered song ids plus their paging links, keyed by
+the request URL and a per-author generation number. Signals (see signals.py)
+delete exactly the songs touched by a write, and bump the author's
+generation when a song is created or deleted.
+
+Uses the 'responses' alias from CACHES, so the store is whatever backend is
+configured there: local memory (LRU) by default, or the file based or Redis
+backends via RESPONSE_CACHE_BACKEND / RESPONSE_CACHE_LOCATION.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+CACHE_ALIAS = 'responses'
+HITS_KEY = 'stats:hits'
+# bumped whenever SongSerializer's output changes, so a shared cache never
+# serves songs rendered in the old shape
+SONG_FORMAT = 2
+MISSES_KEY = 'stats:misses'
+
+
+def get_cache():
+    return caches[CACHE_ALIAS if CACHE_ALIAS in settings.CACHES else 'default']
+
+
+def song_key(song_id):
+    return f'song:{SONG_FORMAT}:{song_id}'
+
+
+def _generation_key(user_id):
+    return f'songs:gen:{user_id}'
+
+
+def _incr(key, delta=1):
+    cache = get_cache()
+    # add() is a no-op when the key exists, so concurrent first increments don't clobber each other
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:  # evicted between add() and incr()
+        cache.set(key, delta, timeout=None)
+        return delta
+
+
+def record(hits=0, misses=0):
+    if hits:
+        _incr(HITS_KEY, hits)
+    if misses:
+        _incr(MISSES_KEY, misses)
+
+
+def stats():
+    values = get_cache().get_many([HITS_KEY, MISSES_KEY])
+    hits, misses = values.get(HITS_KEY, 0), values.get(MISSES_KEY, 0)
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_rate': round(hits / total, 4) if total else None}
+
+
+def get_songs(song_ids):
+    """
+    Return {song id: cached data} for the songs that are cached.
+    """
+    found = get_cache().get_many([song_key(song_id) for song_id in song_ids])
+    cached = {song_id: found[song_key(song_id)] for song_id in song_ids if song_key(song_id) in found}
+    record(hits=len(cached), misses=len(set(song_ids)) - len(cached))
+    return cached
+
+
+def set_songs(data_by_id):
+    get_cache().set_many({song_key(song_id): data for song_id, data in data_by_id.items()})
+
+
+def invalidate_songs(song_ids):
+    if song_ids:
+        get_cache().delete_many([song_key(song_id) for song_id in song_ids])
+
+
+def list_key(user_id, url):
+    # generations are timestamps so an evicted generation never resurrects older pages
+    generation = get_cache().get_or_set(_generation_key(user_id), time.time_ns, timeout=None)
+    digest = hashlib.sha1(url.encode('utf-8')).hexdigest()
+    return f'songs:list:{user_id}:{generation}:{digest}'
+
+
+def get_list(key):
+    page = get_cache().get(key)
+    record(hits=int(page is not None), misses=int(page is None))
+    return page
+
+
+def set_list(key, page):
+    get_cache().set(key, page)
+
+
+def invalidate_lists(user_id):
+    # old pages become unreachable and age out of the cache
+    get_cache().set(_generation_key(user_id), time.time_ns(), timeout=None)
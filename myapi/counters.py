@@ -0,0 +1,99 @@
+# counters.py
+"""
+Denormalized per-song counters (SongModel.like_count, love_count,
+comment_count and save_count).
+
+Signals bump them with a single UPDATE ... SET x = x + 1 so concurrent writers
+never lose an increment; reconcile_song_counters repairs any drift, e.g. from
+raw SQL or bulk deletes that bypass signals.
+
+clamped_bump, row_count, fix_drift and reconcile_in_ranges are shared with
+the follow counters on Profile (graph.py).
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, Max, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import cache as response_cache
+from .models import SongModel, Reaction, Comment, SavedPost
+
+REACTION_COUNTERS = {
+    'Like': 'like_count',
+    'Love': 'love_count',
+}
+COUNTER_FIELDS = ['like_count', 'love_count', 'comment_count', 'save_count']
+
+
+def clamped_bump(queryset, field, delta):
+    # Greatest keeps a counter that already drifted low from going negative
+    return queryset.update(**{field: Greatest(F(field) + delta, Value(0))})
+
+
+def row_count(queryset, field, outer='pk'):
+    """
+    An expression counting the rows of `queryset` whose `field` points at
+    the outer row's `outer`.
+    """
+    rows = (
+        queryset.filter(**{field: OuterRef(outer)})
+        .order_by().values(field).annotate(total=Count('pk')).values('total')
+    )
+    return Coalesce(Subquery(rows, output_field=IntegerField()), Value(0))
+
+
+def fix_drift(queryset, counts, dry_run=False):
+    """
+    Reset the counters of the rows in `queryset` that differ from `counts`,
+    {counter field: row_count() expression}. Returns the pks that were off.
+    """
+    annotated = queryset.annotate(**{f'actual_{field}': expression for field, expression in counts.items()})
+    drift = Q()
+    for field in counts:
+        drift |= ~Q(**{field: F(f'actual_{field}')})
+    drifted = list(annotated.filter(drift).values_list('pk', flat=True))
+    if drifted and not dry_run:
+        queryset.model.objects.filter(pk__in=drifted).update(**counts)
+    return drifted
+
+
+def reconcile_in_ranges(model, reconcile, batch_size, dry_run=False):
+    """
+    Run reconcile(queryset, dry_run) over the whole `model` table. Returns
+    the sum of what it returned.
+    """
+    last_id = model.objects.aggregate(last=Max('pk'))['last'] or 0
+    drifted = 0
+    # walk the table in primary key ranges so each UPDATE stays short
+    for start in range(0, last_id + 1, batch_size):
+        with transaction.atomic():
+            drifted += reconcile(model.objects.filter(pk__gte=start, pk__lt=start + batch_size), dry_run=dry_run)
+    return drifted
+
+
+def bump(song_id, field, delta):
+    clamped_bump(SongModel.objects.filter(pk=song_id), field, delta)
+    response_cache.invalidate_songs([song_id])
+
+
+def actual_counts():
+    """
+    Return {counter field: expression counting the real rows for a song}.
+    """
+    counts = {
+        field: row_count(Reaction.objects.filter(reaction=reaction), 'post')
+        for reaction, field in REACTION_COUNTERS.items()
+    }
+    counts['comment_count'] = row_count(Comment.objects.all(), 'post')
+    counts['save_count'] = row_count(SavedPost.objects.all(), 'post')
+    return counts
+
+
+def reconcile(queryset, dry_run=False):
+    """
+    Recompute the counters of the songs in `queryset` that drifted from the
+    real row counts. Returns the number of songs that were off.
+    """
+    drifted = fix_drift(queryset, actual_counts(), dry_run)
+    if drifted and not dry_run:
+        response_cache.invalidate_songs(drifted)
+    return len(drifted)
@@ -0,0 +1,139 @@
+# credits.py
+"""
+Typo-tolerant credit name lookup (GET /credits/lookup/?q=, the importer and
+the autocomplete fallback).
+
+Exact matches go through the unique normalized_name index. Near matches come
+from an in-process trigram index per credit model: trigram -> credit ids,
+scored like pg_trgm's similarity() (shared trigrams / all trigrams). Each
+process builds its index on first use; signals keep it current for writes
+made by the same process and a cheap (count, max id, max updated_at) check
+every REFRESH_SECONDS rebuilds it after inserts, deletes and renames from
+other processes.
+"""
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.db.models import Count, Max
+
+from .models import Artist, Composer, Lyricist, Language, Tag
+from .names import normalize_name, trigrams
+
+CREDIT_MODELS = {
+    'artist': Artist,
+    'composer': Composer,
+    'lyricist': Lyricist,
+    'language': Language,
+    'tag': Tag,
+}
+SIMILARITY_THRESHOLD = 0.3  # pg_trgm's default
+REFRESH_SECONDS = 30
+MAX_RESULTS = 50
+
+
+class TrigramIndex:
+
+    def __init__(self, model):
+        self.model = model
+        self.lock = threading.Lock()
+        self.postings = defaultdict(set)
+        self.grams = {}  # credit id -> its trigrams
+        self.fingerprint = None
+        self.checked = 0.0
+
+    def _fingerprint(self):
+        return tuple(self.model.objects.aggregate(
+            count=Count('pk'), last=Max('pk'), updated=Max('updated_at'),
+        ).values())
+
+    def refresh(self, force=False):
+        if not force and self.fingerprint is not None and time.monotonic() - self.checked < REFRESH_SECONDS:
+            return
+        fingerprint = self._fingerprint()
+        with self.lock:
+            self.checked = time.monotonic()
+            if fingerprint == self.fingerprint and not force:
+                return
+            postings, grams = defaultdict(set), {}
+            rows = self.model.objects.values_list('pk', 'normalized_name').iterator(chunk_size=2000)
+            for pk, normalized in rows:
+                grams[pk] = trigrams(normalized)
+                for gram in grams[pk]:
+                    postings[gram].add(pk)
+            self.postings, self.grams, self.fingerprint = postings, grams, fingerprint
+
+    def add(self, pk, normalized):
+        with self.lock:
+            self._discard(pk)
+            self.grams[pk] = trigrams(normalized)
+            for gram in self.grams[pk]:
+                self.postings[gram].add(pk)
+
+    def discard(self, pk):
+        with self.lock:
+            self._discard(pk)
+
+    def _discard(self, pk):
+        for gram in self.grams.pop(pk, ()):
+            self.postings[gram].discard(pk)
+
+    def search(self, normalized, limit=10, threshold=SIMILARITY_THRESHOLD):
+        """
+        [(credit id, similarity)] best first, similarity >= threshold.
+        """
+        self.refresh()
+        query = trigrams(normalized)
+        if not query:
+            return []
+        with self.lock:
+            shared = Counter()
+            for gram in query:
+                shared.update(self.postings.get(gram, ()))
+            scored = [
+                (pk, count / (len(query) + len(self.grams[pk]) - count))
+                for pk, count in shared.items() if pk in self.grams
+            ]
+        scored = [(pk, score) for pk, score in scored if score >= threshold]
+        scored.sort(key=lambda item: (-item[1], item[0]))
+        return scored[:limit]
+
+
+_indexes = {}
+
+
+def get_index(kind):
+    if kind not in _indexes:
+        _indexes[kind] = TrigramIndex(CREDIT_MODELS[kind])
+    return _indexes[kind]
+
+
+def index_for_model(model):
+    for kind, credit_model in CREDIT_MODELS.items():
+        if credit_model is model:
+            return get_index(kind)
+    return None
+
+
+def lookup(query, kinds=None, limit=10, threshold=SIMILARITY_THRESHOLD):
+    """
+    Credits named like `query`, best first, as dicts of kind, id, name and
+    score (1.0 for an exact normalized match).
+    """
+    normalized = normalize_name(query)
+    if not normalized:
+        return []
+    matches = []
+    for kind in kinds or CREDIT_MODELS:
+        model = CREDIT_MODELS[kind]
+        scores = dict(get_index(kind).search(normalized, limit, threshold))
+        exact = model.objects.filter(normalized_name=normalized).values_list('pk', flat=True).first()
+        if exact is not None:
+            scores[exact] = 1.0
+        names = dict(model.objects.filter(pk__in=scores).values_list('pk', 'name'))
+        matches.extend(
+            {'kind': kind, 'id': pk, 'name': names[pk], 'score': round(score, 4)}
+            for pk, score in scores.items() if pk in names
+        )
+    matches.sort(key=lambda match: (-match['score'], match['name'], match['id']))
+    return matches[:limit]
@@ -0,0 +1,84 @@
+# exporter.py
+"""
+Streaming song export to JSONL or CSV, used by `manage.py export_songs` and
+GET /songs/export/.
+
+Songs are read with values().iterator() so no model instances are built and
+only one chunk of rows is held at a time; the credit names of a chunk are
+fetched with one query per through table. The output uses the columns
+`importer` reads, so an export can be imported again.
+"""
+import csv
+import json
+
+from .importer import CREDIT_COLUMNS
+from .models import SongModel
+
+SONG_FIELDS = ['id', 'song_title', 'song_lyric', 'song_speed']
+COLUMNS = SONG_FIELDS + list(CREDIT_COLUMNS) + ['urls']
+CONTENT_TYPES = {'csv': 'text/csv; charset=utf-8', 'jsonl': 'application/x-ndjson'}
+
+
+def _credit_names(song_ids):
+    """
+    {column: {song id: [names]}} for a chunk of songs.
+    """
+    names = {}
+    for column, (_, through, field) in CREDIT_COLUMNS.items():
+        rows = through.objects.filter(song_id__in=song_ids).order_by(f'{field}__name').values_list('song_id', f'{field}__name')
+        names[column] = by_song = {}
+        for song_id, name in rows:
+            by_song.setdefault(song_id, []).append(name)
+    rows = SongModel.song_urls.through.objects.filter(songmodel_id__in=song_ids).order_by('urls__url')
+    names['urls'] = by_song = {}
+    for song_id, url in rows.values_list('songmodel_id', 'urls__url'):
+        by_song.setdefault(song_id, []).append(url)
+    return names
+
+
+def _chunked(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def iter_songs(queryset=None, chunk_size=1000):
+    """
+    Yield one dict per song in COLUMNS order, credits as lists of names.
+    """
+    if queryset is None:
+        queryset = SongModel.objects.all()
+    rows = queryset.order_by('pk').values(*SONG_FIELDS).iterator(chunk_size=chunk_size)
+    for chunk in _chunked(rows, chunk_size):
+        names = _credit_names([row['id'] for row in chunk])
+        for row in chunk:
+            for column, by_song in names.items():
+                row[column] = by_song.get(row['id'], [])
+            yield row
+
+
+class _Line:
+    # csv.writer target that hands back what it was given instead of storing it
+    def write(self, value):
+        return value
+
+
+def iter_lines(songs, fmt):
+    """
+    Render song dicts from iter_songs() as JSONL or CSV text lines.
+    """
+    if fmt == 'csv':
+        writer = csv.writer(_Line())
+        yield writer.writerow(COLUMNS)
+        for song in songs:
+            yield writer.writerow([
+                '|'.join(song[column]) if isinstance(song[column], list) else song[column] for column in COLUMNS
+            ])
+    else:
+        for song in songs:
+            yield json.dumps(song, ensure_ascii=False) + '\n'
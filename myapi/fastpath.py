@@ -0,0 +1,190 @@
+# fastpath.py
+"""
+Fast path for the hot list endpoints.
+
+A DRF serializer renders every row field by field: get_attribute() on a
+model instance, to_representation(), an OrderedDict per row. FastSerializer
+compiles a serializer instance (its ?fields=/?expand= selection already
+applied) into a plan made once per request: the values() columns to fetch
+and, per field, either nothing (strings, numbers, booleans are already what
+DRF would output) or the DRF field's own to_representation (dates, choices,
+files). Rows are then built straight from values() dicts. Relations cost
+one query each per batch: foreign keys come from the <fk>_id column,
+many-to-many ids from a query shaped like the prefetch DRF would use, and
+expanded relations from a nested plan run on the collected ids.
+
+Fields without such an equivalent (method fields, dotted sources, reverse
+relations, hyperlinks) raise NotCompilable and the caller falls back to the
+serializer. Output is identical to the serializer's.
+
+FastJSONRenderer encodes with orjson when it is installed (it is optional)
+and with DRF's JSONRenderer otherwise. Viewsets opt in with
+FastSerializationMixin (views.py); compare both paths with
+`manage.py benchmark_serializers`.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional, see FastJSONRenderer
+    orjson = None
+
+# serializer fields whose to_representation returns values() output unchanged
+IDENTITY_FIELDS = (
+    serializers.CharField, serializers.IntegerField, serializers.FloatField,
+    serializers.BooleanField, serializers.ReadOnlyField,
+)
+
+
+class NotCompilable(Exception):
+    pass
+
+
+def _nested(field):
+    many = isinstance(field, serializers.ListSerializer)
+    nested = field.child if many else field
+    return (nested, many) if isinstance(nested, serializers.BaseSerializer) else (None, False)
+
+
+def _file_converter(field, model_field):
+    # values() gives the stored name, DRF's file fields want a FieldFile
+    def convert(name):
+        return field.to_representation(model_field.attr_class(None, model_field, name))
+    return convert
+
+
+class ManyRelation:
+    """
+    Ids (or nested data) of a many-to-many field declared on the model, for a
+    batch of rows.
+    """
+
+    def __init__(self, model_field, nested=None):
+        self.source = model_field.name
+        self.related_model = model_field.related_model
+        self.lookup = model_field.related_query_name()
+        self.nested = nested
+
+    def load_ids(self, pks):
+        """
+        {row pk: [related pks]}, with the same join and order as
+        prefetch_related on the field.
+        """
+        related = {}
+        pairs = (
+            self.related_model._default_manager.filter(**{f'{self.lookup}__in': pks})
+            .values_list(self.lookup, 'pk')
+        )
+        for owner, pk in pairs:
+            related.setdefault(owner, []).append(pk)
+        return related
+
+    def resolve(self, related):
+        if self.nested is None:
+            return related
+        data = self.nested.serialize_ids({pk for pks in related.values() for pk in pks})
+        return {owner: [data[pk] for pk in pks if pk in data] for owner, pks in related.items()}
+
+
+class FastSerializer:
+    """
+    Compiled form of a serializer instance, see the module docstring.
+    """
+
+    def __init__(self, serializer):
+        if isinstance(serializer, serializers.ListSerializer):
+            serializer = serializer.child
+        self.model = serializer.Meta.model
+        self.pk_column = self.model._meta.pk.attname
+        self.columns = {self.pk_column}
+        self.plan = []  # (output name, column or None, converter, relation)
+        for name, field in serializer.fields.items():
+            if not field.write_only:
+                self.plan.append(self._compile(name, field))
+
+    def _compile(self, name, field):
+        if field.source == '*' or '.' in field.source:
+            raise NotCompilable(f'{name}: source {field.source!r}')
+        try:
+            model_field = self.model._meta.get_field(field.source)
+        except FieldDoesNotExist:
+            raise NotCompilable(f'{name}: {field.source!r} is not a model field')
+        nested, many = _nested(field)
+
+        if model_field.many_to_many and not model_field.auto_created:
+            if nested is None and not isinstance(field, serializers.ManyRelatedField):
+                raise NotCompilable(f'{name}: {type(field).__name__}')
+            child = getattr(field, 'child_relation', None)
+            if child is not None and (type(child) is not serializers.PrimaryKeyRelatedField or child.pk_field):
+                raise NotCompilable(f'{name}: {type(child).__name__}')
+            return name, None, None, ManyRelation(model_field, FastSerializer(nested) if nested else None)
+        if model_field.is_relation and not model_field.concrete:
+            raise NotCompilable(f'{name}: reverse relation')
+
+        self.columns.add(model_field.attname)
+        if nested is not None:
+            return name, model_field.attname, None, FastSerializer(nested)
+        if model_field.is_relation:
+            if type(field) is not serializers.PrimaryKeyRelatedField or field.pk_field:
+                raise NotCompilable(f'{name}: {type(field).__name__}')
+            return name, model_field.attname, None, None
+        if isinstance(field, IDENTITY_FIELDS):
+            return name, model_field.attname, None, None
+        if isinstance(model_field, models.FileField):
+            return name, model_field.attname, _file_converter(field, model_field), None
+        return name, model_field.attname, field.to_representation, None
+
+    def serialize(self, queryset):
+        """
+        Output dicts for the rows of `queryset`, in its order.
+        """
+        return [data for _, data in self._serialize(queryset)]
+
+    def serialize_ids(self, pks):
+        """
+        {pk: output dict} for the rows with these primary keys.
+        """
+        if not pks:
+            return {}
+        return dict(self._serialize(self.model._default_manager.filter(pk__in=list(pks))))
+
+    def _serialize(self, queryset):
+        rows = list(queryset.values(*self.columns))
+        related, many_ids = {}, {}
+        for name, column, _, relation in self.plan:
+            if isinstance(relation, ManyRelation):
+                # a field rendered twice (song_artist ids and artist) is loaded once
+                if relation.source not in many_ids:
+                    many_ids[relation.source] = relation.load_ids([row[self.pk_column] for row in rows])
+                related[name] = relation.resolve(many_ids[relation.source])
+            elif relation is not None:
+                related[name] = relation.serialize_ids({row[column] for row in rows if row[column] is not None})
+
+        for row in rows:
+            data = {}
+            for name, column, converter, relation in self.plan:
+                if relation is None:
+                    value = row[column]
+                    data[name] = value if converter is None or value is None else converter(value)
+                elif column is None:
+                    data[name] = related[name].get(row[self.pk_column], [])
+                else:
+                    data[name] = related[name].get(row[column])
+            yield row[self.pk_column], data
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer that encodes with orjson when available. Like JSONRenderer
+    it emits compact UTF-8; values orjson doesn't know (lazy strings,
+    Decimals, ...) go through DRF's encoder.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=JSONEncoder().default, option=orjson.OPT_NON_STR_KEYS)
@@ -0,0 +1,147 @@
+# feed.py
+"""
+Home feed: the latest songs from the accounts a user follows, newest first.
+
+FEED_STRATEGY picks how it is built:
+  - 'read' (default): fan-out-on-read. The followed authors' songs are merged
+    with a k-way heap over the per-author (song_created_by, id) index, pulling
+    a small block per author at a time.
+  - 'write': fan-out-on-write. Each new song is copied into a FeedEntry row
+    per follower, so a page is a single range read on (user, song).
+
+Switching an existing deployment to 'write' needs `manage.py rebuild_feeds`.
+"""
+import heapq
+
+from django.conf import settings
+from django.db import connections
+
+from .models import FeedEntry, Follow, SongModel
+
+AUTHOR_BLOCK = 4  # songs pulled per author at a time by the read strategy
+BACKFILL = 50  # songs copied into a feed when a write-strategy user follows someone
+BATCH_SIZE = 500
+SEEK_CHUNK = 100  # authors per UNION ALL, well under SQLite's compound select and variable limits
+
+
+def _chunks(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+class FanOutOnReadFeed:
+    name = 'read'
+
+    def on_song_created(self, song):
+        pass
+
+    def on_follow(self, follow):
+        pass
+
+    def on_unfollow(self, follow):
+        pass
+
+    def _seek(self, author_id, before, block):
+        queryset = SongModel.objects.filter(song_created_by=author_id)
+        if before is not None:
+            queryset = queryset.filter(id__lt=before)
+        return queryset.order_by('-id').values_list('song_created_by', 'id')[:block]
+
+    def _latest(self, authors, before, block):
+        """
+        Up to `block` newest song ids per author, below `before`.
+        Returns {author_id: [song ids, newest first]}.
+
+        Each author is one LIMIT seek on the (song_created_by, id) index, and
+        a chunk of authors is sent as a single UNION ALL of those seeks, so
+        the cost follows the number of authors and not their back catalogue.
+        """
+        songs = {}
+        for chunk in _chunks(authors, SEEK_CHUNK):
+            seeks = [self._seek(author_id, before, block) for author_id in chunk]
+            using = seeks[0].db
+            parts, params = [], []
+            for number, seek in enumerate(seeks):
+                sql, seek_params = seek.query.get_compiler(using=using).as_sql()
+                # wrapped, since a compound select can't hold ORDER BY / LIMIT itself
+                parts.append('SELECT * FROM (%s) AS seek%d' % (sql, number))
+                params.extend(seek_params)
+            with connections[using].cursor() as cursor:
+                cursor.execute(' UNION ALL '.join(parts), params)
+                for author_id, song_id in cursor.fetchall():
+                    songs.setdefault(author_id, []).append(song_id)
+        for ids in songs.values():
+            ids.sort(reverse=True)
+        return songs
+
+    def page(self, user, before, limit):
+        authors = list(Follow.objects.filter(follower=user).values_list('followed_id', flat=True))
+        buffers = self._latest(authors, before, AUTHOR_BLOCK)
+        # only an author whose last block came back full can have older songs
+        more = {author_id: len(ids) == AUTHOR_BLOCK for author_id, ids in buffers.items()}
+
+        # heap of (-song id, author); each author contributes its newest buffered song
+        heap = [(-ids.pop(0), author_id) for author_id, ids in buffers.items()]
+        heapq.heapify(heap)
+        result = []
+        while heap and len(result) < limit:
+            song_id, author_id = heapq.heappop(heap)
+            result.append(-song_id)
+            ids = buffers[author_id]
+            if not ids and more[author_id] and len(result) < limit:
+                ids.extend(self._latest([author_id], -song_id, AUTHOR_BLOCK).get(author_id, []))
+                more[author_id] = len(ids) == AUTHOR_BLOCK
+            if ids:
+                heapq.heappush(heap, (-ids.pop(0), author_id))
+        return result
+
+
+class FanOutOnWriteFeed:
+    name = 'write'
+
+    def on_song_created(self, song):
+        followers = Follow.objects.filter(followed_id=song.song_created_by_id).values_list('follower_id', flat=True)
+        entries = (
+            FeedEntry(user_id=follower_id, song_id=song.pk, author_id=song.song_created_by_id)
+            for follower_id in followers.iterator(chunk_size=BATCH_SIZE)
+        )
+        batch = []
+        for entry in entries:
+            batch.append(entry)
+            if len(batch) >= BATCH_SIZE:
+                FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+    def on_follow(self, follow):
+        latest = SongModel.objects.filter(song_created_by_id=follow.followed_id).order_by('-id')[:BACKFILL]
+        FeedEntry.objects.bulk_create([
+            FeedEntry(user_id=follow.follower_id, song_id=song_id, author_id=follow.followed_id)
+            for song_id in latest.values_list('id', flat=True)
+        ], ignore_conflicts=True)
+
+    def on_unfollow(self, follow):
+        FeedEntry.objects.filter(user_id=follow.follower_id, author_id=follow.followed_id).delete()
+
+    def page(self, user, before, limit):
+        entries = FeedEntry.objects.filter(user=user)
+        if before is not None:
+            entries = entries.filter(song_id__lt=before)
+        return list(entries.order_by('-song_id').values_list('song_id', flat=True)[:limit])
+
+    def rebuild(self):
+        FeedEntry.objects.all().delete()
+        for follow in Follow.objects.all().iterator(chunk_size=BATCH_SIZE):
+            self.on_follow(follow)
+
+
+_feed = None
+
+
+def get_feed():
+    global _feed
+    if _feed is None:
+        strategy = getattr(settings, 'FEED_STRATEGY', 'read')
+        _feed = FanOutOnWriteFeed() if strategy == 'write' else FanOutOnReadFeed()
+    return _feed
@@ -1,6 +1,8 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.conf import settings
+from .autocomplete import AutocompleteSelectMultiple
+from .images import MAX_PIXELS as MAX_IMAGE_PIXELS
 from .models import CustomUser, Profile, SongModel, Artist, Composer, Lyricist, Language, Tag, Urls
 
 
@@ -12,7 +14,15 @@ class CustomUserCreationForm(UserCreationForm):
 class ProfileForm(forms.ModelForm):
     class Meta:
         model = Profile
-        fields = ['bio', 'birth_date', 'username', 'first_name', 'last_name', 'email','following', 'followers', 'image', 'verified']  
+        fields = ['bio', 'birth_date', 'username', 'first_name', 'last_name', 'email', 'image', 'verified']
+
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # forms.ImageField leaves the opened Pillow image on new uploads
+        opened = getattr(image, 'image', None)
+        if opened is not None and opened.width * opened.height > MAX_IMAGE_PIXELS:
+            raise forms.ValidationError('This image is too large, please upload a smaller one.')
+        return image
         
 
 
@@ -28,32 +38,32 @@ SPEED_CHOICES = [
 class SongModelForm(forms.ModelForm):
     song_artist = forms.ModelMultipleChoiceField(
         queryset=Artist.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=AutocompleteSelectMultiple('artist'),
         required=False  # Adjust based on your requirements
     )
     song_composer = forms.ModelMultipleChoiceField(
         queryset=Composer.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=AutocompleteSelectMultiple('composer'),
         required=False  # Adjust based on your requirements
     )
     song_lyricist = forms.ModelMultipleChoiceField(
         queryset=Lyricist.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=AutocompleteSelectMultiple('lyricist'),
         required=False  # Adjust based on your requirements
     )
     song_language = forms.ModelMultipleChoiceField(
         queryset=Language.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=AutocompleteSelectMultiple('language'),
         required=False  # Adjust based on your requirements
     )
     song_tags = forms.ModelMultipleChoiceField(
         queryset=Tag.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=AutocompleteSelectMultiple('tag'),
         required=False  # Adjust based on your requirements
     )
     song_urls = forms.ModelMultipleChoiceField(
         queryset=Urls.objects.all(),
-        widget=forms.CheckboxSelectMultiple,
+        widget=AutocompleteSelectMultiple('url'),
         required=False  # Adjust based on your requirements
     )
     song_speed = forms.ChoiceField(
@@ -87,7 +97,7 @@ class ArtistForm(forms.ModelForm):
         model = Artist
         fields = ['name', 'songs']
         widgets = {
-            'songs': forms.CheckboxSelectMultiple,
+            'songs': AutocompleteSelectMultiple('song'),
         }
 
     def __init__(self, *args, **kwargs):
@@ -99,7 +109,7 @@ class ComposerForm(forms.ModelForm):
         model = Composer
         fields = ['name', 'songs']
         widgets = {
-            'songs': forms.CheckboxSelectMultiple,
+            'songs': AutocompleteSelectMultiple('song'),
         }
     def __init__(self, *args, **kwargs):
         super(ComposerForm, self).__init__(*args, **kwargs)
@@ -110,7 +120,7 @@ class LyricistForm(forms.ModelForm):
         model = Lyricist
         fields = ['name', 'songs']
         widgets = {
-            'songs': forms.CheckboxSelectMultiple,
+            'songs': AutocompleteSelectMultiple('song'),
         }
     def __init__(self, *args, **kwargs):
         super(LyricistForm, self).__init__(*args, **kwargs)
@@ -121,7 +131,7 @@ class TagForm(forms.ModelForm):
         model = Tag
         fields = ['name', 'songs']
         widgets = {
-            'songs': forms.CheckboxSelectMultiple,
+            'songs': AutocompleteSelectMultiple('song'),
        
         }
     def __init__(self, *args, **kwargs):
@@ -133,7 +143,7 @@ class LanguageForm(forms.ModelForm):
         model = Language
         fields = ['name', 'songs']
         widgets = {
-            'songs': forms.CheckboxSelectMultiple,
+            'songs': AutocompleteSelectMultiple('song'),
         }
     def __init__(self, *args, **kwargs):
         super(LanguageForm, self).__init__(*args, **kwargs)
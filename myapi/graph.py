@@ -0,0 +1,127 @@
+# graph.py
+"""
+The social graph. Follow rows are the only record of who follows whom
+(Profile.following / followers were merged into them by migration 0010).
+
+Profile.follower_count and following_count are denormalized like the song
+counters (counters.py): signals bump them with a single UPDATE ... SET
+x = x + 1 and reconcile_follow_counts repairs drift. Relationship checks
+for a whole page of users are one query on the (follower, followed) unique
+index and the (followed, created_at, id) index.
+"""
+from django.db.models import Exists, OuterRef, Q, Subquery
+
+from .counters import clamped_bump, fix_drift, row_count
+from .models import Follow, Profile
+
+# Follow foreign key -> the Profile counter it moves
+COUNT_FIELDS = {
+    'follower': 'following_count',
+    'followed': 'follower_count',
+}
+PREVIEW_SIZE = 3
+
+
+class SelfFollow(ValueError):
+    pass
+
+
+def bump(user_id, field, delta):
+    clamped_bump(Profile.objects.filter(user_id=user_id), field, delta)
+
+
+def follow(follower_id, followed_id):
+    """
+    Make follower follow followed. Returns (Follow, created).
+    """
+    if follower_id == followed_id:
+        raise SelfFollow("Users can't follow themselves.")
+    return Follow.objects.get_or_create(follower_id=follower_id, followed_id=followed_id)
+
+
+def unfollow(follower_id, followed_id):
+    """
+    Returns whether there was something to undo.
+    """
+    # delete() per row so the counter and feed signals run
+    follows = list(Follow.objects.filter(follower_id=follower_id, followed_id=followed_id))
+    for row in follows:
+        row.delete()
+    return bool(follows)
+
+
+def counts(user_ids):
+    """
+    {user id: {'follower_count': n, 'following_count': n}} from the profile
+    counters.
+    """
+    rows = Profile.objects.filter(user_id__in=user_ids).values('user_id', 'follower_count', 'following_count')
+    return {row.pop('user_id'): row for row in rows}
+
+
+def relationships(viewer_id, user_ids):
+    """
+    {user id: {'following': viewer follows them, 'followed_by': they follow
+    the viewer}} for a page of users, in one query.
+    """
+    user_ids = set(user_ids)
+    edges = Follow.objects.filter(
+        Q(follower_id=viewer_id, followed_id__in=user_ids) | Q(followed_id=viewer_id, follower_id__in=user_ids)
+    ).values_list('follower_id', 'followed_id')
+    result = {user_id: {'following': False, 'followed_by': False} for user_id in user_ids}
+    for follower_id, followed_id in edges:
+        if follower_id == viewer_id and followed_id in result:
+            result[followed_id]['following'] = True
+        if followed_id == viewer_id and follower_id in result:
+            result[follower_id]['followed_by'] = True
+    return result
+
+
+def mutuals(user_id):
+    """
+    Ids of the users that user_id follows and who follow back, most recently
+    followed first.
+    """
+    follows_back = Follow.objects.filter(follower_id=OuterRef('followed_id'), followed_id=user_id)
+    return (
+        Follow.objects.filter(follower_id=user_id).filter(Exists(follows_back))
+        .order_by('-created_at', '-id').values_list('followed_id', flat=True)
+    )
+
+
+def followed_by_followees(viewer_id, user_id):
+    """
+    Ids of the users viewer_id follows who follow user_id ("followed by
+    people you follow"), most recent first.
+    """
+    followees = Follow.objects.filter(follower_id=viewer_id).values('followed_id')
+    return (
+        Follow.objects.filter(followed_id=user_id, follower_id__in=Subquery(followees))
+        .order_by('-created_at', '-id').values_list('follower_id', flat=True)
+    )
+
+
+def summary(viewer_id, user_id, preview=PREVIEW_SIZE):
+    """
+    Everything a profile page shows about the graph: counts, the viewer's
+    relationship with the user and a few followers the viewer follows.
+    """
+    relation = relationships(viewer_id, [user_id])[user_id] if viewer_id != user_id else {
+        'following': False, 'followed_by': False,
+    }
+    known = followed_by_followees(viewer_id, user_id)
+    return {
+        **counts([user_id]).get(user_id, {'follower_count': 0, 'following_count': 0}),
+        **relation,
+        'mutual': relation['following'] and relation['followed_by'],
+        'followed_by_followees': list(known[:preview]),
+    }
+
+
+def reconcile(queryset, dry_run=False):
+    """
+    Recompute the counters of the profiles in `queryset` that drifted from
+    the Follow rows. Returns the number of profiles that were off.
+    """
+    actual = {counter: row_count(Follow.objects.all(), field, 'user_id') for field, counter in COUNT_FIELDS.items()}
+    return len(fix_drift(queryset, actual, dry_run))
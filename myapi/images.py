@@ -0,0 +1,140 @@
+# images.py
+"""
+Profile image pipeline.
+
+Uploads are streamed to a temporary file (FILE_UPLOAD_HANDLERS) instead of
+being read into memory, and the profile view moves that file into
+TASK_STAGING_DIR. The store_profile_image task (tasks.py) then, off the
+request:
+  - stores the original under a name derived from its SHA-256;
+  - makes square VARIANT_SIZES crops in each of VARIANT_FORMATS, stored
+    under the hash of their own content;
+  - points Profile.image and Profile.image_variants at them.
+
+A content-hashed name always means the same bytes, so serve_media answers
+them with a year-long immutable Cache-Control. ProfileSerializer turns
+image_variants into URLs, so a list of avatars fetches 48px files rather
+than the originals.
+
+Pillow is imported on first use, it isn't needed to boot (see startup.py).
+"""
+import hashlib
+import posixpath
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import default_storage
+from django.http import Http404
+from django.views import static
+
+VARIANT_SIZES = (48, 128, 512)
+# extension -> (Pillow format, save options)
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+ORIGINALS_DIR = 'profile_pics'
+VARIANTS_DIR = 'profile_pics/variants'
+MEDIA_DIRS = ('profile_pics/',)  # the only part of MEDIA_ROOT /media/ serves
+MAX_PIXELS = 40_000_000  # larger images are refused by ProfileForm
+HASH_LENGTH = 20
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+MUTABLE_CACHE = 'public, max-age=300'
+EXTENSIONS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def _hashed_name(directory, digest, extension):
+    return f'{directory}/{digest[:HASH_LENGTH]}.{extension}'
+
+
+def _store(name, content):
+    # same name, same bytes: an existing file is already the right one
+    if default_storage.exists(name):
+        return name
+    return default_storage.save(name, content)
+
+
+def is_hashed(name):
+    stem, _, extension = posixpath.basename(name).partition('.')
+    return len(stem) == HASH_LENGTH and all(c in '0123456789abcdef' for c in stem) and bool(extension)
+
+
+def store_original(file, name):
+    """
+    Store an image file under its content hash. Returns the stored name.
+    """
+    from PIL import Image
+
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    file.seek(0)
+    with Image.open(file) as image:
+        extension = EXTENSIONS.get(image.format) or posixpath.splitext(name)[1].lstrip('.').lower() or 'img'
+    file.seek(0)
+    return _store(_hashed_name(ORIGINALS_DIR, digest.hexdigest(), extension), File(file))
+
+
+def _encode(image, fmt, options):
+    from PIL import Image
+
+    if fmt == 'JPEG' and image.mode == 'RGBA':
+        # no alpha in JPEG, flatten onto white
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def make_variants(file):
+    """
+    Store the resized variants of an image file. Returns {size: {extension:
+    stored name}}, sizes as strings (it is saved as JSON).
+    """
+    from PIL import Image, ImageOps, features
+
+    formats = {
+        extension: (fmt, options) for extension, (fmt, options) in VARIANT_FORMATS.items()
+        if fmt != 'WEBP' or features.check('webp')
+    }
+    variants = {}
+    with Image.open(file) as image:
+        image = ImageOps.exif_transpose(image)
+        has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+        for size in VARIANT_SIZES:
+            square = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+            for extension, (fmt, options) in formats.items():
+                content = _encode(square, fmt, options)
+                name = _hashed_name(VARIANTS_DIR, hashlib.sha256(content).hexdigest(), extension)
+                variants.setdefault(str(size), {})[extension] = _store(name, ContentFile(content))
+    return variants
+
+
+def variant_urls(variants, request=None):
+    """
+    image_variants as URLs, absolute when the request is known.
+    """
+    urls = {}
+    for size, names in (variants or {}).items():
+        urls[size] = {}
+        for extension, name in names.items():
+            url = default_storage.url(name)
+            urls[size][extension] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+def serve_media(request, path):
+    """
+    Profile images from MEDIA_ROOT, content-hashed ones cacheable forever.
+    """
+    path = posixpath.normpath(path).lstrip('/')
+    if not path.startswith(MEDIA_DIRS):
+        raise Http404
+    response = static.serve(request, path, document_root=settings.MEDIA_ROOT)
+    response['Cache-Control'] = IMMUTABLE_CACHE if is_hashed(path) else MUTABLE_CACHE
+    return response
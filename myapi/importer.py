@@ -0,0 +1,287 @@
+# importer.py
+"""
+Bulk song import from CSV or JSONL, used by `manage.py import_songs` and
+POST /songs/bulk/.
+
+Rows are parsed lazily from any iterable of lines, validated one by one and
+written in batches: one bulk_create for the songs and one per credit
+through table, inside a transaction per batch. Credit names are resolved to
+ids through an in-memory map keyed on the normalized name that only queries
+(and creates) the names it hasn't seen yet; with fuzzy matching a misspelt
+name reuses a close existing credit (see credits.py). A bad row is reported and skipped; a batch that
+fails in the database is retried row by row so one bad row can't sink it.
+With FEED_STRATEGY = 'write' each batch queues one feed fan-out job.
+
+Columns: song_title, song_lyric, song_speed (optional) and the credit
+columns artists, composers, lyricists, languages, tags and urls. In CSV a
+credit cell holds names separated by "|", in JSONL a list or such a string.
+"""
+import csv
+import json
+import time
+
+from django.db import DatabaseError, transaction
+
+from . import cache as response_cache
+from . import tasks
+from .credits import get_index as get_credit_index
+from .feed import get_feed
+from .models import (
+    SongModel, SPEED_CHOICES, Artist, Composer, Lyricist, Language, Tag, Urls,
+    SongArtist, SongComposer, SongLyricist, SongLanguage, SongTag
+)
+from .names import normalize_name
+from .search import get_backend
+
+# column -> (credit model, through model, through field)
+CREDIT_COLUMNS = {
+    'artists': (Artist, SongArtist, 'artist'),
+    'composers': (Composer, SongComposer, 'composer'),
+    'lyricists': (Lyricist, SongLyricist, 'lyricist'),
+    'languages': (Language, SongLanguage, 'language'),
+    'tags': (Tag, SongTag, 'tag'),
+}
+SPEEDS = {value for value, _ in SPEED_CHOICES}
+MAX_REPORTED_ERRORS = 1000
+FUZZY_THRESHOLD = 0.6
+FORMATS = ('csv', 'jsonl')
+CONTENT_TYPES = {
+    'text/csv': 'csv',
+    'application/jsonl': 'jsonl',
+    'application/x-ndjson': 'jsonl',
+    'application/x-jsonlines': 'jsonl',
+}
+
+
+def guess_format(filename='', content_type=''):
+    """
+    'csv' or 'jsonl' from a file extension or content type, None if unknown.
+    """
+    extension = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if extension in ('jsonl', 'ndjson'):
+        return 'jsonl'
+    if extension == 'csv':
+        return 'csv'
+    return CONTENT_TYPES.get(content_type.split(';')[0].strip().lower())
+
+
+def _decoded(lines):
+    for line in lines:
+        yield line.decode('utf-8-sig') if isinstance(line, bytes) else line
+
+
+def iter_rows(lines, fmt):
+    """
+    Yield (row number, dict) from an iterable of text or bytes lines.
+    Unparseable JSONL lines come out as (row number, exception).
+    """
+    lines = _decoded(lines)
+    if fmt == 'csv':
+        for number, row in enumerate(csv.DictReader(lines), start=1):
+            yield number, row
+    else:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError as error:
+                yield number, error
+
+
+def _names(value):
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.split('|')
+    return [str(name).strip() for name in value if str(name).strip()]
+
+
+def clean_row(row):
+    """
+    Validate a parsed row, returning (song fields, {column: [names]}).
+    Raises ValueError with a readable message.
+    """
+    if isinstance(row, Exception):
+        raise ValueError(f'invalid JSON: {row}')
+    if not isinstance(row, dict):
+        raise ValueError('row must be an object')
+    title = (row.get('song_title') or '').strip()
+    lyric = row.get('song_lyric') or ''
+    speed = (row.get('song_speed') or 'MODERATE').strip()
+    if not title:
+        raise ValueError('song_title is required')
+    if len(title) > SongModel._meta.get_field('song_title').max_length:
+        raise ValueError('song_title is too long')
+    if not lyric.strip():
+        raise ValueError('song_lyric is required')
+    if speed not in SPEEDS:
+        raise ValueError(f'unknown song_speed "{speed}"')
+    credits = {column: _names(row.get(column)) for column in list(CREDIT_COLUMNS) + ['urls']}
+    return {'song_title': title, 'song_lyric': lyric, 'song_speed': speed}, credits
+
+
+class NameResolver:
+    """
+    name -> id map for one credit model. Names are matched on their
+    normalized form; unknown ones are looked up in one query per batch and
+    created if missing. With `fuzzy`, a name with no exact match reuses the
+    closest existing credit when it is at least FUZZY_THRESHOLD similar.
+    """
+
+    def __init__(self, model, kind=None, fuzzy=False):
+        self.model = model
+        self.kind = kind
+        self.fuzzy = fuzzy and kind is not None
+        self.ids = {}  # normalized name -> id
+
+    def resolve(self, names):
+        """
+        Return {name: id} for `names`.
+        """
+        keys = {name: normalize_name(name) for name in names}
+        missing = set(keys.values()) - set(self.ids)
+        if missing:
+            existing = self.model.objects.filter(normalized_name__in=missing)
+            self.ids.update(existing.values_list('normalized_name', 'pk'))
+            missing -= set(self.ids)
+        if missing and self.fuzzy:
+            index = get_credit_index(self.kind)
+            for key in list(missing):
+                best = index.search(key, limit=1, threshold=FUZZY_THRESHOLD)
+                if best:
+                    self.ids[key] = best[0][0]
+                    missing.discard(key)
+        if missing:
+            first_spelling = {}
+            for name, key in keys.items():
+                first_spelling.setdefault(key, name)
+            created = self.model.objects.bulk_create([
+                self.model(name=first_spelling[key], normalized_name=key) for key in sorted(missing)
+            ])
+            for obj in created:
+                self.ids[obj.normalized_name] = obj.pk
+        return {name: self.ids[key] for name, key in keys.items()}
+
+
+class UrlResolver(NameResolver):
+    # Urls aren't normalized or unique, the oldest row wins
+
+    def __init__(self):
+        super().__init__(Urls)
+
+    def resolve(self, urls):
+        missing = set(urls) - set(self.ids)
+        if missing:
+            existing = Urls.objects.filter(url__in=missing).order_by('-pk')
+            self.ids.update(existing.values_list('url', 'pk'))
+            created = Urls.objects.bulk_create([Urls(url=url) for url in sorted(missing - set(self.ids))])
+            self.ids.update((obj.url, obj.pk) for obj in created)
+        return {url: self.ids[url] for url in urls}
+
+
+class ImportResult:
+    def __init__(self):
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.seconds = 0.0
+
+    def error(self, number, message):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': number, 'error': message})
+
+    @property
+    def rows_per_second(self):
+        return round(self.created / self.seconds, 1) if self.seconds else None
+
+    def as_dict(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'seconds': round(self.seconds, 3),
+            'rows_per_second': self.rows_per_second,
+            'errors': self.errors,
+        }
+
+
+class SongImporter:
+
+    def __init__(self, user, batch_size=1000, fuzzy=False):
+        self.user = user
+        self.batch_size = batch_size
+        self.resolvers = {
+            column: NameResolver(model, kind=model._meta.model_name, fuzzy=fuzzy)
+            for column, (model, _, _) in CREDIT_COLUMNS.items()
+        }
+        self.resolvers['urls'] = UrlResolver()
+
+    def run(self, lines, fmt):
+        result = ImportResult()
+        batch = []
+        for number, row in iter_rows(lines, fmt):
+            try:
+                batch.append((number,) + clean_row(row))
+            except ValueError as error:
+                result.error(number, str(error))
+                continue
+            if len(batch) >= self.batch_size:
+                self._flush(batch, result)
+                batch = []
+        if batch:
+            self._flush(batch, result)
+        response_cache.invalidate_lists(self.user.pk)
+        result.seconds = time.monotonic() - result.started
+        return result
+
+    def _flush(self, batch, result):
+        try:
+            with transaction.atomic():
+                self._write(batch)
+            result.created += len(batch)
+        except DatabaseError:
+            self._forget_names()
+            for row in batch:
+                try:
+                    with transaction.atomic():
+                        self._write([row])
+                    result.created += 1
+                except DatabaseError as error:
+                    self._forget_names()
+                    result.error(row[0], str(error))
+
+    def _forget_names(self):
+        # credits created by a rolled back batch no longer exist
+        for resolver in self.resolvers.values():
+            resolver.ids.clear()
+
+    def _write(self, batch):
+        ids = {
+            column: resolver.resolve({name for _, _, credits in batch for name in credits[column]})
+            for column, resolver in self.resolvers.items()
+        }
+        songs = SongModel.objects.bulk_create([
+            SongModel(song_created_by=self.user, **fields) for _, fields, _ in batch
+        ])
+
+        links = {column: [] for column in CREDIT_COLUMNS}
+        urls = []
+        for song, (_, _, credits) in zip(songs, batch):
+            for column, (_, through, field) in CREDIT_COLUMNS.items():
+                # "Beyonce|Beyoncé" is one credit
+                links[column].extend(
+                    through(song_id=song.pk, **{f'{field}_id': pk}) for pk in {ids[column][name] for name in credits[column]}
+                )
+            urls.extend(
+                SongModel.song_urls.through(songmodel_id=song.pk, urls_id=ids['urls'][url]) for url in set(credits['urls'])
+            )
+        for column, (_, through, _) in CREDIT_COLUMNS.items():
+            through.objects.bulk_create(links[column], batch_size=self.batch_size)
+        SongModel.song_urls.through.objects.bulk_create(urls, batch_size=self.batch_size)
+
+        # bulk_create sends no post_save, do what the SongModel signals would
+        get_backend().index_many(songs)
+        if get_feed().name == 'write':
+            tasks.fan_out_songs.delay([song.pk for song in songs])
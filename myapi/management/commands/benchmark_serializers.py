@@ -0,0 +1,111 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from myapi.fastpath import FastJSONRenderer, FastSerializer, orjson
+from myapi.models import SongModel, Artist, Composer, Lyricist, Language, Tag, Comment, Reaction, Follow
+from myapi.names import normalize_name
+from myapi.serializers import CommentSerializer, FollowSerializer, ReactionSerializer, SongSerializer
+from myapi.views import EXPAND_ALL_SONG_FIELDS
+
+CASES = [
+    ('songs, expanded (cache fill)', SongSerializer, SongModel, EXPAND_ALL_SONG_FIELDS),
+    ('songs', SongSerializer, SongModel, {}),
+    ('comments', CommentSerializer, Comment, {}),
+    ('comments?expand=post,user', CommentSerializer, Comment, {'post': {}, 'user': {}}),
+    ('reactions', ReactionSerializer, Reaction, {}),
+    ('follows', FollowSerializer, Follow, {}),
+]
+CREDITS = 50
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare the stock serializers and JSONRenderer with the fast path (myapi/fastpath.py) on '
+        'generated rows. Runs inside a transaction that is rolled back.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000)
+        parser.add_argument('--repeat', type=int, default=3, help='Best of this many runs is reported')
+
+    def handle(self, *args, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be positive')
+        self.stdout.write(f'{options["rows"]} rows, JSON encoder: {"orjson" if orjson else "json (orjson not installed)"}')
+        with transaction.atomic():
+            self.populate(options['rows'])
+            for label, serializer_class, model, expand in CASES:
+                self.compare(label, serializer_class, model.objects.order_by('pk'), expand, options['repeat'])
+            transaction.set_rollback(True)
+
+    def populate(self, rows):
+        users = User.objects.bulk_create(
+            User(username=f'benchmark-{i}', email=f'benchmark-{i}@example.com') for i in range(max(rows // 50, 3))
+        )
+        credits = {
+            model: model.objects.bulk_create(
+                model(name=f'Benchmark {model.__name__} {i}', normalized_name=normalize_name(f'Benchmark {model.__name__} {i}'))
+                for i in range(CREDITS)
+            )
+            for model in (Artist, Composer, Lyricist, Language, Tag)
+        }
+        songs = SongModel.objects.bulk_create(
+            SongModel(
+                song_title=f'Benchmark song {i}', song_lyric='la la la\n' * 40, song_created_by=users[i % len(users)],
+            )
+            for i in range(rows)
+        )
+        for name in ('song_artist', 'song_composer', 'song_lyricist', 'song_language', 'song_tags'):
+            field = SongModel._meta.get_field(name)
+            related = credits[field.related_model]
+            field.remote_field.through.objects.bulk_create(
+                field.remote_field.through(**{field.m2m_field_name(): song, field.m2m_reverse_field_name(): related[i % CREDITS]})
+                for i, song in enumerate(songs)
+            )
+        Comment.objects.bulk_create(
+            Comment(post=song, user=users[i % len(users)], content='nice') for i, song in enumerate(songs)
+        )
+        Reaction.objects.bulk_create(
+            Reaction(post=song, user=users[i % len(users)], reaction='Like') for i, song in enumerate(songs)
+        )
+        # distinct (follower, followed) pairs
+        pairs = min(rows, len(users) * (len(users) - 1))
+        Follow.objects.bulk_create(
+            Follow(follower=users[i % len(users)], followed=users[(i + i // len(users) % (len(users) - 1) + 1) % len(users)])
+            for i in range(pairs)
+        )
+
+    def compare(self, label, serializer_class, queryset, expand, repeat):
+        serializer = serializer_class(fields=None, expand=expand)
+
+        def stock():
+            eager = serializer_class.setup_eager_loading(queryset, serializer)
+            return serializer_class(eager, many=True, fields=None, expand=expand).data
+
+        def fast():
+            return FastSerializer(serializer_class(fields=None, expand=expand)).serialize(queryset)
+
+        stock_seconds, stock_data = self.best(stock, repeat)
+        fast_seconds, fast_data = self.best(fast, repeat)
+        stock_json_seconds, stock_json = self.best(lambda: JSONRenderer().render(stock_data), repeat)
+        fast_json_seconds, fast_json = self.best(lambda: FastJSONRenderer().render(fast_data), repeat)
+        if fast_json != stock_json:
+            raise CommandError(f'{label}: the fast path output differs from the serializer')
+        stock_total, fast_total = stock_seconds + stock_json_seconds, fast_seconds + fast_json_seconds
+        self.stdout.write(
+            f'{label:<30} stock {stock_seconds:7.3f}s + {stock_json_seconds:6.3f}s json   '
+            f'fast {fast_seconds:7.3f}s + {fast_json_seconds:6.3f}s json   {stock_total / fast_total:5.1f}x'
+        )
+
+    @staticmethod
+    def best(function, repeat):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - started)
+        return min(timings), result
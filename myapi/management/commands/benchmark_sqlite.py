@@ -0,0 +1,120 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapi.sqlite import WriteQueue, apply_pragmas, is_locked
+
+
+class Command(BaseCommand):
+    help = (
+        'Compare concurrent read/write throughput on a scratch SQLite file with the '
+        'default settings and with the production profile (WAL, pragmas, write queue)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=8)
+        parser.add_argument('--seconds', type=float, default=5.0)
+        parser.add_argument('--rows', type=int, default=20000, help='Rows in the table the readers query')
+
+    def handle(self, *args, **options):
+        for production in (False, True):
+            result = self.run(production, options)
+            label = 'production' if production else 'default'
+            self.stdout.write(
+                f'{label:>10}: {result["reads"] / options["seconds"]:8.0f} reads/s  '
+                f'{result["writes"] / options["seconds"]:8.0f} writes/s  '
+                f'{result["errors"]} "database is locked" errors'
+            )
+
+    def run(self, production, options):
+        handle, path = tempfile.mkstemp(suffix='.sqlite3')
+        os.close(handle)
+        try:
+            self.prepare(path, production, options['rows'])
+            counts = {'reads': 0, 'writes': 0, 'errors': 0}
+            counts_lock = threading.Lock()
+            queue = WriteQueue() if production else None
+            stop = time.monotonic() + options['seconds']
+
+            def count(key):
+                with counts_lock:
+                    counts[key] += 1
+
+            def connect():
+                # 5 seconds is also Django's default busy timeout
+                connection = sqlite3.connect(path, timeout=20 if production else 5, check_same_thread=False)
+                if production:
+                    apply_pragmas(connection.cursor())
+                return connection
+
+            def reader():
+                connection = connect()
+                while time.monotonic() < stop:
+                    try:
+                        connection.execute(
+                            'SELECT COUNT(*), MAX(id) FROM reaction WHERE post_id = ?', (counts['reads'] % 500,)
+                        ).fetchone()
+                        count('reads')
+                    except sqlite3.OperationalError as error:
+                        if not is_locked(error):
+                            raise
+                        count('errors')
+                connection.close()
+
+            def writer(number):
+                connection = connect()
+
+                def write():
+                    # a read-then-write transaction, like a reaction bumping its song counter
+                    connection.execute('BEGIN')
+                    try:
+                        connection.execute('SELECT COUNT(*) FROM reaction WHERE post_id = ?', (number,)).fetchone()
+                        connection.execute('INSERT INTO reaction (post_id, kind) VALUES (?, ?)', (number, 'Like'))
+                        connection.execute('UPDATE song SET like_count = like_count + 1 WHERE id = ?', (number,))
+                        connection.execute('COMMIT')
+                    except BaseException:
+                        connection.execute('ROLLBACK')
+                        raise
+
+                while time.monotonic() < stop:
+                    try:
+                        queue.run(write) if queue else write()
+                        count('writes')
+                    except sqlite3.OperationalError as error:
+                        if not is_locked(error):
+                            raise
+                        count('errors')
+                connection.close()
+
+            threads = [threading.Thread(target=reader) for _ in range(options['readers'])]
+            threads += [threading.Thread(target=writer, args=(number,)) for number in range(options['writers'])]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            return counts
+        finally:
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+
+    def prepare(self, path, production, rows):
+        connection = sqlite3.connect(path)
+        if production:
+            apply_pragmas(connection.cursor())
+        connection.executescript(
+            'CREATE TABLE song (id INTEGER PRIMARY KEY, like_count INTEGER NOT NULL DEFAULT 0);'
+            'CREATE TABLE reaction (id INTEGER PRIMARY KEY, post_id INTEGER NOT NULL, kind TEXT NOT NULL);'
+            'CREATE INDEX reaction_post ON reaction (post_id, id);'
+        )
+        connection.executemany('INSERT INTO song (id) VALUES (?)', [(number,) for number in range(500)])
+        connection.executemany(
+            'INSERT INTO reaction (post_id, kind) VALUES (?, ?)', [(number % 500, 'Like') for number in range(rows)]
+        )
+        connection.commit()
+        connection.close()
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapi import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the precomputed similar songs and follow suggestions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=recommendations.TOP_K, help='Neighbours kept per song and per user')
+        parser.add_argument(
+            '--engine', choices=recommendations.ENGINES, default='auto',
+            help='scipy needs NumPy and SciPy, auto uses them when installed',
+        )
+
+    def handle(self, *args, **options):
+        if options['top_k'] < 1:
+            raise CommandError('--top-k must be at least 1')
+        started = time.perf_counter()
+        try:
+            songs, users = recommendations.build(options['top_k'], options['engine'])
+        except ValueError as error:
+            raise CommandError(str(error))
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {songs} similar songs and {users} follow suggestions in {time.perf_counter() - started:.1f}s'
+        ))
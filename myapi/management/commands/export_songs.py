@@ -0,0 +1,34 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from myapi.exporter import iter_lines, iter_songs
+from myapi.importer import FORMATS, guess_format
+from myapi.models import SongModel
+
+
+class Command(BaseCommand):
+    help = 'Export the song catalog as CSV or JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', help='File to write, defaults to stdout')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the output file extension, or jsonl')
+        parser.add_argument('--user', help='Only export the songs of this username')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['output'] or '') or 'jsonl'
+        queryset = SongModel.objects.all()
+        if options['user']:
+            user = User.objects.filter(username=options['user']).first()
+            if user is None:
+                raise CommandError(f'No user "{options["user"]}"')
+            queryset = queryset.filter(song_created_by=user)
+
+        lines = iter_lines(iter_songs(queryset, chunk_size=max(options['chunk_size'], 1)), fmt)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8', newline='') as out:
+                out.writelines(lines)
+            self.stderr.write(self.style.SUCCESS(f'Exported songs to {options["output"]}'))
+        else:
+            for line in lines:
+                self.stdout.write(line, ending='')
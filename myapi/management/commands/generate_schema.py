@@ -0,0 +1,26 @@
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from myapi import schema
+
+
+class Command(BaseCommand):
+    help = 'Write the OpenAPI document served by /swagger/ and /redoc/ (run at build time)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output-dir', type=Path, help='defaults to settings.SCHEMA_DIR')
+        parser.add_argument('--check', action='store_true', help='only fail if the stored document is stale')
+
+    def handle(self, *args, **options):
+        version = schema.code_version()
+        directory = options['output_dir']
+        if options['check']:
+            if schema.read(version, directory) is None:
+                raise CommandError(f'schema artifact is missing or older than code version {version}')
+            self.stdout.write(f'Schema artifact is current ({version})')
+            return
+        artifact = schema.write(schema.generate(), version, directory)
+        self.stdout.write(self.style.SUCCESS(
+            f'Wrote openapi.{artifact.digest}.json ({len(artifact.content)} bytes) for code version {version}'
+        ))
@@ -0,0 +1,39 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from myapi.importer import FORMATS, SongImporter, guess_format
+
+
+class Command(BaseCommand):
+    help = 'Import songs from a CSV or JSONL file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--user', required=True, help='Id, username or email of the owner of the imported songs')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fuzzy', action='store_true', help='Match misspelt credit names to existing credits')
+
+    def handle(self, *args, **options):
+        fmt = options['format'] or guess_format(options['path'])
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name, pass --format')
+        lookup = Q(username=options['user']) | Q(email=options['user'])
+        if options['user'].isdigit():
+            lookup |= Q(pk=int(options['user']))
+        user = User.objects.filter(lookup).order_by('pk').first()
+        if user is None:
+            raise CommandError(f'No user "{options["user"]}"')
+
+        importer = SongImporter(user, batch_size=max(options['batch_size'], 1), fuzzy=options['fuzzy'])
+        # newline='' lets the csv module handle line breaks inside quoted lyrics
+        with open(options['path'], encoding='utf-8-sig', newline='') as lines:
+            result = importer.run(lines, fmt)
+
+        for error in result.errors:
+            self.stderr.write(f'row {error["row"]}: {error["error"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {result.created} songs in {result.seconds:.2f}s '
+            f'({result.rows_per_second or 0} rows/s), {result.failed} rows failed'
+        ))
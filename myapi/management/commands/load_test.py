@@ -0,0 +1,76 @@
+import asyncio
+import statistics
+import time
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Send concurrent GET requests to a running server and report throughput and latency. '
+        'Compare deployments by pointing it at e.g. `gunicorn lyriclib.wsgi` serving /songs/ '
+        'and `uvicorn lyriclib.asgi:application` serving /async/songs/'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('url', help='e.g. http://127.0.0.1:8000/async/songs/')
+        parser.add_argument('--token', help='JWT access token sent as "Authorization: Bearer"')
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--client-delay', type=float, default=0.0,
+                            help='Seconds each client waits before reading the response, to mimic slow clients')
+
+    def handle(self, *args, **options):
+        url = urlsplit(options['url'])
+        if url.scheme != 'http' or not url.hostname:
+            raise CommandError('Only plain http:// URLs are supported')
+        started = time.monotonic()
+        latencies, failures = asyncio.run(self.run(url, options))
+        elapsed = time.monotonic() - started
+        if not latencies:
+            raise CommandError(f'All {failures} requests failed')
+
+        latencies.sort()
+        percentile = lambda p: latencies[min(int(len(latencies) * p), len(latencies) - 1)] * 1000
+        self.stdout.write(
+            f'{len(latencies)} ok, {failures} failed in {elapsed:.2f}s: {len(latencies) / elapsed:.1f} req/s, '
+            f'latency mean {statistics.mean(latencies) * 1000:.1f} ms, p50 {percentile(0.5):.1f} ms, '
+            f'p95 {percentile(0.95):.1f} ms, p99 {percentile(0.99):.1f} ms'
+        )
+
+    async def run(self, url, options):
+        path = url.path or '/'
+        if url.query:
+            path += '?' + url.query
+        headers = f'GET {path} HTTP/1.1\r\nHost: {url.netloc}\r\nConnection: close\r\n'
+        if options['token']:
+            headers += f'Authorization: Bearer {options["token"]}\r\n'
+        request = (headers + '\r\n').encode('ascii')
+
+        remaining = iter(range(options['requests']))
+        latencies, failures = [], 0
+
+        async def client():
+            nonlocal failures
+            for _ in remaining:
+                started = time.monotonic()
+                try:
+                    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+                    writer.write(request)
+                    await writer.drain()
+                    if options['client_delay']:
+                        await asyncio.sleep(options['client_delay'])
+                    response = await reader.read()
+                    writer.close()
+                    status = int(response.split(b' ', 2)[1])
+                except (OSError, ValueError, IndexError):
+                    failures += 1
+                    continue
+                if not (200 <= status < 300 or status == 304):
+                    failures += 1
+                else:
+                    latencies.append(time.monotonic() - started)
+
+        await asyncio.gather(*(client() for _ in range(options['concurrency'])))
+        return latencies, failures
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from myapi.models import Profile
+from myapi.tasks import make_profile_image_variants
+
+
+class Command(BaseCommand):
+    help = 'Queue resized variants for profile images uploaded before the image pipeline'
+
+    def handle(self, *args, **options):
+        default = Profile._meta.get_field('image').default
+        queued = 0
+        for pk, image, variants in Profile.objects.values_list('pk', 'image', 'image_variants').iterator():
+            if image and image != default and not variants:
+                make_profile_image_variants.delay(pk)
+                queued += 1
+        self.stdout.write(self.style.SUCCESS(f'Queued {queued} profiles, run_task_workers processes them'))
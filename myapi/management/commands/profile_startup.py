@@ -0,0 +1,41 @@
+import statistics
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+
+from myapi.startup import COLD_START_BUDGET, boot, parse_importtime
+
+
+class Command(BaseCommand):
+    help = 'Measure cold-start time of the WSGI app and break it down by imported package'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5)
+        parser.add_argument('--top', type=int, default=15, help='Packages to list in the breakdown')
+        parser.add_argument('--full', action='store_true', help='Profile the normal boot instead of LEAN_BOOT')
+        parser.add_argument('--compare', action='store_true', help='Time both boots, without the breakdown')
+
+    def handle(self, *args, **options):
+        modes = [True, False] if options['compare'] else [not options['full']]
+        for lean in modes:
+            walls, boots = [], []
+            for _ in range(max(options['runs'], 1)):
+                wall, result, _ = boot(lean=lean)
+                walls.append(wall)
+                boots.append(result['seconds'])
+            self.stdout.write(
+                f'{"lean" if lean else "full"} boot: median {statistics.median(walls):.3f}s wall '
+                f'({statistics.median(boots):.3f}s in Django), min {min(walls):.3f}s, '
+                f'budget {COLD_START_BUDGET:.1f}s; lazy modules imported: {", ".join(result["modules"]) or "none"}'
+            )
+        if options['compare']:
+            return
+
+        _, _, stderr = boot(lean=modes[0], importtime=True)
+        by_package = defaultdict(int)
+        for module, self_us, _ in parse_importtime(stderr):
+            by_package[module.split('.')[0]] += self_us
+        total = sum(by_package.values())
+        self.stdout.write(f'\nimport time by package (self time, {total / 1000:.1f} ms total):')
+        for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:options['top']]:
+            self.stdout.write(f'  {package:<30} {self_us / 1000:8.1f} ms  {self_us / total:6.1%}')
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from myapi.feed import get_feed
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the materialized home feeds (FEED_STRATEGY = "write")'
+
+    def handle(self, *args, **options):
+        feed = get_feed()
+        if not hasattr(feed, 'rebuild'):
+            raise CommandError(f'The "{feed.name}" feed strategy has nothing to rebuild')
+        feed.rebuild()
+        self.stdout.write(self.style.SUCCESS('Rebuilt home feeds'))
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+
+from myapi import trending
+
+
+class Command(BaseCommand):
+    help = 'Recompute the trending scores from the reactions, comments and saves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prune', action='store_true', help='Only delete the scores that decayed below PRUNE_BELOW')
+
+    def handle(self, *args, **options):
+        if options['prune']:
+            self.stdout.write(self.style.SUCCESS(f'Pruned {trending.prune()} trending scores'))
+            return
+        self.stdout.write(self.style.SUCCESS(f'Stored {trending.rebuild()} trending scores'))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from myapi.counters import reconcile_in_ranges
+from myapi.graph import reconcile
+from myapi.models import Profile
+
+
+class Command(BaseCommand):
+    help = 'Recompute drifted Profile follower/following counters from the Follow rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--dry-run', action='store_true', help='Only report how many profiles drifted')
+
+    def handle(self, *args, **options):
+        drifted = reconcile_in_ranges(Profile, reconcile, options['batch_size'], options['dry_run'])
+        verb = 'Found' if options['dry_run'] else 'Fixed'
+        self.stdout.write(self.style.SUCCESS(f'{verb} {drifted} profiles with drifted counters'))
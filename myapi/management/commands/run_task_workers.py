@@ -0,0 +1,41 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from myapi import taskqueue
+
+
+class Command(BaseCommand):
+    help = 'Run background task workers until interrupted'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4, help='Worker threads')
+        parser.add_argument('--once', action='store_true', help='Run the ready jobs in this thread, then exit')
+        parser.add_argument('--stats', action='store_true', help='Print queue depth and latency, then exit')
+        parser.add_argument(
+            '--purge', type=int, metavar='DAYS',
+            help='Delete jobs that finished more than DAYS days ago, then exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(taskqueue.stats(), indent=2))
+            return
+        if options['purge'] is not None:
+            self.stdout.write(self.style.SUCCESS(f'Deleted {taskqueue.purge(options["purge"])} finished jobs'))
+            return
+        if options['once']:
+            self.stdout.write(self.style.SUCCESS(f'Ran {taskqueue.run_pending()} jobs'))
+            return
+
+        pool = taskqueue.WorkerPool(max(options['workers'], 1))
+        pool.start()
+        self.stdout.write(f'Running {pool.size} task workers, Ctrl-C to stop')
+        try:
+            while pool.alive():
+                time.sleep(1)
+        except KeyboardInterrupt:
+            self.stdout.write('Stopping after the running jobs')
+        finally:
+            pool.stop()
@@ -0,0 +1,26 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    help = 'Copy the SQLite primary database into the SQLite replicas (local stand-in for replication)'
+
+    def handle(self, *args, **options):
+        primary = settings.DATABASES['default']
+        if 'sqlite3' not in primary['ENGINE']:
+            raise CommandError('Only SQLite databases can be synced this way')
+        for alias in settings.REPLICA_DATABASES:
+            connections[alias].close()
+            path = settings.DATABASES[alias]['NAME']
+            source = sqlite3.connect(str(primary['NAME']))
+            target = sqlite3.connect(str(path))
+            try:
+                # the backup API copies a consistent snapshot even while the primary is written to
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            self.stdout.write(self.style.SUCCESS(f'Synced {alias} ({path})'))
@@ -0,0 +1,61 @@
+# Generated by Django 4.2.10 on 2026-10-18 09:59
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_fts_table(apps, schema_editor):
+    # FTS5 is only available on sqlite; other backends use SearchPosting
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS myapi_song_fts "
+            "USING fts5(song_title, song_lyric, tokenize='unicode61 remove_diacritics 2')"
+        )
+        cursor.execute(
+            "INSERT INTO myapi_song_fts (rowid, song_title, song_lyric) "
+            "SELECT id, song_title, song_lyric FROM myapi_songmodel"
+        )
+
+
+def drop_fts_table(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute("DROP TABLE IF EXISTS myapi_song_fts")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('song', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='search_document', serialize=False, to='myapi.songmodel')),
+                ('title_length', models.PositiveIntegerField(default=0)),
+                ('lyric_length', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='SearchPosting',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('field', models.CharField(choices=[('t', 'song_title'), ('l', 'song_lyric')], max_length=1)),
+                ('frequency', models.PositiveIntegerField(default=0)),
+                ('positions', models.TextField(blank=True)),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_postings', to='myapi.songmodel')),
+            ],
+            options={
+                'unique_together': {('term', 'song', 'field')},
+            },
+        ),
+        migrations.RunPython(create_fts_table, drop_fts_table),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0002_song_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['created_at', 'id'], name='follow_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listitem',
+            index=models.Index(fields=['added_at', 'id'], name='listitem_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['created_at', 'id'], name='reaction_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpost',
+            index=models.Index(fields=['saved_at', 'id'], name='savedpost_saved_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0003_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='songmodel',
+            name='comment_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='songmodel',
+            name='like_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='songmodel',
+            name='love_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='songmodel',
+            name='save_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # backfill from the existing rows
+        migrations.RunSQL(
+            """
+            UPDATE myapi_songmodel SET
+                like_count = (SELECT COUNT(*) FROM myapi_reaction r WHERE r.post_id = myapi_songmodel.id AND r.reaction = 'Like'),
+                love_count = (SELECT COUNT(*) FROM myapi_reaction r WHERE r.post_id = myapi_songmodel.id AND r.reaction = 'Love'),
+                comment_count = (SELECT COUNT(*) FROM myapi_comment c WHERE c.post_id = myapi_songmodel.id),
+                save_count = (SELECT COUNT(*) FROM myapi_savedpost s WHERE s.post_id = myapi_songmodel.id)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
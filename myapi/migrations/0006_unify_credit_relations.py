@@ -0,0 +1,147 @@
+# SongModel.song_artist and Artist.songs (and the same pairs for Composer,
+# Lyricist, Language and Tag) used to be two unrelated join tables. The
+# song_* tables become the explicit Song<Credit> through models, the rows of
+# the <credit>_songs tables are merged into them and <Credit>.songs is
+# re-pointed at the same table.
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+CREDITS = ['artist', 'composer', 'lyricist', 'language', 'tag']
+
+
+def canonical_table(credit):
+    return 'myapi_songmodel_song_tags' if credit == 'tag' else f'myapi_songmodel_song_{credit}'
+
+
+def merge_credit_tables(apps, schema_editor):
+    for credit in CREDITS:
+        schema_editor.execute(
+            f'INSERT INTO {canonical_table(credit)} (songmodel_id, {credit}_id) '
+            f'SELECT d.songmodel_id, d.{credit}_id FROM myapi_{credit}_songs d '
+            f'WHERE NOT EXISTS (SELECT 1 FROM {canonical_table(credit)} c '
+            f'WHERE c.songmodel_id = d.songmodel_id AND c.{credit}_id = d.{credit}_id)'
+        )
+
+
+def split_credit_tables(apps, schema_editor):
+    for credit in CREDITS:
+        schema_editor.execute(
+            f'INSERT INTO myapi_{credit}_songs (songmodel_id, {credit}_id) '
+            f'SELECT songmodel_id, {credit}_id FROM {canonical_table(credit)}'
+        )
+
+
+def through_model(name, credit):
+    return migrations.CreateModel(
+        name=name,
+        fields=[
+            ('id', models.AutoField(primary_key=True, serialize=False)),
+            ('song', models.ForeignKey(db_column='songmodel_id', on_delete=django.db.models.deletion.CASCADE, to='myapi.songmodel')),
+            (credit, models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=f'myapi.{credit}')),
+        ],
+        options={
+            'db_table': canonical_table(credit),
+            'unique_together': {('song', credit)},
+        },
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0005_home_feed'),
+    ]
+
+    operations = [
+        # the song_* tables already have exactly these columns and constraints
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                through_model('SongArtist', 'artist'),
+                through_model('SongComposer', 'composer'),
+                through_model('SongLyricist', 'lyricist'),
+                through_model('SongLanguage', 'language'),
+                through_model('SongTag', 'tag'),
+                migrations.AlterField(
+                    model_name='songmodel',
+                    name='song_artist',
+                    field=models.ManyToManyField(related_name='artist', through='myapi.SongArtist', to='myapi.artist'),
+                ),
+                migrations.AlterField(
+                    model_name='songmodel',
+                    name='song_composer',
+                    field=models.ManyToManyField(related_name='composer', through='myapi.SongComposer', to='myapi.composer'),
+                ),
+                migrations.AlterField(
+                    model_name='songmodel',
+                    name='song_lyricist',
+                    field=models.ManyToManyField(related_name='lyricist', through='myapi.SongLyricist', to='myapi.lyricist'),
+                ),
+                migrations.AlterField(
+                    model_name='songmodel',
+                    name='song_language',
+                    field=models.ManyToManyField(related_name='language', through='myapi.SongLanguage', to='myapi.language'),
+                ),
+                migrations.AlterField(
+                    model_name='songmodel',
+                    name='song_tags',
+                    field=models.ManyToManyField(related_name='song_tag', through='myapi.SongTag', to='myapi.tag'),
+                ),
+            ],
+        ),
+        migrations.RunPython(merge_credit_tables, split_credit_tables),
+        # drops the duplicated myapi_<credit>_songs tables
+        migrations.RemoveField(model_name='artist', name='songs'),
+        migrations.RemoveField(model_name='composer', name='songs'),
+        migrations.RemoveField(model_name='lyricist', name='songs'),
+        migrations.RemoveField(model_name='language', name='songs'),
+        migrations.RemoveField(model_name='tag', name='songs'),
+        # <Credit>.songs reads the canonical table, no schema change
+        migrations.AddField(
+            model_name='artist',
+            name='songs',
+            field=models.ManyToManyField(related_name='artists', through='myapi.SongArtist', to='myapi.songmodel'),
+        ),
+        migrations.AddField(
+            model_name='composer',
+            name='songs',
+            field=models.ManyToManyField(related_name='composers', through='myapi.SongComposer', to='myapi.songmodel'),
+        ),
+        migrations.AddField(
+            model_name='lyricist',
+            name='songs',
+            field=models.ManyToManyField(related_name='lyricists', through='myapi.SongLyricist', to='myapi.songmodel'),
+        ),
+        migrations.AddField(
+            model_name='language',
+            name='songs',
+            field=models.ManyToManyField(related_name='languages', through='myapi.SongLanguage', to='myapi.songmodel'),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='songs',
+            field=models.ManyToManyField(blank=True, related_name='tags', through='myapi.SongTag', to='myapi.songmodel'),
+        ),
+        # credit -> songs lookups
+        migrations.AddIndex(
+            model_name='songartist',
+            index=models.Index(fields=['artist', 'song'], name='songartist_artist_song_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='songcomposer',
+            index=models.Index(fields=['composer', 'song'], name='songcomposer_composer_song_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='songlyricist',
+            index=models.Index(fields=['lyricist', 'song'], name='songlyricist_lyricist_song_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='songlanguage',
+            index=models.Index(fields=['language', 'song'], name='songlanguage_language_song_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='songtag',
+            index=models.Index(fields=['tag', 'song'], name='songtag_tag_song_idx'),
+        ),
+    ]
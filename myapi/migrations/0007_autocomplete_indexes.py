@@ -0,0 +1,47 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0006_unify_credit_relations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='artist',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='composer',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='language',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='lyricist',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='tag',
+            name='name',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='urls',
+            name='url',
+            field=models.URLField(db_index=True),
+        ),
+        migrations.AddIndex(
+            model_name='songmodel',
+            index=models.Index(fields=['song_title', 'id'], name='song_title_idx'),
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Adds the unique Credit.normalized_name. Credits whose names only differ in
+# case, accents or spacing are merged first: the oldest row is kept and the
+# songs of the others are moved onto it.
+
+from django.db import migrations, models
+
+from myapi.names import normalize_name
+
+
+CREDITS = {
+    'Artist': ('SongArtist', 'artist'),
+    'Composer': ('SongComposer', 'composer'),
+    'Lyricist': ('SongLyricist', 'lyricist'),
+    'Language': ('SongLanguage', 'language'),
+    'Tag': ('SongTag', 'tag'),
+}
+
+
+def merge_duplicates(apps, schema_editor):
+    for model_name, (through_name, field) in CREDITS.items():
+        model = apps.get_model('myapi', model_name)
+        through = apps.get_model('myapi', through_name)
+        keepers = {}
+        for pk, name in model.objects.order_by('pk').values_list('pk', 'name').iterator():
+            normalized = normalize_name(name)
+            keeper = keepers.setdefault(normalized, pk)
+            if keeper == pk:
+                model.objects.filter(pk=pk).update(normalized_name=normalized)
+                continue
+            linked = through.objects.filter(**{f'{field}_id': keeper}).values('song_id')
+            through.objects.filter(**{f'{field}_id': pk, 'song_id__in': linked}).delete()
+            through.objects.filter(**{f'{field}_id': pk}).update(**{f'{field}_id': keeper})
+            model.objects.filter(pk=pk).delete()
+
+
+def normalized_name():
+    return models.CharField(editable=False, max_length=255, unique=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0007_autocomplete_indexes'),
+    ]
+
+    operations = [
+        *[
+            migrations.AddField(
+                model_name=model_name.lower(),
+                name='normalized_name',
+                field=models.CharField(editable=False, max_length=255, null=True),
+            )
+            for model_name in CREDITS
+        ],
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+        *[
+            migrations.AlterField(model_name=model_name.lower(), name='normalized_name', field=normalized_name())
+            for model_name in CREDITS
+        ],
+        # the unique normalized_name index replaces the plain name index
+        *[
+            migrations.AlterField(model_name=model_name.lower(), name='name', field=models.CharField(max_length=100))
+            for model_name in CREDITS
+        ],
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0008_normalized_credit_names'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['followed', 'created_at', 'id'], name='follow_followed_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='listitem',
+            index=models.Index(fields=['folder', 'added_at', 'id'], name='listitem_folder_added_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reaction',
+            index=models.Index(fields=['post', 'created_at', 'id'], name='reaction_post_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='savedpost',
+            index=models.Index(fields=['user', 'saved_at', 'id'], name='savedpost_user_saved_idx'),
+        ),
+    ]
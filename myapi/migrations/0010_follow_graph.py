@@ -0,0 +1,74 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:39
+
+from django.db import migrations, models
+
+
+def merge_profile_follows(apps, schema_editor):
+    """
+    Profile.following / followers become Follow rows: A.following holding B
+    and B.followers holding A both mean A follows B.
+    """
+    Follow = apps.get_model('myapi', 'Follow')
+    Profile = apps.get_model('myapi', 'Profile')
+    user_of = dict(Profile.objects.values_list('pk', 'user_id'))
+    edges = set()
+    for profile_id, other_id in Profile.following.through.objects.values_list('from_profile_id', 'to_profile_id'):
+        edges.add((user_of[profile_id], user_of[other_id]))
+    for profile_id, other_id in Profile.followers.through.objects.values_list('from_profile_id', 'to_profile_id'):
+        edges.add((user_of[other_id], user_of[profile_id]))
+    Follow.objects.bulk_create(
+        [Follow(follower_id=follower, followed_id=followed) for follower, followed in edges if follower != followed],
+        batch_size=1000, ignore_conflicts=True,
+    )
+
+
+def split_profile_follows(apps, schema_editor):
+    Follow = apps.get_model('myapi', 'Follow')
+    Profile = apps.get_model('myapi', 'Profile')
+    profile_of = dict(Profile.objects.values_list('user_id', 'pk'))
+    rows = [
+        (profile_of[follower], profile_of[followed])
+        for follower, followed in Follow.objects.values_list('follower_id', 'followed_id')
+        if follower in profile_of and followed in profile_of
+    ]
+    Profile.following.through.objects.bulk_create(
+        [Profile.following.through(from_profile_id=a, to_profile_id=b) for a, b in rows], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0009_social_access_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_profile_follows, split_profile_follows),
+        migrations.RemoveField(
+            model_name='profile',
+            name='followers',
+        ),
+        migrations.RemoveField(
+            model_name='profile',
+            name='following',
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='follower_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='following_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        # backfill from the Follow rows
+        migrations.RunSQL(
+            """
+            UPDATE myapi_profile SET
+                follower_count = (SELECT COUNT(*) FROM myapi_follow f WHERE f.followed_id = myapi_profile.user_id),
+                following_count = (SELECT COUNT(*) FROM myapi_follow f WHERE f.follower_id = myapi_profile.user_id)
+            """,
+            migrations.RunSQL.noop,
+        ),
+    ]
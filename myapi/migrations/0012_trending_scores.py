@@ -0,0 +1,27 @@
+# Generated by Django 4.2.10 on 2026-10-18 10:45
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0011_recommendations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrendingScore',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('window', models.CharField(choices=[('hour', 'hour'), ('day', 'day'), ('week', 'week')], max_length=4)),
+                ('score', models.FloatField()),
+                ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='myapi.songmodel')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['window', 'score', 'song'], name='trending_window_score_idx')],
+                'unique_together': {('window', 'song')},
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.10 on 2026-10-18 11:01
+# Media moved from the project root to MEDIA_ROOT = media/, and the default
+# image, which never existed at the root, now ships in profile_pics/ where
+# /media/ serves it.
+
+from django.db import migrations, models
+
+OLD_DEFAULT = 'default.jpg'
+NEW_DEFAULT = 'profile_pics/default.jpg'
+
+
+def point_at_new_default(apps, schema_editor):
+    apps.get_model('myapi', 'Profile').objects.filter(image=OLD_DEFAULT).update(image=NEW_DEFAULT)
+
+
+def point_at_old_default(apps, schema_editor):
+    apps.get_model('myapi', 'Profile').objects.filter(image=NEW_DEFAULT).update(image=OLD_DEFAULT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('myapi', '0014_profile_image_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='image',
+            field=models.ImageField(default='profile_pics/default.jpg', upload_to='profile_pics'),
+        ),
+        migrations.RunPython(point_at_new_default, point_at_old_default),
+    ]
@@ -1,7 +1,10 @@
-from datetime import timezone
+from django.utils import timezone
 from django.db import models
 from django.contrib.auth.models import AbstractBaseUser, PermissionsMixin, BaseUserManager
 from django.conf import settings
+from django.core.exceptions import ValidationError
+
+from .names import normalize_name
 
 
 SPEED_CHOICES = [
@@ -15,16 +18,30 @@ SPEED_CHOICES = [
 class SongModel(models.Model):
     song_title = models.CharField(max_length=100)
     song_lyric = models.TextField()
-    song_artist = models.ManyToManyField('Artist', related_name='artist')
-    song_composer = models.ManyToManyField('Composer', related_name='composer')
-    song_lyricist = models.ManyToManyField('Lyricist', related_name='lyricist')
-    song_language = models.ManyToManyField('Language', related_name='language')
-    song_tags = models.ManyToManyField('Tag', related_name='song_tag')
+    # song credits, each stored once in its Song<Credit> table (also read by <Credit>.songs)
+    song_artist = models.ManyToManyField('Artist', related_name='artist', through='SongArtist')
+    song_composer = models.ManyToManyField('Composer', related_name='composer', through='SongComposer')
+    song_lyricist = models.ManyToManyField('Lyricist', related_name='lyricist', through='SongLyricist')
+    song_language = models.ManyToManyField('Language', related_name='language', through='SongLanguage')
+    song_tags = models.ManyToManyField('Tag', related_name='song_tag', through='SongTag')
     song_urls = models.ManyToManyField('Urls', related_name='song_url', blank=True) 
     song_speed = models.CharField(max_length=15, choices=SPEED_CHOICES, default='MODERATE')
     song_created_at = models.TimeField(auto_now_add=True)
     song_updated_at = models.DateTimeField(auto_now=True)
     song_created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='created_songs')
+    # Denormalized counters, maintained by counters.py and reconcile_song_counters
+    like_count = models.PositiveIntegerField(default=0)
+    love_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    save_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # per-author "latest songs" index, used by the fan-out-on-read feed
+            models.Index(fields=['song_created_by', 'id'], name='song_author_idx'),
+            # title prefix lookups for the autocomplete widgets
+            models.Index(fields=['song_title', 'id'], name='song_title_idx'),
+        ]
 
 
     def __str__(self):
@@ -72,9 +89,12 @@ class Profile(models.Model):
     first_name = models.CharField(max_length=100, blank=True)
     last_name = models.CharField(max_length=100, blank=True)
     email = models.EmailField(blank=True)
-    following = models.ManyToManyField('self',symmetrical=False ,related_name='follower', blank=True)
-    followers = models.ManyToManyField('self',symmetrical=False ,related_name='followed', blank=True)
-    image = models.ImageField(upload_to='profile_pics', default='default.jpg')
+    # who follows whom lives in Follow, these are its counts (see graph.py)
+    follower_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    image = models.ImageField(upload_to='profile_pics', default='profile_pics/default.jpg')
+    # resized copies of image, {size: {extension: stored name}} (see images.py)
+    image_variants = models.JSONField(default=dict, blank=True)
     verified = models.BooleanField(default=False)
     
 
@@ -90,6 +110,24 @@ class Follow(models.Model):
 
     class Meta:
         unique_together = ('follower', 'followed')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='follow_created_idx'),
+            # a user's followers, newest first
+            models.Index(fields=['followed', 'created_at', 'id'], name='follow_followed_created_idx'),
+        ]
+
+
+class FeedEntry(models.Model):
+    # Materialized home feed row, only written with FEED_STRATEGY = 'write' (see feed.py)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='feed_entries')
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, related_name='+')
+    author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ('user', 'song')  # also the index feed pages are read from
+        indexes = [
+            models.Index(fields=['user', 'author'], name='feedentry_author_idx'),
+        ]
 
 
 class Reaction(models.Model):
@@ -105,6 +143,10 @@ class Reaction(models.Model):
 
     class Meta:
         unique_together = ('post', 'user', 'reaction')
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='reaction_created_idx'),
+            models.Index(fields=['post', 'created_at', 'id'], name='reaction_post_created_idx'),
+        ]
 
 
 class Comment(models.Model):
@@ -113,6 +155,13 @@ class Comment(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='comment_created_idx'),
+            # latest comments on a song
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+        ]
+
 # Save post model
 class SavedPost(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='saved_posts')
@@ -121,6 +170,11 @@ class SavedPost(models.Model):
 
     class Meta:
         unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['saved_at', 'id'], name='savedpost_saved_idx'),
+            # a user's saved songs, newest first
+            models.Index(fields=['user', 'saved_at', 'id'], name='savedpost_user_saved_idx'),
+        ]
 
 class Notebook(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
@@ -137,31 +191,214 @@ class ListItem(models.Model):
     post = models.ForeignKey(SongModel, on_delete=models.CASCADE)
     added_at = models.DateTimeField(auto_now_add=True)
 
-class Artist(models.Model):
+    class Meta:
+        indexes = [
+            models.Index(fields=['added_at', 'id'], name='listitem_added_idx'),
+            models.Index(fields=['folder', 'added_at', 'id'], name='listitem_folder_added_idx'),
+        ]
+
+class Credit(models.Model):
+    """
+    Base of the credit models. normalized_name (see names.normalize_name) is
+    unique, so "Beyonce" and "Beyoncé" can't become two rows.
+    """
     name = models.CharField(max_length=100)
-    songs = models.ManyToManyField(SongModel, related_name='artists')
+    normalized_name = models.CharField(max_length=255, unique=True, editable=False)
+    # lets other processes notice renames, see credits.TrigramIndex
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return self.name
+
+    def clean(self):
+        self.normalized_name = normalize_name(self.name)
+        duplicate = type(self).objects.filter(normalized_name=self.normalized_name).exclude(pk=self.pk).first()
+        if duplicate is not None:
+            raise ValidationError({'name': f'"{duplicate.name}" already exists.'})
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'normalized_name', 'updated_at'}
+        super().save(*args, **kwargs)
+
+class Artist(Credit):
+    songs = models.ManyToManyField(SongModel, related_name='artists', through='SongArtist')
     # Additional fields as needed
 
-class Composer(models.Model):
-    name = models.CharField(max_length=100)
-    songs = models.ManyToManyField(SongModel, related_name='composers')
+class Composer(Credit):
+    songs = models.ManyToManyField(SongModel, related_name='composers', through='SongComposer')
     # Additional fields as needed
 
-class Lyricist(models.Model):
-    name = models.CharField(max_length=100)
-    songs = models.ManyToManyField(SongModel, related_name='lyricists')
+class Lyricist(Credit):
+    songs = models.ManyToManyField(SongModel, related_name='lyricists', through='SongLyricist')
     # Additional fields as needed
 
-class Tag(models.Model):
-    name = models.CharField(max_length=100)
-    songs = models.ManyToManyField(SongModel, related_name='tags', blank=True)
+class Tag(Credit):
+    songs = models.ManyToManyField(SongModel, related_name='tags', blank=True, through='SongTag')
     # Additional fields as needed
 
-class Language(models.Model):
-    name = models.CharField(max_length=100)
-    songs = models.ManyToManyField(SongModel, related_name='languages')
+class Language(Credit):
+    songs = models.ManyToManyField(SongModel, related_name='languages', through='SongLanguage')
     # Additional fields as needed
 
 class Urls(models.Model):
-    url = models.URLField()
+    url = models.URLField(db_index=True)
+
+# Song <-> credit join tables. They keep the tables and columns Django created
+# for the song_* fields; SongModel.song_<credit> and <Credit>.songs both read
+# and write them, so a credit is only ever stored once.
+
+class SongArtist(models.Model):
+    id = models.AutoField(primary_key=True)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, db_column='songmodel_id')
+    artist = models.ForeignKey(Artist, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'myapi_songmodel_song_artist'
+        unique_together = ('song', 'artist')
+        indexes = [
+            models.Index(fields=['artist', 'song'], name='songartist_artist_song_idx'),
+        ]
+
+class SongComposer(models.Model):
+    id = models.AutoField(primary_key=True)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, db_column='songmodel_id')
+    composer = models.ForeignKey(Composer, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'myapi_songmodel_song_composer'
+        unique_together = ('song', 'composer')
+        indexes = [
+            models.Index(fields=['composer', 'song'], name='songcomposer_composer_song_idx'),
+        ]
+
+class SongLyricist(models.Model):
+    id = models.AutoField(primary_key=True)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, db_column='songmodel_id')
+    lyricist = models.ForeignKey(Lyricist, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'myapi_songmodel_song_lyricist'
+        unique_together = ('song', 'lyricist')
+        indexes = [
+            models.Index(fields=['lyricist', 'song'], name='songlyricist_lyricist_song_idx'),
+        ]
+
+class SongLanguage(models.Model):
+    id = models.AutoField(primary_key=True)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, db_column='songmodel_id')
+    language = models.ForeignKey(Language, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'myapi_songmodel_song_language'
+        unique_together = ('song', 'language')
+        indexes = [
+            models.Index(fields=['language', 'song'], name='songlanguage_language_song_idx'),
+        ]
+
+class SongTag(models.Model):
+    id = models.AutoField(primary_key=True)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, db_column='songmodel_id')
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        db_table = 'myapi_songmodel_song_tags'
+        unique_together = ('song', 'tag')
+        indexes = [
+            models.Index(fields=['tag', 'song'], name='songtag_tag_song_idx'),
+        ]
     
+
+# Full-text search index (pure-Python fallback, see search.py)
+
+class SearchDocument(models.Model):
+    song = models.OneToOneField(SongModel, on_delete=models.CASCADE, primary_key=True, related_name='search_document')
+    title_length = models.PositiveIntegerField(default=0)
+    lyric_length = models.PositiveIntegerField(default=0)
+
+class SearchPosting(models.Model):
+    FIELD_CHOICES = [
+        ('t', 'song_title'),
+        ('l', 'song_lyric'),
+    ]
+    term = models.CharField(max_length=64)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, related_name='search_postings')
+    field = models.CharField(max_length=1, choices=FIELD_CHOICES)
+    frequency = models.PositiveIntegerField(default=0)
+    positions = models.TextField(blank=True)  # comma separated token offsets, used for phrase queries
+
+    class Meta:
+        unique_together = ('term', 'song', 'field')  # also serves term / term prefix lookups
+
+
+# Precomputed recommendations, rebuilt by `manage.py build_recommendations` (see recommendations.py)
+
+class SimilarSong(models.Model):
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, related_name='+')
+    similar = models.ForeignKey(SongModel, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('song', 'rank')  # also the index /songs/<id>/similar/ is read from
+
+
+class FollowSuggestion(models.Model):
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+    rank = models.PositiveSmallIntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('user', 'rank')  # also the index /users/<id>/suggestions/ is read from
+
+
+class TrendingScore(models.Model):
+    # Time-decayed activity per song and window, in log space (see trending.py)
+    WINDOW_CHOICES = [
+        ('hour', 'hour'),
+        ('day', 'day'),
+        ('week', 'week'),
+    ]
+    window = models.CharField(max_length=4, choices=WINDOW_CHOICES)
+    song = models.ForeignKey(SongModel, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('window', 'song')
+        indexes = [
+            # /songs/trending/ pages, highest score first
+            models.Index(fields=['window', 'score', 'song'], name='trending_window_score_idx'),
+        ]
+
+
+# Background task queue (see taskqueue.py)
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'queued'),
+        ('running', 'running'),
+        ('done', 'done'),
+        ('failed', 'failed'),
+    ]
+    name = models.CharField(max_length=200)  # registered task, module.function
+    payload = models.TextField()  # JSON {"args": [...], "kwargs": {...}}
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [
+            # workers claim the oldest ready job
+            models.Index(fields=['status', 'run_after', 'id'], name='job_status_run_after_idx'),
+        ]
@@ -0,0 +1,31 @@
+# names.py
+"""
+Name folding shared by the credit models, the importer and credit lookups.
+Kept free of model imports so models.py can use it.
+"""
+import re
+import unicodedata
+
+_SPACE_RE = re.compile(r'\s+')
+
+
+def normalize_name(name):
+    """
+    Fold case, accents and spacing so "Beyoncé", "beyonce" and " BEYONCE "
+    compare equal. Punctuation is kept, "AC/DC" and "AC DC" stay distinct.
+    """
+    name = unicodedata.normalize('NFKD', name or '')
+    name = ''.join(c for c in name if not unicodedata.combining(c))
+    return _SPACE_RE.sub(' ', name.casefold()).strip()
+
+
+def trigrams(normalized):
+    """
+    Character trigrams of each word, padded like pg_trgm ("  ab", " ab", "ab ").
+    """
+    grams = set()
+    for word in normalized.split(' '):
+        if word:
+            padded = f'  {word} '
+            grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
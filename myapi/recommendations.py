@@ -0,0 +1,262 @@
+# recommendations.py
+"""
+"Similar songs" and "who to follow", precomputed by
+`manage.py build_recommendations` and served with one indexed read each.
+
+The batch job builds sparse matrices from the social data:
+  - user × song: how much each user engaged with each song (reactions,
+    saves and notebook list items, weighted by ENGAGEMENT_WEIGHTS);
+  - song × tag: each song's tags, with its artists as extra columns;
+  - user × user: who follows whom.
+
+Two songs are similar when the same people engaged with both (cosine of
+their user × song columns) and when they share tags and artists (cosine of
+their song × tag rows), blended with SONG_BLEND so songs nobody engaged with
+yet still get neighbours. Two users are similar when they engaged with the
+same songs, when their taste profiles (user × song · song × tag) match and
+when they follow the same accounts, blended with USER_BLEND; a user's
+suggestions are the most similar users they don't follow yet.
+
+With NumPy and SciPy installed (they are optional) the cosines are sparse
+matrix products computed a block of rows at a time; without them the same
+scores come from a pure-Python co-occurrence count over the same matrices,
+which is fine for small catalogues. A build replaces SimilarSong and
+FollowSuggestion wholesale.
+"""
+import heapq
+import math
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from .models import Follow, FollowSuggestion, ListItem, Reaction, SavedPost, SimilarSong, SongArtist, SongTag
+
+try:
+    import numpy
+    from scipy import sparse
+except ImportError:  # optional, see the module docstring
+    numpy = sparse = None
+
+TOP_K = 20  # neighbours stored per song and per user
+ENGAGEMENT_WEIGHTS = {'reaction': 1.0, 'save': 2.0, 'list_item': 2.0}
+ARTIST_WEIGHT = 2.0  # a shared artist counts as much as two shared tags
+SONG_BLEND = {'engagement': 0.6, 'tags': 0.4}
+USER_BLEND = {'engagement': 0.5, 'taste': 0.3, 'follows': 0.2}
+BLOCK_CELLS = 4_000_000  # dense similarity cells per block of rows on the SciPy path
+BATCH_SIZE = 1000
+ENGINES = ('auto', 'scipy', 'python')
+
+
+def _add(matrix, row, column, weight):
+    cells = matrix.setdefault(row, {})
+    cells[column] = cells.get(column, 0.0) + weight
+
+
+def engagement_matrix():
+    """
+    user × song as {user id: {song id: weight}}.
+    """
+    matrix = {}
+    sources = [
+        (Reaction.objects.values_list('user_id', 'post_id'), ENGAGEMENT_WEIGHTS['reaction']),
+        (SavedPost.objects.values_list('user_id', 'post_id'), ENGAGEMENT_WEIGHTS['save']),
+        (ListItem.objects.values_list('folder__notebook__user_id', 'post_id'), ENGAGEMENT_WEIGHTS['list_item']),
+    ]
+    for rows, weight in sources:
+        for user_id, song_id in rows.iterator():
+            _add(matrix, user_id, song_id, weight)
+    return matrix
+
+
+def tag_matrix():
+    """
+    song × tag as {song id: {('tag', id) or ('artist', id): weight}}.
+    """
+    matrix = {}
+    for song_id, tag_id in SongTag.objects.values_list('song_id', 'tag_id').iterator():
+        _add(matrix, song_id, ('tag', tag_id), 1.0)
+    for song_id, artist_id in SongArtist.objects.values_list('song_id', 'artist_id').iterator():
+        _add(matrix, song_id, ('artist', artist_id), ARTIST_WEIGHT)
+    return matrix
+
+
+def follow_matrix():
+    """
+    user × user as {follower id: {followed id: 1.0}}.
+    """
+    matrix = {}
+    for follower_id, followed_id in Follow.objects.values_list('follower_id', 'followed_id').iterator():
+        _add(matrix, follower_id, followed_id, 1.0)
+    return matrix
+
+
+def transpose(matrix):
+    result = {}
+    for row, cells in matrix.items():
+        for column, value in cells.items():
+            result.setdefault(column, {})[row] = value
+    return result
+
+
+def product(left, right):
+    """
+    left × right, for {row: {column: value}} matrices.
+    """
+    result = {}
+    for row, cells in left.items():
+        for middle, value in cells.items():
+            for column, other in right.get(middle, {}).items():
+                _add(result, row, column, value * other)
+    return result
+
+
+def _normalized(matrix):
+    result = {}
+    for row, cells in matrix.items():
+        norm = math.sqrt(sum(value * value for value in cells.values()))
+        if norm:
+            result[row] = {column: value / norm for column, value in cells.items()}
+    return result
+
+
+def _top(scored, k):
+    # best score first, ties broken by the smaller id; rounding keeps float
+    # noise from ordering ties differently on the two engines
+    return heapq.nsmallest(k, scored, key=lambda pair: (-round(pair[1], 9), pair[0]))
+
+
+def python_neighbours(blocks, k, exclude):
+    """
+    Yield (row id, [(other row id, score)]) with the k best blended cosine
+    scores, for blocks of [(weight, {row: {column: value}})]. Rows in
+    exclude[row] and the row itself are left out.
+    """
+    prepared = []
+    for weight, matrix in blocks:
+        rows = _normalized(matrix)
+        prepared.append((weight, rows, transpose(rows)))
+    for row in sorted(set().union(*(rows for _, rows, _ in prepared))):
+        scores = {}
+        for weight, rows, columns in prepared:
+            # co-occurrence: only rows sharing a column with this one get a score
+            for column, value in rows.get(row, {}).items():
+                for other, other_value in columns[column].items():
+                    scores[other] = scores.get(other, 0.0) + weight * value * other_value
+        skip = exclude.get(row, ())
+        yield row, _top(
+            [(other, score) for other, score in scores.items() if other != row and other not in skip and score > 0], k,
+        )
+
+
+def scipy_neighbours(blocks, k, exclude):
+    """
+    python_neighbours() with sparse matrix products.
+    """
+    ids = sorted(set().union(*(matrix for _, matrix in blocks)))
+    index = {row: position for position, row in enumerate(ids)}
+    prepared = []
+    for weight, matrix in blocks:
+        columns = {}
+        rows, cols, data = [], [], []
+        for row, cells in matrix.items():
+            for column, value in cells.items():
+                rows.append(index[row])
+                cols.append(columns.setdefault(column, len(columns)))
+                data.append(value)
+        x = sparse.csr_matrix((data, (rows, cols)), shape=(len(ids), max(len(columns), 1)))
+        norms = numpy.sqrt(numpy.asarray(x.multiply(x).sum(axis=1)).ravel())
+        norms[norms == 0] = 1.0
+        x = sparse.csr_matrix(sparse.diags(1.0 / norms) @ x)
+        prepared.append((weight, x, x.T.tocsr()))
+
+    block = max(1, BLOCK_CELLS // max(len(ids), 1))
+    for start in range(0, len(ids), block):
+        stop = min(start + block, len(ids))
+        scores = numpy.zeros((stop - start, len(ids)))
+        for weight, x, xt in prepared:
+            scores += weight * (x[start:stop] @ xt).toarray()
+        for offset, line in enumerate(scores):
+            row = ids[start + offset]
+            line[start + offset] = 0.0
+            for other in exclude.get(row, ()):
+                if other in index:
+                    line[index[other]] = 0.0
+            candidates = numpy.flatnonzero(line > 0)
+            if len(candidates) > k:
+                # everything tied with the k-th best, _top() settles the ties
+                threshold = numpy.partition(line[candidates], -k)[-k]
+                candidates = candidates[line[candidates] >= threshold - 1e-9]
+            yield row, _top([(ids[position], float(line[position])) for position in candidates], k)
+
+
+def get_engine(name='auto'):
+    if name not in ENGINES:
+        raise ValueError(f'Unknown engine "{name}", use one of {", ".join(ENGINES)}.')
+    if name == 'auto':
+        name = 'python' if sparse is None else 'scipy'
+    if name == 'scipy' and sparse is None:
+        raise ValueError('The scipy engine needs NumPy and SciPy installed.')
+    return scipy_neighbours if name == 'scipy' else python_neighbours
+
+
+def song_neighbours(engagement, tags, k=TOP_K, engine='auto'):
+    blocks = [(SONG_BLEND['engagement'], transpose(engagement)), (SONG_BLEND['tags'], tags)]
+    return get_engine(engine)(blocks, k, {})
+
+
+def user_neighbours(engagement, tags, follows, k=TOP_K, engine='auto'):
+    blocks = [
+        (USER_BLEND['engagement'], engagement),
+        (USER_BLEND['taste'], product(engagement, tags)),
+        (USER_BLEND['follows'], follows),
+    ]
+    return get_engine(engine)(blocks, k, follows)
+
+
+def _replace(model, owner, other, neighbours):
+    model.objects.all().delete()
+    rows = [
+        model(**{owner: row, other: other_id, 'rank': rank, 'score': score})
+        for row, best in neighbours for rank, (other_id, score) in enumerate(best)
+    ]
+    model.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def build(k=TOP_K, engine='auto'):
+    """
+    Recompute every song's and user's neighbours. Returns (similar song
+    rows, follow suggestion rows) written.
+    """
+    get_engine(engine)  # fail before loading anything
+    engagement, tags, follows = engagement_matrix(), tag_matrix(), follow_matrix()
+    songs = list(song_neighbours(engagement, tags, k, engine))
+    users = list(user_neighbours(engagement, tags, follows, k, engine))
+    # the scoring above runs outside the transaction, only the swap holds the write lock
+    with transaction.atomic():
+        return (
+            _replace(SimilarSong, 'song_id', 'similar_id', songs),
+            _replace(FollowSuggestion, 'user_id', 'suggested_id', users),
+        )
+
+
+def similar_songs(song_id, limit=TOP_K):
+    """
+    [(song id, score)] most similar to song_id first, from the (song, rank)
+    index.
+    """
+    return list(
+        SimilarSong.objects.filter(song_id=song_id).order_by('rank').values_list('similar_id', 'score')[:limit]
+    )
+
+
+def follow_suggestions(user_id, limit=TOP_K):
+    """
+    [(user id, username, score)] suggested to user_id, best first, from the
+    (user, rank) index. Accounts followed since the last build are skipped.
+    """
+    followed = Follow.objects.filter(follower_id=user_id, followed_id=OuterRef('suggested_id'))
+    return list(
+        FollowSuggestion.objects.filter(user_id=user_id).exclude(Exists(followed)).order_by('rank')
+        .values_list('suggested_id', 'suggested__username', 'score')[:limit]
+    )
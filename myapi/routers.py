@@ -0,0 +1,143 @@
+# routers.py
+"""
+Primary / replica database routing.
+
+Writes always go to 'default'. Reads go to one of REPLICA_DATABASES, but only
+inside replica_reads() (the read-heavy API viewsets turn it on for GET and
+HEAD) and never inside a transaction. ReplicaPinningMiddleware pins a user to
+the primary for REPLICA_LAG_SECONDS after any successful write request, so
+they read their own writes while the replicas catch up. The pin is a signed
+cookie rather than a cache entry, so every worker sees it whatever cache
+backend they share; clients that drop cookies aren't pinned.
+
+Locally the replicas can be plain SQLite copies of the primary, refreshed
+with `manage.py sync_sqlite_replicas` (see DATABASE_REPLICAS in settings).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica_reads = ContextVar('replica_reads', default=False)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+PIN_COOKIE = 'db_pin'
+PIN_SALT = 'myapi.routers.pin'
+
+
+def replicas():
+    return getattr(settings, 'REPLICA_DATABASES', [])
+
+
+def start_replica_reads():
+    """
+    Route reads to the replicas in the current context, until
+    stop_replica_reads() is called with the returned token.
+    """
+    return _replica_reads.set(True)
+
+
+def stop_replica_reads(token):
+    _replica_reads.reset(token)
+
+
+@contextmanager
+def replica_reads():
+    token = start_replica_reads()
+    try:
+        yield
+    finally:
+        stop_replica_reads(token)
+
+
+@contextmanager
+def primary_reads():
+    """
+    Read from the primary inside replica_reads(), e.g. to fill a shared
+    cache that a lagging replica must not put stale rows into.
+    """
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def reading_from_replicas():
+    return bool(replicas()) and _replica_reads.get()
+
+
+def _lag():
+    return getattr(settings, 'REPLICA_LAG_SECONDS', 5)
+
+
+def pin_to_primary(response, user_id):
+    # the signature is timestamped, so the pin also expires server side
+    response.set_signed_cookie(PIN_COOKIE, str(user_id), salt=PIN_SALT, max_age=_lag(), httponly=True, samesite='Lax')
+
+
+def is_pinned(request):
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return False
+    return request.get_signed_cookie(PIN_COOKIE, default=None, salt=PIN_SALT, max_age=_lag()) == str(user.pk)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if not reading_from_replicas() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas())
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # every alias holds the same data
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # replicas get their schema from the primary
+        return False if db in replicas() else None
+
+
+class ReplicaPinningMiddleware:
+    """
+    Pin the user to the primary after a successful write request. Runs after
+    the view, so request.user is also set for JWT-authenticated API calls.
+    Sync and async capable, so under ASGI the /async/ views aren't adapted
+    to run in a thread.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        response = self.get_response(request)
+        if self._may_pin(request, response):
+            self._pin(request, response)
+        return response
+
+    async def __acall__(self, request):
+        response = await self.get_response(request)
+        if self._may_pin(request, response):
+            # a session user is loaded lazily, with a synchronous query
+            await sync_to_async(self._pin)(request, response)
+        return response
+
+    def _may_pin(self, request, response):
+        return request.method not in SAFE_METHODS and response.status_code < 400 and bool(replicas())
+
+    def _pin(self, request, response):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            pin_to_primary(response, user.pk)
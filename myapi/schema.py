@@ -0,0 +1,172 @@
+# schema.py
+"""
+Pre-generated OpenAPI schema behind /swagger/ and /redoc/.
+
+Generating the document introspects every viewset and serializer, so it is
+built once per code version instead of on every request:
+`manage.py generate_schema` (run it at build time) writes
+static/schema/openapi.<content hash>.json plus a manifest recording the code
+version it was built from. The docs pages fetch the document from their own
+URL with ?format=openapi; that request is answered from the artifact, with
+the content hash as ETag. When the manifest is missing or was built from
+other code, the first request regenerates it (and writes it back when the
+directory is writable, it isn't on Vercel).
+
+The code version is a hash of the project's Python sources (tests,
+migrations and management commands left out), or SCHEMA_CODE_VERSION when
+set. The artifact is a build output and stays out of git (static/schema/ is
+ignored): run `manage.py generate_schema` in the deploy step, `--check`
+tells whether the stored one is current. Where there is no build step, as
+with the plain @vercel/python builder, each instance generates it on the
+first docs request and keeps it in memory.
+"""
+import functools
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import namedtuple
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import permissions
+
+from .views import with_validators
+
+logger = logging.getLogger(__name__)
+
+MANIFEST = 'manifest.json'
+SOURCE_PACKAGES = ('lyriclib', 'myapi')
+SPEC_FORMATS = ('openapi', 'json')  # ?format= values answered from the artifact
+MAX_AGE = 300  # seconds browsers may reuse the document before revalidating
+
+Artifact = namedtuple('Artifact', 'version digest content')
+
+_artifact = None
+_lock = threading.Lock()
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    if os.environ.get('SCHEMA_CODE_VERSION'):
+        return os.environ['SCHEMA_CODE_VERSION']
+    from drf_yasg import __version__ as drf_yasg_version
+
+    digest = hashlib.sha256(drf_yasg_version.encode('utf-8'))
+    for package in SOURCE_PACKAGES:
+        for path in sorted((settings.BASE_DIR / package).rglob('*.py')):
+            relative = path.relative_to(settings.BASE_DIR)
+            if 'tests' in path.stem or {'management', 'migrations'} & set(relative.parts):
+                continue
+            digest.update(str(relative).encode('utf-8'))
+            digest.update(path.read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def schema_info():
+    from drf_yasg import openapi
+
+    return openapi.Info(
+        title="LyricLib API",
+        default_version='v1',
+        description="API documentation for LyricLib",
+        terms_of_service="https://www.google.com/policies/terms/",
+        contact=openapi.Contact(email="contact@lyriclib.local"),
+        license=openapi.License(name="BSD License"),
+    )
+
+
+def generate():
+    """
+    The OpenAPI document of the whole API as JSON bytes, public like the docs
+    pages.
+    """
+    from drf_yasg.codecs import OpenAPICodecJson
+    from drf_yasg.generators import OpenAPISchemaGenerator
+
+    schema = OpenAPISchemaGenerator(schema_info()).get_schema(request=None, public=True)
+    return OpenAPICodecJson(validators=[]).encode(schema)
+
+
+def write(content, version, directory=None):
+    """
+    Store `content` as openapi.<hash>.json and point the manifest at it,
+    removing documents from earlier builds. Returns the Artifact.
+    """
+    directory = directory or settings.SCHEMA_DIR
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    name = f'openapi.{digest}.json'
+    directory.mkdir(parents=True, exist_ok=True)
+    (directory / name).write_bytes(content)
+    (directory / MANIFEST).write_text(json.dumps({'version': version, 'file': name, 'hash': digest}, indent=2))
+    for stale in directory.glob('openapi.*.json'):
+        if stale.name != name:
+            stale.unlink()
+    return Artifact(version, digest, content)
+
+
+def read(version, directory=None):
+    """
+    The stored Artifact when it was built from `version`, else None.
+    """
+    directory = directory or settings.SCHEMA_DIR
+    try:
+        manifest = json.loads((directory / MANIFEST).read_text())
+        if manifest['version'] != version:
+            return None
+        return Artifact(version, manifest['hash'], (directory / manifest['file']).read_bytes())
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def get_artifact():
+    global _artifact
+    version = code_version()
+    if _artifact is None or _artifact.version != version:
+        with _lock:
+            if _artifact is None or _artifact.version != version:
+                _artifact = read(version) or _regenerate(version)
+    return _artifact
+
+
+def _regenerate(version):
+    logger.info('schema artifact missing or stale, regenerating for %s', version)
+    content = generate()
+    try:
+        return write(content, version)
+    except OSError:
+        logger.warning('could not store the schema artifact, keeping it in memory')
+        return Artifact(version, hashlib.sha256(content).hexdigest()[:12], content)
+
+
+def schema_document(request):
+    artifact = get_artifact()
+
+    def build_response():
+        response = HttpResponse(artifact.content, content_type='application/openapi+json')
+        response['Cache-Control'] = f'public, max-age={MAX_AGE}'
+        return response
+    return with_validators(request, f'"{artifact.digest}"', None, build_response)
+
+
+@functools.lru_cache(maxsize=None)
+def ui_view(renderer):
+    # drf_yasg is slow to import, so it's only loaded once the docs are requested;
+    # the HTML page itself needs no schema generation
+    from drf_yasg.views import get_schema_view
+
+    schema_view = get_schema_view(schema_info(), public=True, permission_classes=(permissions.AllowAny,))
+    return schema_view.with_ui(renderer, cache_timeout=0)
+
+
+def swagger_ui(request, *args, **kwargs):
+    if request.GET.get('format') in SPEC_FORMATS:
+        return schema_document(request)
+    return ui_view('swagger')(request, *args, **kwargs)
+
+
+def redoc_ui(request, *args, **kwargs):
+    if request.GET.get('format') in SPEC_FORMATS:
+        return schema_document(request)
+    return ui_view('redoc')(request, *args, **kwargs)
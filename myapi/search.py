@@ -0,0 +1,281 @@
+# search.py
+"""
+Full-text lyric search over SongModel.song_title and SongModel.song_lyric.
+
+Two backends share the same query syntax:
+  - fts5: an SQLite FTS5 virtual table (created by migration 0002 when the
+    bundled sqlite build has FTS5), ranked with the built-in bm25().
+  - inverted: a pure-Python inverted index stored in SearchPosting /
+    SearchDocument, ranked with the same BM25 formula. Used on every other
+    database backend.
+
+Query syntax: plain words are ANDed, "quoted text" is a phrase and a trailing
+* makes a prefix term (e.g. `"hold me" danc*`).
+"""
+import math
+import re
+import unicodedata
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count
+
+from .models import SearchDocument, SearchPosting, SongModel
+
+FTS_TABLE = 'myapi_song_fts'
+
+# bm25 tuning, title matches count ten times as much as lyric matches
+TITLE_WEIGHT = 10.0
+LYRIC_WEIGHT = 1.0
+K1 = 1.2
+B = 0.75
+
+MAX_PREFIX_TERMS = 50  # cap on how many index terms a prefix may expand to
+MAX_TERM_LENGTH = 64  # matches SearchPosting.term max_length
+
+_TOKEN_RE = re.compile(r'[^\W_]+')
+_QUERY_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+def tokenize(text):
+    # Same folding as FTS5's unicode61 tokenizer with remove_diacritics 2
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c))
+    return [token[:MAX_TERM_LENGTH] for token in _TOKEN_RE.findall(text.lower())]
+
+
+def parse_query(query):
+    """
+    Split a search string into clauses of (kind, tokens), kind being one of
+    'term', 'prefix' or 'phrase'. All clauses must match.
+    """
+    clauses = []
+    for phrase, word in _QUERY_RE.findall(query or ''):
+        tokens = tokenize(phrase or word)
+        if not tokens:
+            continue
+        if len(tokens) > 1:
+            # "don't" tokenizes to two tokens, so it is searched as a phrase too
+            clauses.append(('phrase', tokens))
+        elif word and word.endswith('*'):
+            clauses.append(('prefix', tokens))
+        else:
+            clauses.append(('term', tokens))
+    return clauses
+
+
+def _idf(total, df):
+    return math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+
+def _bm25(tf, length, avg_length):
+    if not avg_length:
+        return 0.0
+    return tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+
+class Fts5Backend:
+    name = 'fts5'
+
+    def index(self, song):
+        self.index_many([song])
+
+    def index_many(self, songs):
+        with connection.cursor() as cursor:
+            cursor.executemany('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [[song.pk] for song in songs])
+            cursor.executemany(
+                'INSERT INTO %s (rowid, song_title, song_lyric) VALUES (%%s, %%s, %%s)' % FTS_TABLE,
+                [[song.pk, song.song_title, song.song_lyric] for song in songs],
+            )
+
+    def remove(self, song_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s WHERE rowid = %%s' % FTS_TABLE, [song_id])
+
+    @transaction.atomic
+    def rebuild(self, batch_size=1000):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM %s' % FTS_TABLE)
+            cursor.execute(
+                'INSERT INTO %s (rowid, song_title, song_lyric) '
+                'SELECT id, song_title, song_lyric FROM myapi_songmodel' % FTS_TABLE
+            )
+            cursor.execute("INSERT INTO %s (%s) VALUES ('optimize')" % (FTS_TABLE, FTS_TABLE))
+
+    def search(self, clauses, limit, offset):
+        parts = []
+        for kind, tokens in clauses:
+            # tokens never contain quotes, so quoting them is enough to escape FTS5 syntax
+            expression = '"%s"' % ' '.join(tokens)
+            parts.append(expression + '*' if kind == 'prefix' else expression)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid, bm25(%s, %%s, %%s) AS rank FROM %s WHERE %s MATCH %%s '
+                'ORDER BY rank LIMIT %%s OFFSET %%s' % (FTS_TABLE, FTS_TABLE, FTS_TABLE),
+                [TITLE_WEIGHT, LYRIC_WEIGHT, ' AND '.join(parts), limit, offset],
+            )
+            # bm25() is negative, lower is better
+            return [(song_id, -rank) for song_id, rank in cursor.fetchall()]
+
+
+class InvertedIndexBackend:
+    name = 'inverted'
+
+    def index(self, song):
+        self.index_many([song])
+
+    @transaction.atomic
+    def index_many(self, songs):
+        song_ids = [song.pk for song in songs]
+        SearchPosting.objects.filter(song_id__in=song_ids).delete()
+        SearchDocument.objects.filter(song_id__in=song_ids).delete()
+        postings = []
+        documents = []
+        for song in songs:
+            lengths = {}
+            for field, text in (('t', song.song_title), ('l', song.song_lyric)):
+                tokens = tokenize(text)
+                lengths[field] = len(tokens)
+                positions = defaultdict(list)
+                for offset, token in enumerate(tokens):
+                    positions[token].append(offset)
+                for term, offsets in positions.items():
+                    postings.append(SearchPosting(
+                        term=term, song_id=song.pk, field=field,
+                        frequency=len(offsets), positions=','.join(map(str, offsets)),
+                    ))
+            documents.append(SearchDocument(song_id=song.pk, title_length=lengths['t'], lyric_length=lengths['l']))
+        SearchPosting.objects.bulk_create(postings, batch_size=500)
+        SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+    def remove(self, song_id):
+        SearchPosting.objects.filter(song_id=song_id).delete()
+        SearchDocument.objects.filter(song_id=song_id).delete()
+
+    def rebuild(self, batch_size=1000):
+        SearchPosting.objects.all().delete()
+        SearchDocument.objects.all().delete()
+        songs = SongModel.objects.only('pk', 'song_title', 'song_lyric').order_by('pk')
+        batch = []
+        for song in songs.iterator(chunk_size=batch_size):
+            batch.append(song)
+            if len(batch) == batch_size:
+                self.index_many(batch)
+                batch = []
+        if batch:
+            self.index_many(batch)
+
+    def _matches(self, kind, tokens, candidates):
+        """
+        Return {(song_id, field): tf} for one clause. For phrases tf is the
+        number of times the whole phrase occurs.
+        """
+        postings = SearchPosting.objects.all()
+        if candidates is not None:
+            postings = postings.filter(song_id__in=candidates)
+
+        if kind == 'prefix':
+            terms = list(
+                SearchPosting.objects.filter(term__startswith=tokens[0])
+                .values_list('term', flat=True).distinct()[:MAX_PREFIX_TERMS]
+            )
+            rows = postings.filter(term__in=terms).values_list('song_id', 'field', 'frequency')
+        elif kind == 'term':
+            rows = postings.filter(term=tokens[0]).values_list('song_id', 'field', 'frequency')
+        else:
+            return self._phrase_matches(tokens, postings)
+
+        matches = defaultdict(int)
+        for song_id, field, frequency in rows:
+            matches[(song_id, field)] += frequency
+        return matches
+
+    def _phrase_matches(self, tokens, postings):
+        offsets = defaultdict(dict)
+        rows = postings.filter(term__in=set(tokens)).values_list('song_id', 'field', 'term', 'positions')
+        for song_id, field, term, positions in rows:
+            offsets[(song_id, field)][term] = {int(p) for p in positions.split(',') if p}
+
+        matches = {}
+        for key, by_term in offsets.items():
+            if len(by_term) < len(set(tokens)):
+                continue
+            tf = sum(
+                1 for start in by_term[tokens[0]]
+                if all(start + i in by_term[token] for i, token in enumerate(tokens))
+            )
+            if tf:
+                matches[key] = tf
+        return matches
+
+    def search(self, clauses, limit, offset):
+        stats = SearchDocument.objects.aggregate(
+            total=Count('pk'), avg_title=Avg('title_length'), avg_lyric=Avg('lyric_length'),
+        )
+        total = stats['total']
+        if not total:
+            return []
+
+        candidates = None
+        clause_matches = []
+        for kind, tokens in clauses:
+            # once the candidate set is small, narrow the following posting scans to it
+            narrowed = candidates if candidates is not None and len(candidates) <= 500 else None
+            matches = self._matches(kind, tokens, narrowed)
+            songs = {song_id for song_id, _ in matches}
+            candidates = songs if candidates is None else candidates & songs
+            if not candidates:
+                return []
+            # df of a narrowed clause is only counted over the candidates, which
+            # shifts weight between clauses but not the order within one
+            clause_matches.append((len(songs), matches))
+
+        lengths = {}
+        candidate_list = list(candidates)
+        for start in range(0, len(candidate_list), 500):
+            documents = SearchDocument.objects.filter(song_id__in=candidate_list[start:start + 500])
+            for song_id, title_length, lyric_length in documents.values_list('song_id', 'title_length', 'lyric_length'):
+                lengths[(song_id, 't')] = title_length
+                lengths[(song_id, 'l')] = lyric_length
+
+        averages = {'t': stats['avg_title'], 'l': stats['avg_lyric']}
+        weights = {'t': TITLE_WEIGHT, 'l': LYRIC_WEIGHT}
+        scores = defaultdict(float)
+        for df, matches in clause_matches:
+            idf = _idf(total, df)
+            for (song_id, field), tf in matches.items():
+                if song_id in candidates:
+                    scores[song_id] += weights[field] * idf * _bm25(tf, lengths.get((song_id, field), 0), averages[field])
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[offset:offset + limit]
+
+
+_backend = None
+
+
+def _fts5_available():
+    if connection.vendor != 'sqlite':
+        return False
+    return FTS_TABLE in connection.introspection.table_names()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        choice = getattr(settings, 'LYRIC_SEARCH_BACKEND', 'auto')
+        if choice == 'auto':
+            choice = 'fts5' if _fts5_available() else 'inverted'
+        _backend = Fts5Backend() if choice == 'fts5' else InvertedIndexBackend()
+    return _backend
+
+
+def search_songs(query, limit=20, offset=0):
+    """
+    Return a list of (song_id, score) pairs, best match first.
+    """
+    clauses = parse_query(query)
+    if not clauses:
+        return []
+    return get_backend().search(clauses, limit, offset)
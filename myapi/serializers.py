@@ -1,67 +1,279 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models import Prefetch
 from .models import (
     SongModel, CustomUser, Profile, Follow, Reaction, Comment, SavedPost,
     Notebook, Folder, ListItem, Artist, Composer, Lyricist, Tag, Language, Urls
 )
+from .images import variant_urls
 
-class UserSerializer(serializers.ModelSerializer):
+READ_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+def parse_selection(value):
+    """
+    'id,post.song_title' -> {'id': {}, 'post': {'song_title': {}}}
+    """
+    tree = {}
+    for path in value.split(','):
+        node = tree
+        for name in filter(None, (part.strip() for part in path.split('.'))):
+            node = node.setdefault(name, {})
+    return tree
+
+
+def selection_from_request(request):
+    """
+    (fields, expand) trees from ?fields= and ?expand= of a read request;
+    fields is None when every field is wanted.
+    """
+    if request is None or request.method not in READ_METHODS:
+        return None, {}
+    params = getattr(request, 'query_params', request.GET)
+    fields = parse_selection(params['fields']) if params.get('fields') else None
+    return fields, parse_selection(params.get('expand', ''))
+
+
+def _nested(field):
+    """
+    (nested serializer, many) for a nested serializer field, else (None, False).
+    """
+    many = isinstance(field, serializers.ListSerializer)
+    nested = field.child if many else field
+    if isinstance(nested, serializers.BaseSerializer):
+        return nested, many
+    return None, False
+
+
+class SparseFieldsMixin:
+    """
+    Field selection with ?fields=id,text and ?expand=post,folder.notebook
+    (dots reach into expanded relations; selecting post.song_title also
+    expands post). Nested serializer fields render as primary keys unless
+    expanded. The query parameters are read from the request in the context
+    on reads only; `fields` and `expand` keyword arguments take precedence.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        if fields is None and expand is None:
+            fields, expand = selection_from_request(kwargs.get('context', {}).get('request'))
+        self.selected_fields, self.expanded_fields = fields, expand or {}
+        super().__init__(*args, **kwargs)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        selected, expanded = self.selected_fields, self.expanded_fields
+        for name, field in list(fields.items()):
+            if selected is not None and name not in selected and not field.write_only:
+                del fields[name]
+                continue
+            nested, many = _nested(field)
+            if nested is None:
+                continue
+            options = {'many': many, 'read_only': True}
+            if field.source:
+                options['source'] = field.source
+            sub_fields = (selected or {}).get(name) or None
+            if name in expanded or sub_fields:
+                fields[name] = type(nested)(fields=sub_fields, expand=expanded.get(name, {}), **options)
+            else:
+                fields[name] = serializers.PrimaryKeyRelatedField(**options)
+        return fields
+
+    @classmethod
+    def nested_fields(cls):
+        """
+        {field name: nested serializer class} of the declared nested fields.
+        """
+        return {
+            name: type(nested) for name, nested in
+            ((name, _nested(field)[0]) for name, field in cls._declared_fields.items())
+            if nested is not None
+        }
+
+    @classmethod
+    def select(cls, data, fields=None, expand=None):
+        """
+        Apply a selection to data rendered with its nested fields expanded
+        (the cached song representation), like get_fields() would have.
+        """
+        expand = expand or {}
+        nested_fields = cls.nested_fields()
+        selected = {}
+        for name, value in data.items():
+            if fields is not None and name not in fields:
+                continue
+            sub_fields = (fields or {}).get(name) or None
+            if name not in nested_fields or value is None:
+                selected[name] = value
+            elif name in expand or sub_fields:
+                items = value if isinstance(value, list) else [value]
+                rendered = [nested_fields[name].select(item, sub_fields, expand.get(name)) for item in items]
+                selected[name] = rendered if isinstance(value, list) else rendered[0]
+            else:
+                selected[name] = [item['id'] for item in value] if isinstance(value, list) else value['id']
+        return selected
+
+
+class EagerLoadingMixin:
+    """
+    Derives a select_related/prefetch_related plan from the serializer's own
+    fields (nested serializers and primary key lists), so views can load a
+    page of objects in a constant number of queries.
+    """
+
+    @classmethod
+    def get_eager_loading(cls, prefix='', serializer=None):
+        """
+        Return (select_related lookups, {prefetch lookup: queryset or None})
+        for `serializer` (by default an instance without field selection).
+        A None queryset means the full related objects are needed.
+        """
+        model = cls.Meta.model
+        select, prefetch = [], {}
+        serializer = serializer if serializer is not None else cls()
+
+        def add_prefetch(lookup, queryset=None):
+            if queryset is None or lookup not in prefetch:
+                prefetch[lookup] = queryset
+
+        for field in serializer.fields.values():
+            if field.write_only or field.source == '*' or '.' in field.source:
+                continue
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if not model_field.is_relation:
+                continue
+
+            lookup = prefix + field.source
+            many = model_field.many_to_many or model_field.one_to_many
+            if isinstance(field, serializers.ManyRelatedField):
+                # only the related primary keys are rendered
+                add_prefetch(lookup, model_field.related_model._default_manager.only('pk'))
+                continue
+
+            nested = field.child if isinstance(field, serializers.ListSerializer) else field
+            if not isinstance(nested, serializers.BaseSerializer):
+                continue  # plain FK primary keys are read from <field>_id
+            nested_select, nested_prefetch = [], {}
+            if isinstance(nested, EagerLoadingMixin):
+                nested_select, nested_prefetch = type(nested).get_eager_loading(lookup + '__', nested)
+            if many:
+                add_prefetch(lookup)
+                for nested_lookup in nested_select:
+                    add_prefetch(nested_lookup)
+            else:
+                select.append(lookup)
+                select.extend(nested_select)
+            for nested_lookup, queryset in nested_prefetch.items():
+                add_prefetch(nested_lookup, queryset)
+        return select, prefetch
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, serializer=None):
+        select, prefetch = cls.get_eager_loading(serializer=serializer)
+        if select:
+            queryset = queryset.select_related(*select)
+        if prefetch:
+            queryset = queryset.prefetch_related(*[
+                lookup if related is None else Prefetch(lookup, queryset=related)
+                for lookup, related in prefetch.items()
+            ])
+        return queryset
+
+
+class UserSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'password']
         extra_kwargs = {'password': {'write_only': True}}
 
-class ProfileSerializer(serializers.ModelSerializer):
+class ImageVariantsField(serializers.Field):
+    """
+    Profile.image_variants as {size: {extension: URL}}, absolute like DRF's
+    ImageField when the request is in the context.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        return variant_urls(value, self.context.get('request'))
+
+class ProfileSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
+    image_variants = ImageVariantsField()
 
     class Meta:
         model = Profile
         fields = '__all__'
+        read_only_fields = ['follower_count', 'following_count']
 
-class ArtistSerializer(serializers.ModelSerializer):
+class ArtistSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Artist
         fields = '__all__'
 
-class ComposerSerializer(serializers.ModelSerializer):
+class ComposerSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Composer
         fields = '__all__'
 
-class LyricistSerializer(serializers.ModelSerializer):
+class LyricistSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Lyricist
         fields = '__all__'
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Tag
         fields = '__all__'
 
-class LanguageSerializer(serializers.ModelSerializer):
+class LanguageSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Language
         fields = '__all__'
 
-class UrlsSerializer(serializers.ModelSerializer):
+class UrlsSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     class Meta:
         model = Urls
         fields = '__all__'
 
-class SongSerializer(serializers.ModelSerializer):
-    artist = ArtistSerializer(many=True, read_only=True)
-    composer = ComposerSerializer(many=True, read_only=True)
-    lyricist = LyricistSerializer(many=True, read_only=True)
-    language = LanguageSerializer(many=True, read_only=True)
-    tags = TagSerializer(many=True, read_only=True)
-    urls = UrlsSerializer(many=True, read_only=True)
-    created_by = UserSerializer(read_only=True)
+class SongSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
+    artist = ArtistSerializer(source='song_artist', many=True, read_only=True)
+    composer = ComposerSerializer(source='song_composer', many=True, read_only=True)
+    lyricist = LyricistSerializer(source='song_lyricist', many=True, read_only=True)
+    language = LanguageSerializer(source='song_language', many=True, read_only=True)
+    tags = TagSerializer(source='song_tags', many=True, read_only=True)
+    urls = UrlsSerializer(source='song_urls', many=True, read_only=True)
+    created_by = UserSerializer(source='song_created_by', read_only=True)
+    # credits use explicit through models, which ModelSerializer would make read-only.
+    # Responses carry the nested credits above, so the ids are only written
+    song_artist = serializers.PrimaryKeyRelatedField(
+        many=True, allow_empty=False, write_only=True, queryset=Artist.objects.all(),
+    )
+    song_composer = serializers.PrimaryKeyRelatedField(
+        many=True, allow_empty=False, write_only=True, queryset=Composer.objects.all(),
+    )
+    song_lyricist = serializers.PrimaryKeyRelatedField(
+        many=True, allow_empty=False, write_only=True, queryset=Lyricist.objects.all(),
+    )
+    song_language = serializers.PrimaryKeyRelatedField(
+        many=True, allow_empty=False, write_only=True, queryset=Language.objects.all(),
+    )
+    song_tags = serializers.PrimaryKeyRelatedField(many=True, allow_empty=False, write_only=True, queryset=Tag.objects.all())
 
     class Meta:
         model = SongModel
         fields = '__all__'
+        read_only_fields = ['like_count', 'love_count', 'comment_count', 'save_count']
+        extra_kwargs = {'song_urls': {'write_only': True}}
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     follower = UserSerializer(read_only=True)
     followed = UserSerializer(read_only=True)
 
@@ -69,7 +281,7 @@ class FollowSerializer(serializers.ModelSerializer):
         model = Follow
         fields = '__all__'
 
-class ReactionSerializer(serializers.ModelSerializer):
+class ReactionSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     post = SongSerializer(read_only=True)
 
@@ -77,7 +289,7 @@ class ReactionSerializer(serializers.ModelSerializer):
         model = Reaction
         fields = '__all__'
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     post = SongSerializer(read_only=True)
 
@@ -85,7 +297,7 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = '__all__'
 
-class SavedPostSerializer(serializers.ModelSerializer):
+class SavedPostSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
     post = SongSerializer(read_only=True)
 
@@ -93,21 +305,21 @@ class SavedPostSerializer(serializers.ModelSerializer):
         model = SavedPost
         fields = '__all__'
 
-class NotebookSerializer(serializers.ModelSerializer):
+class NotebookSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
 
     class Meta:
         model = Notebook
         fields = '__all__'
 
-class FolderSerializer(serializers.ModelSerializer):
+class FolderSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     notebook = NotebookSerializer(read_only=True)
 
     class Meta:
         model = Folder
         fields = '__all__'
 
-class ListItemSerializer(serializers.ModelSerializer):
+class ListItemSerializer(SparseFieldsMixin, EagerLoadingMixin, serializers.ModelSerializer):
     folder = FolderSerializer(read_only=True)
     post = SongSerializer(read_only=True)
 
@@ -1,12 +1,190 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, pre_delete, pre_save, m2m_changed
 from django.dispatch import receiver
 from django.conf import settings
-from .models import Profile, CustomUser  # Adjust as necessary
+from django.utils import timezone
+from .models import (  # Adjust as necessary
+    Profile, CustomUser, SongModel, Follow, Reaction, Comment, SavedPost,
+    Artist, Composer, Lyricist, Language, Tag, Urls
+)
+from . import cache as response_cache
+from .search import get_backend
+from .counters import REACTION_COUNTERS, bump
+from .feed import get_feed
+from .credits import CREDIT_MODELS, index_for_model
+from . import graph, tasks, trending
 
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
 def create_user_profile(sender, instance, created, **kwargs):
-    print("Signal triggered")
     if created:
         Profile.objects.create(user=instance)
-        print("Profile created")
-        
\ No newline at end of file
+
+
+# Keep the lyric search index in sync with SongModel
+@receiver(post_save, sender=SongModel)
+def index_song(sender, instance, raw=False, **kwargs):
+    if raw:  # loaddata, the index is rebuilt with rebuild_search_index
+        return
+    get_backend().index(instance)
+
+@receiver(post_delete, sender=SongModel)
+def unindex_song(sender, instance, **kwargs):
+    get_backend().remove(instance.pk)
+
+
+# Denormalized song counters
+@receiver(pre_save, sender=Reaction)
+def remember_counted_reaction(sender, instance, raw=False, **kwargs):
+    # an update may change the type (Like -> Love), which moves the count
+    instance._counted = None
+    if instance.pk and not raw:
+        instance._counted = Reaction.objects.filter(pk=instance.pk).values_list('post_id', 'reaction').first()
+
+@receiver(post_save, sender=Reaction)
+def count_reaction(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    counted = getattr(instance, '_counted', None)
+    if created:
+        bump(instance.post_id, REACTION_COUNTERS[instance.reaction], 1)
+    elif counted is not None and counted != (instance.post_id, instance.reaction):
+        post_id, reaction = counted
+        bump(post_id, REACTION_COUNTERS[reaction], -1)
+        bump(instance.post_id, REACTION_COUNTERS[instance.reaction], 1)
+
+@receiver(post_delete, sender=Reaction)
+def uncount_reaction(sender, instance, **kwargs):
+    bump(instance.post_id, REACTION_COUNTERS[instance.reaction], -1)
+
+@receiver(post_save, sender=Comment)
+def count_comment(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(instance.post_id, 'comment_count', 1)
+
+@receiver(post_delete, sender=Comment)
+def uncount_comment(sender, instance, **kwargs):
+    bump(instance.post_id, 'comment_count', -1)
+
+@receiver(post_save, sender=SavedPost)
+def count_save(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump(instance.post_id, 'save_count', 1)
+
+@receiver(post_delete, sender=SavedPost)
+def uncount_save(sender, instance, **kwargs):
+    bump(instance.post_id, 'save_count', -1)
+
+
+# Trending scores (trending.py), buffered per process
+def trend(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        trending.record(instance)
+
+for activity_model in trending.WEIGHTS:
+    post_save.connect(trend, sender=activity_model)
+
+
+# Follower / following counters on Profile
+@receiver(post_save, sender=Follow)
+def count_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        for field, counter in graph.COUNT_FIELDS.items():
+            graph.bump(getattr(instance, f'{field}_id'), counter, 1)
+
+@receiver(post_delete, sender=Follow)
+def uncount_follow(sender, instance, **kwargs):
+    for field, counter in graph.COUNT_FIELDS.items():
+        graph.bump(getattr(instance, f'{field}_id'), counter, -1)
+
+
+# Home feed fan-out (no-ops unless FEED_STRATEGY = 'write')
+@receiver(post_save, sender=SongModel)
+def fan_out_song(sender, instance, created, raw=False, **kwargs):
+    # a FeedEntry per follower is written by the task queue, the read strategy has nothing to do
+    if created and not raw and get_feed().name == 'write':
+        tasks.fan_out_song.delay(instance.pk)
+
+@receiver(post_save, sender=Follow)
+def fan_out_follow(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        get_feed().on_follow(instance)
+
+@receiver(post_delete, sender=Follow)
+def fan_out_unfollow(sender, instance, **kwargs):
+    get_feed().on_unfollow(instance)
+
+
+# Response cache invalidation. Credits are rendered inside SongSerializer
+# through the song_* fields, so a credit change invalidates the songs that
+# list it there, and moves their song_updated_at so ETags change too.
+CREDIT_FIELDS = {
+    Artist: 'song_artist',
+    Composer: 'song_composer',
+    Lyricist: 'song_lyricist',
+    Language: 'song_language',
+    Tag: 'song_tags',
+    Urls: 'song_urls',
+}
+
+def songs_crediting(model, pks):
+    return set(SongModel.objects.filter(**{CREDIT_FIELDS[model] + '__in': pks}).values_list('pk', flat=True))
+
+def song_content_changed(song_ids):
+    if song_ids:
+        SongModel.objects.filter(pk__in=song_ids).update(song_updated_at=timezone.now())
+        response_cache.invalidate_songs(song_ids)
+
+@receiver(post_save, sender=SongModel)
+def invalidate_saved_song(sender, instance, created, **kwargs):
+    response_cache.invalidate_songs([instance.pk])
+    if created:
+        response_cache.invalidate_lists(instance.song_created_by_id)
+
+@receiver(post_delete, sender=SongModel)
+def invalidate_deleted_song(sender, instance, **kwargs):
+    response_cache.invalidate_songs([instance.pk])
+    response_cache.invalidate_lists(instance.song_created_by_id)
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_song_creator(sender, instance, created, update_fields=None, **kwargs):
+    # created_by is rendered inside every song of the user; logins only save last_login
+    if not created and (update_fields is None or {'username', 'email'} & set(update_fields)):
+        song_content_changed(list(instance.created_songs.values_list('pk', flat=True)))
+
+def invalidate_credit(sender, instance, **kwargs):
+    song_content_changed(list(songs_crediting(sender, [instance.pk])))
+
+def invalidate_credit_m2m(sender, instance, action, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if action == 'pre_clear':
+        # clear() sends no pk_set, read the rows that are about to go
+        source = next(f for f in sender._meta.fields if f.is_relation and f.related_model is type(instance))
+        target = next(f for f in sender._meta.fields if f.is_relation and f.related_model is model)
+        pk_set = set(sender.objects.filter(**{source.name: instance.pk}).values_list(target.attname, flat=True))
+
+    if isinstance(instance, SongModel):
+        songs, credit_model, credits = {instance.pk}, model, pk_set
+    else:
+        songs, credit_model, credits = set(pk_set), type(instance), {instance.pk}
+    # <Credit>.songs is also rendered, inside the nested credits
+    songs |= songs_crediting(credit_model, credits)
+    song_content_changed(list(songs))
+
+for credit_model, field in CREDIT_FIELDS.items():
+    post_save.connect(invalidate_credit, sender=credit_model)
+    pre_delete.connect(invalidate_credit, sender=credit_model)  # before the m2m rows cascade away
+    # song.song_artist and artist.songs share this through model
+    m2m_changed.connect(invalidate_credit_m2m, sender=SongModel._meta.get_field(field).remote_field.through)
+
+
+# Trigram index of credit names (credits.py), for this process
+def index_credit_name(sender, instance, raw=False, **kwargs):
+    if not raw:
+        index_for_model(sender).add(instance.pk, instance.normalized_name)
+
+def unindex_credit_name(sender, instance, **kwargs):
+    index_for_model(sender).discard(instance.pk)
+
+for credit_model in CREDIT_MODELS.values():
+    post_save.connect(index_credit_name, sender=credit_model)
+    post_delete.connect(unindex_credit_name, sender=credit_model)
@@ -0,0 +1,68 @@
+# startup.py
+"""
+Cold-start measurement for the serverless (Vercel) deployment, used by
+`manage.py profile_startup` and the cold-start budget test.
+
+A boot is a fresh interpreter importing lyriclib.wsgi (settings, app
+registry, middleware) and resolving one API URL, which loads the URLconf:
+what a serverless function pays before answering its first request.
+
+LEAN_BOOT=1 (on by default when VERCEL is set) skips admin autodiscovery
+at startup and builds the admin URLs when they are first needed (see
+lyriclib/urls.py); drf_yasg is only imported when the schema pages are
+requested, and Pillow when an image is processed.
+"""
+import json
+import os
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+
+# seconds; a lean boot must stay under it, see tests.py
+COLD_START_BUDGET = float(os.environ.get('COLD_START_BUDGET', 2.0))
+
+# modules a lean boot must not import
+LAZY_MODULES = ['drf_yasg.views', 'drf_yasg.generators', 'myapi.admin', 'PIL.Image']
+
+BOOT_SCRIPT = """
+import json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'lyriclib.settings')
+from lyriclib.wsgi import application
+from django.urls import resolve
+resolve('/songs/')
+print(json.dumps({
+    'seconds': time.perf_counter() - started,
+    'modules': [name for name in %r if name in sys.modules],
+}))
+"""
+
+
+def boot(lean=True, importtime=False):
+    """
+    Boot the app in a fresh interpreter. Returns (wall seconds including
+    interpreter start, {'seconds': in-process boot time, 'modules': lazy
+    modules that got imported}, stderr).
+    """
+    env = dict(os.environ, LEAN_BOOT='1' if lean else '0')
+    command = [sys.executable] + (['-X', 'importtime'] if importtime else []) + ['-c', BOOT_SCRIPT % LAZY_MODULES]
+    started = time.perf_counter()
+    process = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - started
+    return wall, json.loads(process.stdout.strip().splitlines()[-1]), process.stderr
+
+
+def parse_importtime(stderr):
+    """
+    [(module, self microseconds, cumulative microseconds)] from the output
+    of python -X importtime.
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        rows.append((module.strip(), int(self_us), int(cumulative_us)))
+    return rows
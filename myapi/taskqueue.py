@@ -0,0 +1,256 @@
+# taskqueue.py
+"""
+Background tasks without a broker.
+
+A task is a function registered with @task. task.delay(*args) stores a Job
+row (the arguments as JSON) in the default database, so queued work
+survives restarts, and the job is run by one of:
+  - TASK_QUEUE_WORKERS daemon threads in the web process, started and woken
+    when the transaction that queued the job commits;
+  - `manage.py run_task_workers`, dedicated worker processes.
+
+Workers claim a job with a conditional UPDATE (only if it is still queued),
+so any number of threads and processes can share the table. A task runs in
+a transaction; when it raises, the job is queued again after an exponential
+backoff until max_attempts, then kept as failed with the traceback. A job
+whose worker died is claimed again once LEASE_SECONDS have passed, so tasks
+must be safe to run twice. stats() reports queue depth and latency, also at
+/tasks/stats/ for admins.
+
+TASK_QUEUE_EAGER runs tasks inline in .delay() instead (the test suite's
+APITestCase turns it on); arguments still go through JSON.
+"""
+import json
+import logging
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+QUEUED, RUNNING, DONE, FAILED = 'queued', 'running', 'done', 'failed'
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 2.0  # seconds before the first retry, doubled after every failure
+BACKOFF_MAX = 600.0
+LEASE_SECONDS = 300  # a job running longer than this lost its worker
+POLL_INTERVAL = 2.0  # seconds an idle worker waits before looking again
+LATENCY_SAMPLE = 100  # latest finished jobs the latency metrics average over
+KEEP_DONE_DAYS = 7
+
+_registry = {}
+
+
+class Task:
+    def __init__(self, func, max_attempts):
+        self.func = func
+        self.name = f'{func.__module__}.{func.__name__}'
+        self.max_attempts = max_attempts
+        self.__doc__ = func.__doc__
+
+    def __call__(self, *args, **kwargs):
+        return self.func(*args, **kwargs)
+
+    def delay(self, *args, **kwargs):
+        """
+        Queue a call. Returns the Job, or None when run eagerly.
+        """
+        payload = json.dumps({'args': args, 'kwargs': kwargs})
+        if getattr(settings, 'TASK_QUEUE_EAGER', False):
+            decoded = json.loads(payload)
+            self.func(*decoded['args'], **decoded['kwargs'])
+            return None
+        job = Job.objects.create(name=self.name, payload=payload, max_attempts=self.max_attempts)
+        transaction.on_commit(get_pool().wake)
+        return job
+
+
+def task(func=None, max_attempts=MAX_ATTEMPTS):
+    """
+    Register a task: @task or @task(max_attempts=3).
+    """
+    def register(func):
+        registered = Task(func, max_attempts)
+        _registry[registered.name] = registered
+        return registered
+    return register(func) if func is not None else register
+
+
+def backoff(attempts):
+    return min(BACKOFF_BASE * 2 ** (attempts - 1), BACKOFF_MAX)
+
+
+def claim():
+    """
+    Take the oldest ready job, or one whose worker died. Returns the Job or
+    None.
+    """
+    now = timezone.now()
+    candidates = [
+        Job.objects.filter(status=QUEUED, run_after__lte=now).order_by('run_after', 'id'),
+        Job.objects.filter(status=RUNNING, started_at__lt=now - timedelta(seconds=LEASE_SECONDS)).order_by('id'),
+    ]
+    for queryset in candidates:
+        for job in queryset[:10]:
+            # another worker may get there first, then try the next one
+            taken = Job.objects.filter(pk=job.pk, status=job.status, attempts=job.attempts).update(
+                status=RUNNING, started_at=now, attempts=F('attempts') + 1,
+            )
+            if taken:
+                job.status, job.started_at, job.attempts = RUNNING, now, job.attempts + 1
+                return job
+    return None
+
+
+def run_job(job):
+    """
+    Run a claimed job and record the outcome. Returns whether it succeeded.
+    """
+    registered = _registry.get(job.name)
+    try:
+        if registered is None:
+            raise LookupError(f'No task named {job.name!r} is registered')
+        if job.attempts > job.max_attempts:
+            raise RuntimeError('Gave up after its worker was lost on the last attempt')
+        payload = json.loads(job.payload)
+        with transaction.atomic():
+            registered.func(*payload['args'], **payload['kwargs'])
+    except Exception:
+        error = traceback.format_exc()
+        if registered is None or job.attempts >= job.max_attempts:
+            logger.error('task %s (job %s) failed for good:\n%s', job.name, job.pk, error)
+            Job.objects.filter(pk=job.pk).update(status=FAILED, finished_at=timezone.now(), last_error=error)
+        else:
+            delay = backoff(job.attempts)
+            logger.warning('task %s (job %s) failed, retrying in %ss:\n%s', job.name, job.pk, delay, error)
+            Job.objects.filter(pk=job.pk).update(
+                status=QUEUED, run_after=timezone.now() + timedelta(seconds=delay), last_error=error,
+            )
+        return False
+    Job.objects.filter(pk=job.pk).update(status=DONE, finished_at=timezone.now(), last_error='')
+    return True
+
+
+def run_next():
+    """
+    Claim and run one job. Returns False when none was ready.
+    """
+    job = claim()
+    if job is None:
+        return False
+    run_job(job)
+    return True
+
+
+def run_pending(limit=None):
+    """
+    Run ready jobs in this thread until there are none left (or `limit`
+    ran). Returns how many ran.
+    """
+    ran = 0
+    while (limit is None or ran < limit) and run_next():
+        ran += 1
+    return ran
+
+
+class WorkerPool:
+    """
+    Threads that run jobs until stop() is called.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.threads = []
+        self.lock = threading.Lock()
+        self.ready = threading.Event()
+        self.stopping = threading.Event()
+
+    def start(self):
+        with self.lock:
+            self.threads = [thread for thread in self.threads if thread.is_alive()]
+            while len(self.threads) < self.size:
+                thread = threading.Thread(target=self._work, name=f'task-worker-{len(self.threads)}', daemon=True)
+                thread.start()
+                self.threads.append(thread)
+
+    def wake(self):
+        if self.size:
+            self.start()
+            self.ready.set()
+
+    def stop(self, timeout=None):
+        self.stopping.set()
+        self.ready.set()
+        for thread in self.threads:
+            thread.join(timeout)
+
+    def alive(self):
+        return sum(thread.is_alive() for thread in self.threads)
+
+    def _work(self):
+        while not self.stopping.is_set():
+            try:
+                ran = run_next()
+            except DatabaseError:
+                # e.g. "database is locked" while claiming, try again later
+                logger.exception('task worker could not reach the job table')
+                ran = False
+            finally:
+                close_old_connections()
+            if not ran:
+                self.ready.wait(POLL_INTERVAL)
+                self.ready.clear()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = WorkerPool(getattr(settings, 'TASK_QUEUE_WORKERS', 2))
+    return _pool
+
+
+def stats():
+    """
+    Queue depth per status, how many jobs are ready, how long the oldest
+    ready job has waited, and average wait / run seconds of the latest
+    finished jobs.
+    """
+    now = timezone.now()
+    depth = {status: 0 for status in (QUEUED, RUNNING, DONE, FAILED)}
+    depth.update(Job.objects.order_by().values_list('status').annotate(total=Count('pk')))
+    ready = Job.objects.filter(status=QUEUED, run_after__lte=now)
+    oldest = ready.aggregate(oldest=Min('run_after'))['oldest']
+    latest = list(
+        Job.objects.filter(status=DONE).order_by('-id').values_list('created_at', 'started_at', 'finished_at')[:LATENCY_SAMPLE]
+    )
+
+    def average(deltas):
+        return round(sum(delta.total_seconds() for delta in deltas) / len(deltas), 3) if deltas else None
+    return {
+        **depth,
+        'ready': ready.count(),
+        'oldest_ready_seconds': round((now - oldest).total_seconds(), 3) if oldest else None,
+        'wait_seconds': average([started - created for created, started, _ in latest]),
+        'run_seconds': average([finished - started for _, started, finished in latest]),
+        'local_workers': get_pool().alive(),
+    }
+
+
+def purge(days=KEEP_DONE_DAYS):
+    """
+    Delete jobs that finished successfully more than `days` ago. Returns how
+    many.
+    """
+    return Job.objects.filter(status=DONE, finished_at__lt=timezone.now() - timedelta(days=days)).delete()[0]
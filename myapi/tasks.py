@@ -0,0 +1,81 @@
+# tasks.py
+"""
+Side effects that run off the request, through the task queue
+(taskqueue.py). Tasks take ids rather than instances and may run twice.
+"""
+import shutil
+import uuid
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+from . import images
+from .feed import get_feed
+from .models import Profile, SongModel
+from .taskqueue import task
+
+
+def stage_upload(upload):
+    """
+    Move an uploaded file to TASK_STAGING_DIR for a task to pick up. Returns
+    the staged path.
+    """
+    directory = Path(settings.TASK_STAGING_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f'{uuid.uuid4().hex}{Path(upload.name).suffix}'
+    if hasattr(upload, 'temporary_file_path'):
+        # already streamed to disk (FILE_UPLOAD_HANDLERS), Django ignores the missing file on close
+        shutil.move(upload.temporary_file_path(), path)
+        return str(path)
+    with path.open('wb') as staged:
+        for chunk in upload.chunks():
+            staged.write(chunk)
+    return str(path)
+
+
+@task
+def store_profile_image(profile_id, staged_path, name):
+    """
+    Store a staged profile image and its resized variants under content
+    hashes, then point the profile at them.
+    """
+    path = Path(staged_path)
+    if not path.exists():  # stored by an earlier run
+        return
+    if Profile.objects.filter(pk=profile_id).exists():
+        with path.open('rb') as staged:
+            original = images.store_original(staged, name)
+            staged.seek(0)
+            variants = images.make_variants(staged)
+        Profile.objects.filter(pk=profile_id).update(image=original, image_variants=variants)
+    path.unlink()
+
+
+@task
+def make_profile_image_variants(profile_id):
+    """
+    Variants for an image stored before the pipeline existed, the original
+    keeps its name.
+    """
+    profile = Profile.objects.filter(pk=profile_id).first()
+    if profile is None or profile.image_variants or not default_storage.exists(profile.image.name):
+        return
+    with default_storage.open(profile.image.name, 'rb') as stored:
+        variants = images.make_variants(stored)
+    Profile.objects.filter(pk=profile_id).update(image_variants=variants)
+
+
+@task
+def fan_out_song(song_id):
+    fan_out_songs([song_id])
+
+
+@task
+def fan_out_songs(song_ids):
+    """
+    Feed entries for a batch of new songs, one job per import batch.
+    """
+    feed = get_feed()
+    for song in SongModel.objects.filter(pk__in=song_ids).only('pk', 'song_created_by'):
+        feed.on_song_created(song)
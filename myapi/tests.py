@@ -1,3 +1,1224 @@
-from django.test import TestCase
+import json
+import logging
+import os
+import tempfile
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipIf, skipUnless
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.db import DatabaseError, OperationalError, connection, transaction
+from django.test import AsyncClient, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .cache import get_cache, song_key
+from .feed import FanOutOnReadFeed, FanOutOnWriteFeed
+from . import credits, graph, images, recommendations, schema, search, taskqueue, trending
+from .sqlite import WriteQueue
+from .startup import COLD_START_BUDGET, boot
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, reading_from_replicas, replica_reads, start_replica_reads
+from .fastpath import FastJSONRenderer, FastSerializer
+from .pagination import KeysetPagination
+from .forms import ArtistForm, ProfileForm, SongModelForm
+from .models import (
+    SongModel, Profile, Follow, Reaction, Comment, SavedPost, Notebook, Folder, ListItem,
+    Artist, Composer, FeedEntry, Job, Lyricist, Language, Tag, TrendingScore, Urls
+)
+from .serializers import (
+    CommentSerializer, FollowSerializer, ListItemSerializer, ProfileSerializer, ReactionSerializer, SongSerializer,
+)
+from . import views
 
 # Create your tests here.
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], TASK_QUEUE_EAGER=True)
+class APITestCase(TestCase):
+    """
+    Fast password hashing, tasks run inline instead of on worker threads, an
+    empty response cache and, unless `username` is None, self.user logged in
+    on self.client.
+    """
+    username = 'reader'
+
+    def setUp(self):
+        get_cache().clear()
+        self.client = APIClient()
+        self.user = None
+        if self.username is not None:
+            self.user = self.make_user(self.username)
+            self.login(self.user)
+
+    def make_user(self, username, **extra):
+        return User.objects.create_user(username, f'{username}@example.com', 'password', **extra)
+
+    def login(self, user, client=None):
+        client = client or self.client
+        client.force_login(user)  # login_required on the viewsets
+        client.force_authenticate(user)  # DRF only authenticates JWTs
+        return client
+
+
+class ListQueryCountTests(APITestCase):
+    """
+    Every list endpoint must issue the same number of queries whatever the
+    number of rows it returns.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.notebook = Notebook.objects.create(user=self.user, name='Notebook')
+        self.folder = Folder.objects.create(notebook=self.notebook, name='Folder')
+
+    def make_song(self, i):
+        song = SongModel.objects.create(song_title=f'Song {i}', song_lyric='la la la', song_created_by=self.user)
+        for model in (Artist, Composer, Lyricist, Language, Tag):
+            model.objects.create(name=f'{model.__name__} {i}').songs.add(song)
+        song.song_urls.add(Urls.objects.create(url=f'https://example.com/{i}'))
+        return song
+
+    def make_rows(self, count):
+        for _ in range(count):
+            i = SongModel.objects.count()
+            song = self.make_song(i)
+            other = self.make_user(f'user{i}')
+            Follow.objects.create(follower=other, followed=self.user)
+            Reaction.objects.create(post=song, user=other, reaction='Like')
+            Comment.objects.create(post=song, user=other, content='nice')
+            SavedPost.objects.create(post=song, user=other)
+            ListItem.objects.create(folder=self.folder, post=song)
+
+    def count_queries(self, url):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries)
+
+    def assertConstantQueries(self, url):
+        self.make_rows(2)
+        few = self.count_queries(url)
+        self.make_rows(8)
+        many = self.count_queries(url)
+        self.assertEqual(few, many, f'{url} issues more queries as the page grows')
+
+    def test_songs(self):
+        self.assertConstantQueries('/songs/')
+
+    def test_follows(self):
+        self.assertConstantQueries('/follows/')
+
+    def test_reactions(self):
+        self.assertConstantQueries('/reactions/')
+
+    def test_comments(self):
+        self.assertConstantQueries('/comments/')
+
+    def test_savedposts(self):
+        self.assertConstantQueries('/savedposts/')
+
+    def test_listitems(self):
+        self.assertConstantQueries('/listitems/')
+
+    def test_users(self):
+        self.assertConstantQueries('/users/')
+
+    def test_expanded_listitems(self):
+        self.assertConstantQueries('/listitems/?expand=folder.notebook.user,post.artist')
+
+    def test_fast_path_matches_serializers(self):
+        self.make_rows(3)
+        cases = [
+            (SongSerializer, SongModel.objects.all(), views.EXPAND_ALL_SONG_FIELDS),
+            (SongSerializer, SongModel.objects.all(), {}),
+            (CommentSerializer, Comment.objects.all(), {'post': {'artist': {}}, 'user': {}}),
+            (ReactionSerializer, Reaction.objects.all(), {}),
+            (ListItemSerializer, ListItem.objects.all(), {'folder': {'notebook': {'user': {}}}}),
+            (FollowSerializer, Follow.objects.all(), {'follower': {}}),
+            (ProfileSerializer, Profile.objects.all(), {'user': {}}),
+        ]
+        renderer = JSONRenderer()
+        for serializer_class, queryset, expand in cases:
+            serializer = serializer_class(fields=None, expand=expand)
+            queryset = queryset.order_by('pk')
+            stock = serializer_class(
+                serializer_class.setup_eager_loading(queryset, serializer), many=True, fields=None, expand=expand,
+            ).data
+            fast = FastSerializer(serializer).serialize(queryset)
+            self.assertEqual(renderer.render(fast), renderer.render(stock), serializer_class.__name__)
+            self.assertEqual(FastJSONRenderer().render(fast), renderer.render(stock), serializer_class.__name__)
+
+    def test_sparse_fields(self):
+        self.make_rows(1)
+        comment = self.client.get('/comments/').json()['results'][0]
+        self.assertIsInstance(comment['post'], int)
+        self.assertIsInstance(comment['user'], int)
+
+        comment = self.client.get('/comments/?fields=id,post.song_title&expand=user').json()['results'][0]
+        self.assertEqual(set(comment), {'id', 'post'})
+        self.assertEqual(comment['post'], {'song_title': 'Song 0'})
+
+        item = self.client.get('/listitems/?fields=folder&expand=folder.notebook').json()['results'][0]
+        self.assertEqual(item['folder']['notebook']['user'], self.user.pk)
+
+        song = self.client.get('/songs/?fields=id,artist,created_by&expand=artist').json()['results'][0]
+        self.assertEqual(song['artist'][0]['name'], 'Artist 0')
+        self.assertEqual(song['created_by'], self.user.pk)
+
+
+class KeysetPaginationTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        song = SongModel.objects.create(song_title='Song', song_lyric='la la la', song_created_by=self.user)
+        self.comments = [Comment.objects.create(post=song, user=self.user, content=str(i)) for i in range(7)]
+        # identical timestamps must still page correctly on the id tie-breaker
+        Comment.objects.filter(pk__in=[c.pk for c in self.comments[2:5]]).update(created_at=self.comments[2].created_at)
+
+    def ids(self, response):
+        return [comment['id'] for comment in response.json()['results']]
+
+    def test_walks_forward_and_back(self):
+        expected = list(Comment.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+        pages, url = [], '/comments/?page_size=3'
+        while url:
+            response = self.client.get(url)
+            pages.append(self.ids(response))
+            url = response.json()['next']
+        self.assertEqual(sum(pages, []), expected)
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self.ids(response), pages[1])
+        response = self.client.get(response.json()['previous'])
+        self.assertEqual(self.ids(response), pages[0])
+        self.assertIsNone(response.json()['previous'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/comments/?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 404)
+
+
+class SearchTests:
+    """
+    The same checks for both search backends, see Fts5SearchTests and
+    InvertedSearchTests.
+    """
+    backend_class = None
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch('myapi.search._backend', self.backend_class())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def song(self, title, lyric):
+        return SongModel.objects.create(song_title=title, song_lyric=lyric, song_created_by=self.user)
+
+    def ids(self, query):
+        return [song_id for song_id, _ in search.search_songs(query)]
+
+    def test_phrase_and_prefix_queries(self):
+        close = self.song('Close', 'hold me close while we are dancing')
+        apart = self.song('Apart', 'me hold, the dance is over')
+        self.assertEqual(self.ids('"hold me"'), [close.pk])
+        self.assertEqual(set(self.ids('hold me')), {close.pk, apart.pk})
+        self.assertEqual(set(self.ids('danc*')), {close.pk, apart.pk})
+        self.assertEqual(self.ids('"hold me" danc*'), [close.pk])
+        self.assertEqual(self.ids('dance'), [apart.pk])
+        self.assertEqual(self.ids('Dánce'), [apart.pk])  # case and diacritics fold like unicode61
+
+    def test_bm25_ranking(self):
+        lyric = self.song('Nothing', 'a river runs by, a long way from here')
+        repeated = self.song('Nothing again', 'river river river, a long way from here')
+        title = self.song('River', 'a long way from here, far away and gone')
+        self.assertEqual(self.ids('river'), [title.pk, repeated.pk, lyric.pk])
+        scores = [score for _, score in search.search_songs('river')]
+        self.assertEqual(scores, sorted(scores, reverse=True))
+        self.assertGreater(scores[-1], 0)
+
+    def test_index_follows_saves_and_deletes(self):
+        song = self.song('Morning', 'sunrise over the hills')
+        self.assertEqual(self.ids('sunrise'), [song.pk])
+        song.song_lyric = 'moonrise over the sea'
+        song.save()
+        self.assertEqual(self.ids('sunrise'), [])
+        self.assertEqual(self.ids('moonrise'), [song.pk])
+        song.delete()
+        self.assertEqual(self.ids('moonrise'), [])
+
+    def test_import_indexes_each_batch_at_once(self):
+        body = 'song_title,song_lyric\nOne,first light\nTwo,second light\nThree,third light\nFour,no match\n'
+        with mock.patch.object(self.backend_class, 'index_many', autospec=True,
+                               side_effect=self.backend_class.index_many) as index_many:
+            self.client.post('/songs/bulk/?batch_size=2', body, content_type='text/csv')
+        self.assertEqual([len(call.args[1]) for call in index_many.call_args_list], [2, 2])
+        self.assertEqual(len(self.ids('light')), 3)
+        self.assertEqual(len(self.ids('"second light"')), 1)
+
+    def test_endpoint(self):
+        song = self.song('Tonight', 'we sing tonight')
+        # fts5's idf is only positive for terms in fewer than half of the songs
+        self.song('Tomorrow', 'we sing tomorrow')
+        self.song('Yesterday', 'we sang yesterday')
+        response = self.client.get('/songs/search/', {'q': 'tonight'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['backend'], self.backend_class.name)
+        self.assertEqual([result['id'] for result in data['results']], [song.pk])
+        self.assertGreater(data['results'][0]['score'], 0)
+        self.assertEqual(self.client.get('/songs/search/', {'q': ' " '}).status_code, 400)
+
+
+class Fts5SearchTests(SearchTests, APITestCase):
+    backend_class = search.Fts5Backend
+
+    def setUp(self):
+        if not search._fts5_available():  # migration 0002 only creates the table with FTS5
+            self.skipTest('SQLite was built without FTS5')
+        super().setUp()
+
+
+class InvertedSearchTests(SearchTests, APITestCase):
+    backend_class = search.InvertedIndexBackend
+
+    def test_auto_falls_back_without_fts5(self):
+        with mock.patch('myapi.search._backend', None), \
+                mock.patch('myapi.search._fts5_available', return_value=False), \
+                self.settings(LYRIC_SEARCH_BACKEND='auto'):
+            self.assertEqual(search.get_backend().name, 'inverted')
+
+
+class SongCounterTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.song = SongModel.objects.create(song_title='Song', song_lyric='la la la', song_created_by=self.user)
+
+    def counts(self):
+        self.song.refresh_from_db()
+        return [self.song.like_count, self.song.love_count, self.song.comment_count, self.song.save_count]
+
+    def test_counters_follow_creates_and_deletes(self):
+        like = Reaction.objects.create(post=self.song, user=self.user, reaction='Like')
+        Reaction.objects.create(post=self.song, user=self.user, reaction='Love')
+        comment = Comment.objects.create(post=self.song, user=self.user, content='nice')
+        Comment.objects.create(post=self.song, user=self.user, content='again')
+        SavedPost.objects.create(post=self.song, user=self.user)
+        self.assertEqual(self.counts(), [1, 1, 2, 1])
+
+        like.delete()
+        comment.delete()
+        self.assertEqual(self.counts(), [0, 1, 1, 1])
+
+    def test_changing_the_reaction_type_moves_the_count(self):
+        reaction = Reaction.objects.create(post=self.song, user=self.user, reaction='Like')
+        response = self.client.patch(f'/reactions/{reaction.pk}/', {'reaction': 'Love'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.counts(), [0, 1, 0, 0])
+
+        reaction.refresh_from_db()
+        reaction.save()  # unchanged, nothing moves
+        other = SongModel.objects.create(song_title='Other', song_lyric='la', song_created_by=self.user)
+        reaction.post = other
+        reaction.save()
+        self.assertEqual(self.counts(), [0, 0, 0, 0])
+        other.refresh_from_db()
+        self.assertEqual(other.love_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        Comment.objects.create(post=self.song, user=self.user, content='nice')
+        SongModel.objects.filter(pk=self.song.pk).update(comment_count=7, like_count=3)
+        call_command('reconcile_song_counters', stdout=StringIO())
+        self.assertEqual(self.counts(), [0, 0, 1, 0])
+
+
+class FeedTests(APITestCase):
+    username = None
+
+    def build(self):
+        reader = self.make_user('reader')
+        authors = [self.make_user(f'author{i}') for i in range(3)]
+        stranger = self.make_user('stranger')
+        for author in authors[:2]:
+            Follow.objects.create(follower=reader, followed=author)
+        expected = []
+        for i in range(13):
+            # uneven authorship so the heap has to refill some authors more than once
+            author = authors[0] if i % 3 else authors[1]
+            song = SongModel.objects.create(song_title=f'Song {i}', song_lyric='la', song_created_by=author)
+            expected.insert(0, song.pk)
+            SongModel.objects.create(song_title='Unfollowed', song_lyric='la', song_created_by=authors[2])
+            SongModel.objects.create(song_title='Stranger', song_lyric='la', song_created_by=stranger)
+        return reader, expected
+
+    def walk(self, reader):
+        client = self.login(reader, APIClient())
+        ids, url = [], '/feed/?page_size=5'
+        while url:
+            response = client.get(url).json()
+            ids.extend(song['id'] for song in response['results'])
+            url = response['next']
+        return ids
+
+    def test_fan_out_on_read(self):
+        with mock.patch('myapi.feed._feed', FanOutOnReadFeed()):
+            reader, expected = self.build()
+            self.assertEqual(self.walk(reader), expected)
+
+    def test_read_seeks_a_block_per_author(self):
+        reader, expected = self.build()
+        authors = list(Follow.objects.filter(follower=reader).values_list('followed_id', flat=True))
+        with CaptureQueriesContext(connection) as context:
+            latest = FanOutOnReadFeed()._latest(authors, expected[2], 3)
+        self.assertEqual(len(context.captured_queries), 1)
+        self.assertIn('UNION ALL', context.captured_queries[0]['sql'])
+        self.assertEqual(sorted(latest), sorted(authors))
+        for author_id, ids in latest.items():
+            older = SongModel.objects.filter(song_created_by=author_id, id__lt=expected[2]).order_by('-id')
+            self.assertEqual(ids, list(older.values_list('id', flat=True)[:3]))
+
+    def test_fan_out_on_write(self):
+        with mock.patch('myapi.feed._feed', FanOutOnWriteFeed()):
+            reader, expected = self.build()
+            self.assertEqual(self.walk(reader), expected)
+            Follow.objects.get(follower=reader, followed__username='author1').delete()
+            self.assertEqual(self.walk(reader), [pk for pk in expected if SongModel.objects.get(pk=pk).song_created_by.username == 'author0'])
+
+
+class ResponseCacheTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.song = SongModel.objects.create(song_title='Song', song_lyric='la la la', song_created_by=self.user)
+        self.artist = Artist.objects.create(name='Before')
+        self.song.song_artist.add(self.artist)
+
+    def get(self, url):
+        with CaptureQueriesContext(connection) as context:
+            data = self.client.get(url).json()
+        return data, len(context.captured_queries)
+
+    def test_detail_is_cached_and_invalidated(self):
+        url = f'/songs/{self.song.pk}/'
+        data, cold = self.get(url)
+        data, warm = self.get(url)
+        self.assertLess(warm, cold)
+
+        self.artist.name = 'After'
+        self.artist.save()
+        data, _ = self.get(url + '?expand=artist')
+        self.assertEqual(data['artist'][0]['name'], 'After')
+
+        self.song.song_artist.clear()
+        data, _ = self.get(url)
+        self.assertEqual(data['artist'], [])
+
+        Reaction.objects.create(post=self.song, user=self.user, reaction='Love')
+        data, _ = self.get(url)
+        self.assertEqual(data['love_count'], 1)
+
+    def test_credit_ids_are_only_written(self):
+        url = f'/songs/{self.song.pk}/'
+        data, _ = self.get(url)
+        self.assertFalse({'song_artist', 'song_composer', 'song_lyricist', 'song_language', 'song_tags', 'song_urls'} & set(data))
+        other = Artist.objects.create(name='Other')
+        serializer = SongSerializer(self.song, data={'song_artist': [other.pk]}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertNotIn('song_artist', serializer.data)
+        self.assertEqual(list(self.song.song_artist.all()), [other])
+        self.assertEqual(self.get(url)[0]['artist'], [other.pk])
+
+    def test_list_sees_new_songs(self):
+        self.assertEqual(len(self.get('/songs/')[0]['results']), 1)
+        SongModel.objects.create(song_title='New', song_lyric='la', song_created_by=self.user)
+        self.assertEqual(len(self.get('/songs/')[0]['results']), 2)
+
+
+class ConditionalGetTests(APITestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.song = SongModel.objects.create(song_title='Song', song_lyric='la la la', song_created_by=self.user)
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Last-Modified', response)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b'')
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail(self):
+        self.assertRevalidates(f'/songs/{self.song.pk}/', lambda: self.song.song_tags.add(Tag.objects.create(name='new')))
+
+    def test_detail_counters(self):
+        self.assertRevalidates(f'/songs/{self.song.pk}/', lambda: Comment.objects.create(post=self.song, user=self.user, content='hi'))
+
+    def test_list(self):
+        self.assertRevalidates('/songs/', lambda: SongModel.objects.create(song_title='New', song_lyric='la', song_created_by=self.user))
+
+
+class SongImportTests(APITestCase):
+    username = 'importer'
+
+    def setUp(self):
+        super().setUp()
+        self.existing = Artist.objects.create(name='Nina')
+
+    def test_csv_body(self):
+        body = (
+            'song_title,song_lyric,artists,tags\n'
+            'One,"first line\nsecond line",Nina|Sam,pop\n'
+            ',no title,Nina,\n'
+            'Two,la la,Sam,pop|rock\n'
+        )
+        response = self.client.post('/songs/bulk/?batch_size=1', body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+        one = SongModel.objects.get(song_title='One')
+        self.assertEqual(one.song_lyric, 'first line\nsecond line')
+        self.assertEqual(one.song_created_by, self.user)
+        self.assertIn(self.existing, one.song_artist.all())
+        self.assertEqual(Artist.objects.filter(name='Sam').count(), 1)
+        self.assertEqual(Tag.objects.get(name='pop').songs.count(), 2)
+
+    def test_jsonl_command(self):
+        path = self.tmp_file(
+            '{"song_title": "Three", "song_lyric": "oh", "composers": ["Ann"], "urls": ["https://example.com/3"]}\n'
+            'not json\n'
+            '{"song_title": "Four", "song_lyric": "ah", "song_speed": "NOPE"}\n'
+        )
+        out, err = StringIO(), StringIO()
+        call_command('import_songs', path, user='importer', stdout=out, stderr=err)
+        self.assertIn('Imported 1 songs', out.getvalue())
+        self.assertIn('row 2: invalid JSON', err.getvalue())
+        self.assertIn('row 3: unknown song_speed', err.getvalue())
+        song = SongModel.objects.get(song_title='Three')
+        self.assertEqual([c.name for c in song.song_composer.all()], ['Ann'])
+        self.assertEqual([u.url for u in song.song_urls.all()], ['https://example.com/3'])
+
+    def tmp_file(self, content):
+        handle, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(handle, 'w') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    @override_settings(TASK_QUEUE_EAGER=False)
+    def test_fan_out_is_one_job_per_batch(self):
+        follower = self.make_user('follower')
+        Follow.objects.create(follower=follower, followed=self.user)
+        body = 'song_title,song_lyric\nOne,la\nTwo,la\nThree,la\n'
+        with mock.patch('myapi.feed._feed', FanOutOnWriteFeed()):
+            self.client.post('/songs/bulk/', body, content_type='text/csv')
+            self.assertEqual(FeedEntry.objects.count(), 0)
+            self.assertEqual(list(Job.objects.values_list('name', flat=True)), ['myapi.tasks.fan_out_songs'])
+            self.assertEqual(taskqueue.run_pending(), 1)
+        self.assertEqual(FeedEntry.objects.filter(user=follower).count(), 3)
+
+    def test_export_round_trip(self):
+        body = 'song_title,song_lyric,artists,tags\nOne,"a\nb",Nina|Sam,pop\nTwo,c,,\n'
+        self.client.post('/songs/bulk/', body, content_type='text/csv')
+
+        response = self.client.get('/songs/export/?output=csv')
+        self.assertEqual(response.status_code, 200)
+        exported = b''.join(response.streaming_content).decode('utf-8')
+        self.assertIn('"a\nb",MODERATE,Nina|Sam,,,,pop,', exported)
+
+        response = self.client.get('/songs/export/')
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).decode('utf-8').splitlines()]
+        self.assertEqual([row['song_title'] for row in rows], ['One', 'Two'])
+        self.assertEqual(rows[0]['artists'], ['Nina', 'Sam'])
+        self.assertEqual(rows[1]['tags'], [])
+
+        out = StringIO()
+        call_command('export_songs', user='importer', chunk_size=1, stdout=out)
+        self.assertEqual(out.getvalue().count('\n'), 2)
+
+
+class AutocompleteTests(APITestCase):
+    username = 'writer'
+
+    def setUp(self):
+        super().setUp()
+        Artist.objects.bulk_create([Artist(name=f'Artist {i:02}', normalized_name=f'artist {i:02}') for i in range(30)])
+        Artist.objects.create(name='Bob')
+
+    def test_form_only_renders_selected_options(self):
+        song = SongModel.objects.create(song_title='One', song_lyric='la', song_created_by=self.user)
+        song.song_artist.add(Artist.objects.get(name='Bob'))
+        form = SongModelForm(instance=song, user=self.user)
+        with CaptureQueriesContext(connection) as queries:
+            html = str(form['song_artist'])
+        self.assertIn('>Bob</option>', html)
+        self.assertEqual(html.count('<option'), 1)
+        self.assertIn('data-autocomplete-url="/autocomplete/artist/"', html)
+        self.assertLessEqual(len(queries), 2)
+
+    def test_prefix_pages(self):
+        response = self.client.get('/autocomplete/artist/', {'q': 'Artist'})
+        page = response.json()
+        self.assertEqual(len(page['results']), 20)
+        self.assertEqual(page['results'][0]['text'], 'Artist 00')
+
+        page = self.client.get('/autocomplete/artist/', {'q': 'Artist', 'after': page['after']}).json()
+        self.assertEqual([r['text'] for r in page['results']], [f'Artist {i}' for i in range(20, 30)])
+        self.assertIsNone(page['after'])
+        self.assertEqual(self.client.get('/autocomplete/nope/').status_code, 404)
+
+
+class CreditNameTests(APITestCase):
+    username = 'namer'
+
+    def setUp(self):
+        credits._indexes.clear()  # ids are reused across test transactions
+        super().setUp()
+        self.beyonce = Artist.objects.create(name='Beyoncé')
+
+    def test_normalized_duplicates_are_rejected(self):
+        form = ArtistForm(data={'name': ' beyonce'})
+        self.assertFalse(form.is_valid())
+        self.assertIn('name', form.errors)
+
+        body = 'song_title,song_lyric,artists\nOne,la,BEYONCE|Beyoncé\n'
+        self.client.post('/songs/bulk/', body, content_type='text/csv')
+        self.assertEqual(Artist.objects.count(), 1)
+        self.assertEqual(list(SongModel.objects.get().song_artist.all()), [self.beyonce])
+
+    def test_fuzzy_lookup_and_import(self):
+        response = self.client.get('/credits/lookup/', {'q': 'beyonse', 'kind': 'artist'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['id'], self.beyonce.pk)
+        self.assertEqual(self.client.get('/credits/lookup/', {'q': 'x', 'kind': 'band'}).status_code, 400)
+
+        body = 'song_title,song_lyric,artists\nOne,la,Beyonc\n'
+        self.client.post('/songs/bulk/?fuzzy=1', body, content_type='text/csv')
+        self.assertEqual(Artist.objects.count(), 1)
+        self.client.post('/songs/bulk/', body, content_type='text/csv')
+        self.assertEqual(Artist.objects.count(), 2)
+
+    def test_autocomplete_folds_case_and_accents(self):
+        page = self.client.get('/autocomplete/artist/', {'q': 'BEYO'}).json()
+        self.assertEqual(page['results'], [{'id': self.beyonce.pk, 'text': 'Beyoncé'}])
+        page = self.client.get('/autocomplete/artist/', {'q': 'beyonse'}).json()
+        self.assertEqual(page['results'][0]['id'], self.beyonce.pk)
+
+    def test_index_notices_renames_from_other_processes(self):
+        index = credits.get_index('artist')
+        self.assertEqual(index.search('beyonse')[0][0], self.beyonce.pk)
+        # what another process's save leaves behind, without this process's signals
+        Artist.objects.filter(pk=self.beyonce.pk).update(
+            name='Shakira', normalized_name='shakira', updated_at=timezone.now() + timedelta(seconds=1),
+        )
+        with mock.patch('myapi.credits.REFRESH_SECONDS', 0):
+            self.assertEqual(index.search('beyonse'), [])
+            self.assertEqual(index.search('shakria')[0][0], self.beyonce.pk)
+
+
+@override_settings(REPLICA_DATABASES=['replica_1'])
+class ReplicaRoutingTests(APITestCase):
+    username = 'replica'
+
+    def setUp(self):
+        super().setUp()
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_use_replicas_only_when_enabled(self):
+        self.assertEqual(self.router.db_for_read(SongModel), 'default')
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(SongModel), 'default')
+            # TestCase wraps each test in a transaction, which keeps reads on the primary
+            self.assertEqual(self.router.db_for_read(SongModel), 'default')
+            with mock.patch.object(connection, 'in_atomic_block', False):
+                self.assertEqual(self.router.db_for_read(SongModel), 'replica_1')
+        self.assertFalse(self.router.allow_migrate('replica_1', 'myapi'))
+
+    def test_write_pins_user_to_primary(self):
+        with mock.patch('myapi.views.start_replica_reads', wraps=start_replica_reads) as start:
+            self.client.get('/songs/')
+        start.assert_called_once()
+
+        response = self.client.post('/songs/bulk/', 'song_title,song_lyric\nOne,la\n', content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+        get_cache().clear()  # the pin travels with the client, not in a worker's cache
+        with mock.patch('myapi.views.start_replica_reads', wraps=start_replica_reads) as start:
+            self.client.get('/songs/')
+        start.assert_not_called()
+
+        # someone else's pin doesn't apply
+        other = self.login(self.make_user('other'), APIClient())
+        other.cookies[PIN_COOKIE] = response.cookies[PIN_COOKIE].value
+        with mock.patch('myapi.views.start_replica_reads', wraps=start_replica_reads) as start:
+            other.get('/songs/')
+        start.assert_called_once()
+
+
+    def test_lagging_replica_never_fills_the_cache(self):
+        song = SongModel.objects.create(song_title='New', song_lyric='la', song_created_by=self.user)
+        serialize_ids = FastSerializer.serialize_ids
+
+        def lagging(serializer, ids):
+            # what a replica that hasn't seen the rename yet would return
+            data = serialize_ids(serializer, ids)
+            if reading_from_replicas():
+                for row in data.values():
+                    row['song_title'] = 'Old'
+            return data
+        with mock.patch.object(FastSerializer, 'serialize_ids', lagging), \
+                mock.patch.object(PrimaryReplicaRouter, 'db_for_read', return_value='default'):
+            self.assertEqual(self.client.get(f'/songs/{song.pk}/').json()['song_title'], 'New')
+            self.assertEqual(self.client.get('/songs/').json()['results'][0]['song_title'], 'New')
+        self.assertEqual(get_cache().get(song_key(song.pk))['song_title'], 'New')
+
+
+class WriteQueueTests(TestCase):
+
+    def failing(self, message, succeed_after=None):
+        attempts = []
+
+        def write():
+            attempts.append(1)
+            if succeed_after is not None and len(attempts) > succeed_after:
+                return 'written'
+            raise OperationalError(message)
+        return write, attempts
+
+    def test_retries_locked_writes_a_bounded_number_of_times(self):
+        queue = WriteQueue(retries=2, delay=0)
+        write, attempts = self.failing('database is locked', succeed_after=2)
+        self.assertEqual(queue.run(write), 'written')
+
+        write, attempts = self.failing('database is locked')
+        with self.assertRaises(OperationalError):
+            queue.run(write)
+        self.assertEqual(len(attempts), 3)
+
+        write, attempts = self.failing('no such table: x')
+        with self.assertRaises(OperationalError):
+            queue.run(write)
+        self.assertEqual(len(attempts), 1)
+
+
+class AsyncReadTests(APITestCase):
+    username = 'async'
+
+    def setUp(self):
+        super().setUp()
+        self.other = self.make_user('other')
+        for i in range(3):
+            song = SongModel.objects.create(song_title=f'Song {i}', song_lyric='la', song_created_by=self.user)
+            Comment.objects.create(post=song, user=self.other, content=f'Comment {i}')
+        Follow.objects.create(follower=self.user, followed=self.other)
+        token = AccessToken.for_user(self.user)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+        self.jwt_client = APIClient()  # the async views only see the bearer token
+
+    def test_matches_sync_endpoints(self):
+        for path in ('songs/', 'follows/', 'comments/'):
+            expected = self.client.get(f'/{path}?page_size=2').json()
+            actual = self.jwt_client.get(f'/async/{path}?page_size=2', **self.auth).json()
+            self.assertEqual(actual['results'], expected['results'])
+            self.assertEqual(bool(actual['next']), bool(expected['next']))
+
+        song = SongModel.objects.first()
+        response = self.jwt_client.get(f'/async/songs/{song.pk}/', **self.auth)
+        self.assertEqual(response.json(), self.client.get(f'/songs/{song.pk}/').json())
+        response = self.jwt_client.get(f'/async/songs/{song.pk}/', HTTP_IF_NONE_MATCH=response['ETag'], **self.auth)
+        self.assertEqual(response.status_code, 304)
+
+    def test_matches_sync_relation_filters(self):
+        third = self.make_user('third')
+        Follow.objects.create(follower=third, followed=self.user)
+        song = SongModel.objects.first()
+        for path in (f'comments/?post={song.pk}', f'follows/?followed={self.user.pk}', 'comments/?post=x'):
+            expected = self.client.get(f'/{path}')
+            actual = self.jwt_client.get(f'/async/{path}', **self.auth)
+            self.assertEqual(actual.status_code, expected.status_code)
+            if expected.status_code == 200:
+                self.assertEqual(actual.json()['results'], expected.json()['results'])
+            else:
+                self.assertEqual(actual.json(), expected.json())
+        self.assertEqual(len(self.jwt_client.get(f'/async/comments/?post={song.pk}', **self.auth).json()['results']), 1)
+
+    def test_async_views_are_not_adapted(self):
+        logger = logging.getLogger('django.request')
+        # the handler only logs adaptations with DEBUG on
+        with self.settings(DEBUG=True), self.assertLogs(logger, 'DEBUG') as logs:
+            logger.debug('loading the ASGI middleware chain')
+            ASGIHandler()
+        self.assertEqual([line for line in logs.output if 'adapted' in line], [])
+
+    @override_settings(REPLICA_DATABASES=['replica_1'])
+    async def test_async_chain_serves_and_pins(self):
+        client = AsyncClient()
+        headers = {'authorization': self.auth['HTTP_AUTHORIZATION']}
+        response = await client.get('/async/songs/', headers=headers)
+        self.assertEqual(len(response.json()['results']), 3)
+        await sync_to_async(client.force_login)(self.user)  # login_required on the viewsets
+        response = await client.post(
+            '/songs/bulk/', 'song_title,song_lyric\nOne,la\n', content_type='text/csv', headers=headers,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_requires_authentication(self):
+        self.assertEqual(self.jwt_client.get('/async/songs/').status_code, 401)
+        self.assertEqual(self.jwt_client.get('/async/songs/', HTTP_AUTHORIZATION='Bearer nope').status_code, 401)
+
+
+class ColdStartTests(TestCase):
+
+    def test_lean_boot_defers_heavy_imports(self):
+        _, result, _ = boot(lean=True)
+        self.assertEqual(result['modules'], [], 'a lean boot imported modules it should load lazily')
+
+    @skipUnless(os.environ.get('COLD_START_BUDGET'), 'wall-clock check, set COLD_START_BUDGET to run it')
+    def test_lean_boot_stays_within_budget(self):
+        # best of three, the first run also warms the OS file cache
+        wall = min(boot(lean=True)[0] for _ in range(3))
+        self.assertLess(wall, COLD_START_BUDGET, f'lean boot took {wall:.2f}s')
+
+
+class SchemaArtifactTests(TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings_override = override_settings(SCHEMA_DIR=self.directory)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        schema._artifact = None
+        self.addCleanup(setattr, schema, '_artifact', None)
+
+    def test_generate_schema_writes_hashed_artifact(self):
+        call_command('generate_schema', stdout=StringIO())
+        artifact = schema.read(schema.code_version())
+        self.assertIsNotNone(artifact)
+        self.assertTrue((self.directory / f'openapi.{artifact.digest}.json').exists())
+        self.assertIn('/songs/', json.loads(artifact.content)['paths'])
+        call_command('generate_schema', '--check', stdout=StringIO())
+
+    def test_docs_are_served_from_the_artifact(self):
+        schema.write(b'{"swagger": "2.0", "paths": {}}', schema.code_version())
+        with mock.patch.object(schema, 'generate') as generate:
+            response = self.client.get('/swagger/?format=openapi')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.content), {'swagger': '2.0', 'paths': {}})
+            cached = self.client.get('/redoc/?format=openapi', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.assertEqual(cached.status_code, 304)
+        generate.assert_not_called()
+
+    def test_stale_artifact_is_regenerated(self):
+        schema.write(b'{}', 'older code')
+        response = self.client.get('/swagger/?format=openapi')
+        self.assertIn('/songs/', json.loads(response.content)['paths'])
+        self.assertIsNotNone(schema.read(schema.code_version()))
+
+
+class QueryPlanTests(APITestCase):
+    """
+    The list queries the API serves most must be index seeks in index order:
+    no full table scan and no sort in a temporary b-tree.
+    """
+    username = None
+    # (viewset, filters); pages are ordered by the viewset's cursor_ordering
+    HOT_QUERIES = [
+        (views.CommentViewSet, {}),
+        (views.CommentViewSet, {'post_id': 1}),
+        (views.ReactionViewSet, {'post_id': 1}),
+        (views.SavedPostViewSet, {'user_id': 1}),
+        (views.FollowViewSet, {'followed_id': 1}),
+        (views.ListItemViewSet, {'folder_id': 1}),
+        (views.SongViewSet, {'song_created_by_id': 1}),
+    ]
+
+    def assertIndexed(self, queryset):
+        plan = queryset.explain()
+        table = queryset.model._meta.db_table
+        for line in plan.splitlines():
+            self.assertFalse(line.strip().endswith(f'SCAN {table}'), f'table scan:\n{queryset.query}\n{plan}')
+            self.assertNotIn('TEMP B-TREE', line, f'sorts outside the index:\n{queryset.query}\n{plan}')
+
+    def test_hot_queries_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite syntax')
+        for viewset, filters in self.HOT_QUERIES:
+            ordering = viewset.cursor_ordering
+            queryset = viewset.queryset.filter(**filters).order_by(*ordering)
+            position = [1 if field.lstrip('-') == 'id' else timezone.now() for field in ordering]
+            with self.subTest(viewset=viewset.__name__, filters=filters):
+                self.assertIndexed(queryset[:21])
+                self.assertIndexed(queryset.filter(KeysetPagination.keyset_filter(ordering, position))[:21])
+
+    def test_relation_filter(self):
+        user = self.make_user('filter')
+        client = self.login(user)
+        song = SongModel.objects.create(song_title='Song', song_lyric='la', song_created_by=user)
+        other = SongModel.objects.create(song_title='Other', song_lyric='la', song_created_by=user)
+        Comment.objects.create(post=song, user=user, content='on song')
+        Comment.objects.create(post=other, user=user, content='on other')
+        results = client.get(f'/comments/?post={song.pk}').json()['results']
+        self.assertEqual([comment['content'] for comment in results], ['on song'])
+        self.assertEqual(client.get('/comments/?post=nope').status_code, 400)
+
+
+class SocialGraphTests(APITestCase):
+    username = 'alice'
+
+    def setUp(self):
+        super().setUp()
+        self.alice = self.user
+        self.bob, self.carol, self.dave = [self.make_user(name) for name in ('bob', 'carol', 'dave')]
+
+    def test_follow_endpoints_keep_counts(self):
+        response = self.client.post(f'/users/{self.bob.pk}/follow/')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['following'], True)
+        self.assertEqual(self.client.post(f'/users/{self.bob.pk}/follow/').status_code, 200)
+        self.assertEqual(graph.counts([self.alice.pk, self.bob.pk]), {
+            self.alice.pk: {'follower_count': 0, 'following_count': 1},
+            self.bob.pk: {'follower_count': 1, 'following_count': 0},
+        })
+        self.assertEqual(self.client.post(f'/users/{self.alice.pk}/follow/').status_code, 400)
+
+        self.assertEqual(self.client.delete(f'/users/{self.bob.pk}/follow/').status_code, 204)
+        self.assertEqual(graph.counts([self.bob.pk])[self.bob.pk]['follower_count'], 0)
+
+    def test_relationships_and_mutuals(self):
+        graph.follow(self.alice.pk, self.bob.pk)
+        graph.follow(self.bob.pk, self.alice.pk)
+        graph.follow(self.alice.pk, self.carol.pk)
+        graph.follow(self.carol.pk, self.dave.pk)
+        graph.follow(self.bob.pk, self.dave.pk)
+
+        ids = [self.bob.pk, self.carol.pk, self.dave.pk]
+        with self.assertNumQueries(1):
+            relations = graph.relationships(self.alice.pk, ids)
+        self.assertEqual(relations[self.bob.pk], {'following': True, 'followed_by': True})
+        self.assertEqual(relations[self.carol.pk], {'following': True, 'followed_by': False})
+        self.assertEqual(relations[self.dave.pk], {'following': False, 'followed_by': False})
+
+        self.assertEqual(list(graph.mutuals(self.alice.pk)), [self.bob.pk])
+        social = self.client.get(f'/users/{self.dave.pk}/social/').json()
+        self.assertEqual(social['follower_count'], 2)
+        self.assertEqual(sorted(social['followed_by_followees']), [self.bob.pk, self.carol.pk])
+
+        results = self.client.get(f'/users/relationships/?ids={self.bob.pk},{self.dave.pk}').json()['results']
+        self.assertEqual([(result['id'], result['following']) for result in results], [(self.bob.pk, True), (self.dave.pk, False)])
+        self.assertEqual(results[0]['follower_count'], 1)
+
+    def test_reconcile_fixes_drift(self):
+        graph.follow(self.alice.pk, self.bob.pk)
+        Profile.objects.filter(user=self.bob).update(follower_count=7)
+        self.assertEqual(graph.reconcile(Profile.objects.all()), 1)
+        self.assertEqual(graph.counts([self.bob.pk])[self.bob.pk]['follower_count'], 1)
+
+        Profile.objects.filter(user=self.alice).update(following_count=4)
+        out = StringIO()
+        call_command('reconcile_follow_counts', batch_size=1, stdout=out)
+        self.assertIn('Fixed 1 profiles', out.getvalue())
+        self.assertEqual(graph.counts([self.alice.pk])[self.alice.pk]['following_count'], 1)
+
+
+class RecommendationTests(APITestCase):
+    username = 'alice'
+
+    def setUp(self):
+        super().setUp()
+        self.alice = self.user
+        self.bob, self.carol, self.dave = [self.make_user(name) for name in ('bob', 'carol', 'dave')]
+        self.songs = [
+            SongModel.objects.create(song_title=f'Song {i}', song_lyric='la', song_created_by=self.dave) for i in range(4)
+        ]
+        rock, jazz = Tag.objects.create(name='rock'), Tag.objects.create(name='jazz')
+        rock.songs.add(self.songs[0], self.songs[1])
+        jazz.songs.add(self.songs[2], self.songs[3])
+        for user in (self.alice, self.bob):
+            Reaction.objects.create(post=self.songs[0], user=user, reaction='Like')
+            SavedPost.objects.create(post=self.songs[1], user=user)
+        Reaction.objects.create(post=self.songs[2], user=self.carol, reaction='Like')
+        graph.follow(self.carol.pk, self.dave.pk)
+
+    def test_build_and_serve(self):
+        call_command('build_recommendations', stdout=StringIO())
+        with self.assertNumQueries(1):
+            neighbours = recommendations.similar_songs(self.songs[0].pk)
+        self.assertEqual(neighbours[0][0], self.songs[1].pk)
+        results = self.client.get(f'/songs/{self.songs[2].pk}/similar/').json()['results']
+        self.assertEqual([song['id'] for song in results], [self.songs[3].pk])
+        self.assertEqual(self.client.get('/songs/999999/similar/').status_code, 404)
+
+        results = self.client.get(f'/users/{self.alice.pk}/suggestions/').json()['results']
+        self.assertEqual(results[0]['username'], 'bob')
+        graph.follow(self.alice.pk, self.bob.pk)
+        results = self.client.get(f'/users/{self.alice.pk}/suggestions/').json()['results']
+        self.assertNotIn('bob', [result['username'] for result in results])
+        self.assertEqual(self.client.get(f'/users/{self.bob.pk}/suggestions/').status_code, 403)
+
+    @skipIf(recommendations.sparse is None, 'NumPy and SciPy are not installed')
+    def test_engines_agree(self):
+        engagement, tags = recommendations.engagement_matrix(), recommendations.tag_matrix()
+        follows = recommendations.follow_matrix()
+
+        def scores(engine):
+            return {
+                'songs': {row: [(other, round(score, 6)) for other, score in best]
+                          for row, best in recommendations.song_neighbours(engagement, tags, engine=engine)},
+                'users': {row: [(other, round(score, 6)) for other, score in best]
+                          for row, best in recommendations.user_neighbours(engagement, tags, follows, engine=engine)},
+            }
+        self.assertEqual(scores('python'), scores('scipy'))
+
+
+@override_settings(TRENDING_CHECKPOINT_INTERVAL=0)
+class TrendingTests(APITestCase):
+    username = 'fan'
+
+    def setUp(self):
+        trending.get_index().pending.clear()  # left over from other tests
+        super().setUp()
+        self.songs = [
+            SongModel.objects.create(song_title=f'Song {i}', song_lyric='la', song_created_by=self.user) for i in range(3)
+        ]
+
+    def test_events_rank_songs(self):
+        with self.captureOnCommitCallbacks(execute=True):  # events count once committed
+            Reaction.objects.create(post=self.songs[0], user=self.user, reaction='Like')
+            SavedPost.objects.create(post=self.songs[1], user=self.user)
+            Comment.objects.create(post=self.songs[1], user=self.user, content='nice')
+        self.assertEqual(TrendingScore.objects.count(), 2 * len(trending.WINDOWS))
+
+        response = self.client.get('/songs/trending/?window=hour&page_size=1')
+        first = response.json()
+        self.assertEqual([song['id'] for song in first['results']], [self.songs[1].pk])
+        self.assertAlmostEqual(first['results'][0]['score'], 5.0, places=2)
+        second = self.client.get(first['next']).json()
+        self.assertEqual([song['id'] for song in second['results']], [self.songs[0].pk])
+        self.assertIsNone(second['next'])
+        self.assertEqual(self.client.get('/songs/trending/?window=year').status_code, 400)
+
+        before = dict(TrendingScore.objects.values_list('song_id', 'score').filter(window='day'))
+        trending.rebuild()
+        after = dict(TrendingScore.objects.values_list('song_id', 'score').filter(window='day'))
+        self.assertEqual(before.keys(), after.keys())
+        for song_id, score in before.items():
+            self.assertAlmostEqual(score, after[song_id], places=3)
+
+    def test_decay_by_window(self):
+        index = trending.TrendingIndex()
+        now = time.time()
+        index.record(self.songs[0].pk, 3.0, when=now - 2 * 60 * 60)
+        index.record(self.songs[1].pk, 1.0, when=now)
+        index.checkpoint()
+        scores = {
+            (window, song_id): trending.decayed(score, window, now)
+            for window, song_id, score in TrendingScore.objects.values_list('window', 'song_id', 'score')
+        }
+        self.assertAlmostEqual(scores['hour', self.songs[0].pk], 0.75)
+        self.assertGreater(scores['hour', self.songs[1].pk], scores['hour', self.songs[0].pk])
+        self.assertGreater(scores['week', self.songs[0].pk], scores['week', self.songs[1].pk])
+
+        self.assertEqual(trending.prune(now=now + 30 * 24 * 60 * 60), 2 * (len(trending.WINDOWS) - 1))
+
+    @override_settings(TRENDING_CHECKPOINT_INTERVAL=60)
+    def test_rolled_back_events_never_count(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(DatabaseError), transaction.atomic():
+                Comment.objects.create(post=self.songs[0], user=self.user, content='gone')
+                raise DatabaseError('rolled back')
+        self.assertEqual(callbacks, [])
+        self.assertEqual(trending.get_index().pending, {})
+        self.assertFalse(TrendingScore.objects.exists())
+
+    @override_settings(TRENDING_CHECKPOINT_INTERVAL=60)
+    def test_failed_checkpoint_is_retried_once(self):
+        index = trending.TrendingIndex()
+        now = time.time()
+        index.record(self.songs[0].pk, 1.0, when=now)
+        index.record(self.songs[1].pk, 2.0, when=now)
+        expected = dict(index.pending)
+        with mock.patch('myapi.trending._merged', side_effect=[trending._merged(0.0), DatabaseError('locked')]):
+            with self.assertRaises(DatabaseError):
+                index.checkpoint()
+        # the first UPDATE was rolled back with the rest, so every increment is kept, once
+        self.assertEqual(index.pending, expected)
+        self.assertFalse(TrendingScore.objects.exists())
+        self.assertEqual(index.checkpoint(), len(expected))
+        scores = {(window, song_id): score for window, song_id, score in TrendingScore.objects.values_list('window', 'song_id', 'score')}
+        for key, value in expected.items():
+            self.assertAlmostEqual(scores[key], value)
+
+    def test_page_reads_the_score_index(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN is SQLite syntax')
+        queryset = TrendingScore.objects.filter(window='day').order_by(*trending.CURSOR_ORDERING)
+        queryset = queryset.filter(KeysetPagination.keyset_filter(trending.CURSOR_ORDERING, [1.0, 1]))[:21]
+        plan = queryset.explain()
+        self.assertIn('trending_window_score_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+
+@taskqueue.task(max_attempts=2)
+def failing_task(message):
+    raise ValueError(message)
+
+
+ran_tasks = []
+
+
+@taskqueue.task
+def recording_task(value):
+    ran_tasks.append(value)
+
+
+@override_settings(TASK_QUEUE_EAGER=False)
+class TaskQueueTests(APITestCase):
+    username = None
+
+    def setUp(self):
+        super().setUp()
+        ran_tasks.clear()
+
+    def test_profile_is_created_with_the_user(self):
+        user, other = self.make_user('queued', is_staff=True), self.make_user('other')
+        graph.follow(other.pk, user.pk)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(Profile.objects.get(user=user).follower_count, 1)
+
+        recording_task.delay('queued')
+        self.assertEqual(taskqueue.run_pending(), 1)
+        self.assertEqual(ran_tasks, ['queued'])
+        stats = self.login(user).get('/tasks/stats/').json()
+        self.assertEqual((stats['queued'], stats['done'], stats['ready']), (0, 1, 0))
+
+    def test_failures_are_retried_with_backoff(self):
+        job = failing_task.delay('boom')
+        with self.assertLogs('myapi.taskqueue', 'WARNING'):
+            self.assertEqual(taskqueue.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('queued', 1))
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIn('ValueError: boom', job.last_error)
+        self.assertEqual(taskqueue.run_pending(), 0)  # still backing off
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('myapi.taskqueue', 'ERROR'):
+            self.assertEqual(taskqueue.run_pending(), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_lost_jobs_are_claimed_again(self):
+        recording_task.delay('lost')
+        lost = timezone.now() - timedelta(seconds=taskqueue.LEASE_SECONDS + 1)
+        Job.objects.update(status='running', started_at=lost, attempts=1)
+        self.assertEqual(taskqueue.run_pending(), 1)
+        self.assertEqual(Job.objects.get().status, 'done')
+        self.assertEqual(ran_tasks, ['lost'])
+
+    def test_profile_image_is_stored_by_a_job(self):
+        from PIL import Image
+
+        user = self.make_user('pic')
+        image = BytesIO()
+        Image.new('RGB', (4, 4)).save(image, 'PNG')
+        upload = SimpleUploadedFile('me.png', image.getvalue(), content_type='image/png')
+        with tempfile.TemporaryDirectory() as media, self.settings(MEDIA_ROOT=media, TASK_STAGING_DIR=Path(media) / 'staging'):
+            self.login(user)
+            response = self.client.post('/profile/', {'bio': 'hello', 'image': upload})
+            self.assertEqual(response.status_code, 302)
+            profile = Profile.objects.get(user=user)
+            self.assertEqual((profile.bio, profile.image.name), ('hello', 'profile_pics/default.jpg'))
+
+            self.assertEqual(taskqueue.run_pending(), 1)
+            profile.refresh_from_db()
+            self.assertTrue(images.is_hashed(profile.image.name))
+            self.assertTrue((Path(media) / profile.image.name).exists())
+            self.assertEqual(list((Path(media) / 'staging').iterdir()), [])
+
+
+class ProfileImageTests(APITestCase):
+    username = 'avatar'
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.addCleanup(self.media.cleanup)
+        media_settings = self.settings(MEDIA_ROOT=self.media.name, TASK_STAGING_DIR=Path(self.media.name) / 'staging')
+        media_settings.enable()
+        self.addCleanup(media_settings.disable)
+        super().setUp()
+
+    def image_file(self, size=(900, 600), mode='RGBA'):
+        from PIL import Image
+
+        content = BytesIO()
+        Image.new(mode, size, (200, 30, 30, 128) if mode == 'RGBA' else (200, 30, 30)).save(content, 'PNG')
+        return SimpleUploadedFile('big.png', content.getvalue())
+
+    def upload(self, **kwargs):
+        return self.client.post('/profile/', {'image': self.image_file(**kwargs)})
+
+    def test_variants_are_served_immutable(self):
+        from PIL import Image
+
+        self.assertEqual(self.upload().status_code, 302)  # tasks run eagerly under test
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual(set(profile.image_variants), {str(size) for size in images.VARIANT_SIZES})
+        small = profile.image_variants['48']['jpg']
+        self.assertTrue(images.is_hashed(small))
+        with Image.open(Path(self.media.name) / small) as thumbnail:
+            self.assertEqual(thumbnail.size, (48, 48))
+
+        response = self.client.get(f'/media/{small}')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertEqual(self.client.get('/media/db.sqlite3').status_code, 404)
+        self.assertEqual(self.client.get('/media/profile_pics/../db.sqlite3').status_code, 404)
+
+        data = ProfileSerializer(profile).data
+        self.assertEqual(data['image_variants']['128']['webp'], f"/media/{profile.image_variants['128']['webp']}")
+
+    def test_default_image_ships_with_the_media(self):
+        default = Profile._meta.get_field('image').default
+        self.assertEqual(Profile.objects.get(user=self.user).image.name, default)
+        with override_settings(MEDIA_ROOT=settings.BASE_DIR / 'media'):
+            response = self.client.get(f'/media/{default}')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('immutable', response['Cache-Control'])
+
+    def test_same_image_is_stored_once(self):
+        self.upload(mode='RGB')
+        first = Profile.objects.get(user=self.user).image_variants
+        self.upload(mode='RGB')
+        self.assertEqual(Profile.objects.get(user=self.user).image_variants, first)
+        self.assertEqual(len(list((Path(self.media.name) / images.VARIANTS_DIR).iterdir())), 2 * len(images.VARIANT_SIZES))
+
+    def test_oversized_images_are_refused(self):
+        profile = Profile.objects.get(user=self.user)
+        with mock.patch('myapi.forms.MAX_IMAGE_PIXELS', 100):
+            form = ProfileForm({}, {'image': self.image_file(size=(20, 20))}, instance=profile)
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
@@ -0,0 +1,218 @@
+# trending.py
+"""
+"Trending now": a time-decayed activity score per song for an hour, a day
+and a week, maintained as reactions, comments and saves come in instead of
+aggregating them per request.
+
+An event of weight w at time t adds w * 2^-(now - t) / half_life to a song's
+score. Scores are kept in log space relative to a fixed EPOCH,
+log(sum of w * 2^((t - EPOCH) / half_life)), so an event only ever adds to
+the stored value and the order of songs never changes with time: the
+(window, score, song) index of TrendingScore is the leaderboard, and a
+/songs/trending/ page is one keyset seek into it. decayed() turns a stored
+value back into the score as of now.
+
+Events are merged in memory (TrendingIndex) once their transaction commits,
+and checkpointed to the table once TRENDING_CHECKPOINT_INTERVAL seconds have
+passed or MAX_PENDING songs are waiting (checked on every event and at the
+end of every request), each song with one UPDATE ... SET score =
+logaddexp(score, delta) in a single transaction, so processes never
+overwrite each other. A process that goes away loses at most one
+interval of events. Deleting a reaction doesn't lower the score: trending
+measures activity. `manage.py rebuild_trending` recomputes the table from
+the rows, `--prune` drops scores that decayed below PRUNE_BELOW.
+"""
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DatabaseError, transaction
+from django.db.models import F, Value
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.dispatch import receiver
+
+from .models import Comment, Reaction, SavedPost, SongModel, TrendingScore
+
+# window -> half-life in seconds
+WINDOWS = {
+    'hour': 60 * 60,
+    'day': 24 * 60 * 60,
+    'week': 7 * 24 * 60 * 60,
+}
+DEFAULT_WINDOW = 'day'
+WEIGHTS = {Reaction: 1.0, Comment: 2.0, SavedPost: 3.0}
+TIMESTAMP_FIELDS = {Reaction: 'created_at', Comment: 'created_at', SavedPost: 'saved_at'}
+EPOCH = 1704067200.0  # 2024-01-01 UTC, keeps the stored exponents small
+EMPTY = -1e300  # log of a zero score
+MAX_PENDING = 1000
+PRUNE_BELOW = 0.01
+BATCH_SIZE = 1000
+CURSOR_ORDERING = ('-score', '-song')
+
+
+def log_weight(weight, when, half_life):
+    return math.log(weight) + (when - EPOCH) * math.log(2) / half_life
+
+
+def logaddexp(a, b):
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed(score, window, now=None):
+    """
+    The stored log-space `score` of `window` as a plain score at `now`.
+    """
+    now = time.time() if now is None else now
+    return math.exp(score - (now - EPOCH) * math.log(2) / WINDOWS[window])
+
+
+def _stored_below(threshold, window, now):
+    # the stored value a song has when its score decayed to `threshold`
+    return math.log(threshold) + (now - EPOCH) * math.log(2) / WINDOWS[window]
+
+
+def _merged(value):
+    # logaddexp(score, value) in SQL; EMPTY rows end up as `value`. The
+    # exponent is clamped because some databases raise on underflow, past
+    # -50 the term is below float precision anyway
+    exponent = Greatest(-Abs(F('score') - Value(value)), Value(-50.0))
+    return Greatest(F('score'), Value(value)) + Ln(Value(1.0) + Exp(exponent))
+
+
+class TrendingIndex:
+    """
+    Per-process buffer of score increments, {(window, song id): log-space
+    delta}, checkpointed to TrendingScore.
+    """
+
+    def __init__(self):
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.last_checkpoint = time.monotonic()
+
+    def record(self, song_id, weight, when=None):
+        when = time.time() if when is None else when
+        with self.lock:
+            for window, half_life in WINDOWS.items():
+                key = (window, song_id)
+                value = log_weight(weight, when, half_life)
+                self.pending[key] = logaddexp(self.pending[key], value) if key in self.pending else value
+        self.checkpoint_if_due()
+
+    def checkpoint_if_due(self):
+        interval = getattr(settings, 'TRENDING_CHECKPOINT_INTERVAL', 10)
+        with self.lock:
+            due = self.pending and (
+                len(self.pending) >= MAX_PENDING * len(WINDOWS) or time.monotonic() - self.last_checkpoint >= interval
+            )
+        if due:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Write the buffered increments. Returns how many (window, song) rows
+        were touched.
+        """
+        with self.lock:
+            pending, self.pending = self.pending, {}
+            self.last_checkpoint = time.monotonic()
+        if not pending:
+            return 0
+        try:
+            return self._write(pending)
+        except DatabaseError:
+            # the UPDATEs commit together, so none of them did: keep them all
+            # for the next checkpoint
+            with self.lock:
+                for key, value in pending.items():
+                    self.pending[key] = logaddexp(self.pending[key], value) if key in self.pending else value
+            raise
+
+    @transaction.atomic(durable=True)
+    def _write(self, pending):
+        # durable: inside a caller's transaction a later rollback could undo
+        # increments that were already taken out of the buffer
+        existing = set(
+            SongModel.objects.filter(pk__in={song_id for _, song_id in pending}).values_list('pk', flat=True)
+        )
+        pending = {key: value for key, value in pending.items() if key[1] in existing}
+        TrendingScore.objects.bulk_create(
+            [TrendingScore(window=window, song_id=song_id, score=EMPTY) for window, song_id in pending],
+            batch_size=BATCH_SIZE, ignore_conflicts=True,
+        )
+        for (window, song_id), value in pending.items():
+            TrendingScore.objects.filter(window=window, song_id=song_id).update(score=_merged(value))
+        return len(pending)
+
+
+_index = TrendingIndex()
+
+
+def get_index():
+    return _index
+
+
+@receiver(request_finished)
+def checkpoint_after_request(sender, **kwargs):
+    _index.checkpoint_if_due()
+
+
+def record(instance):
+    """
+    Count a new Reaction, Comment or SavedPost once the transaction that
+    created it commits, so rolled back events never count.
+    """
+    song_id, weight = instance.post_id, WEIGHTS[type(instance)]
+    transaction.on_commit(lambda: get_index().record(song_id, weight))
+
+
+def page(window, request, paginator):
+    """
+    One page of (song id, score as of now), highest first, paginated by
+    `paginator` (a KeysetPagination) on the window's score index.
+    """
+    paginator.ordering = CURSOR_ORDERING
+    queryset = TrendingScore.objects.filter(window=window).only('score', 'song')
+    now = time.time()
+    return [(row.song_id, decayed(row.score, window, now)) for row in paginator.paginate_queryset(queryset, request)]
+
+
+def prune(now=None):
+    """
+    Delete the scores that decayed below PRUNE_BELOW. Returns how many.
+    """
+    now = time.time() if now is None else now
+    deleted = 0
+    for window in WINDOWS:
+        deleted += TrendingScore.objects.filter(
+            window=window, score__lt=_stored_below(PRUNE_BELOW, window, now),
+        ).delete()[0]
+    return deleted
+
+
+def rebuild(now=None):
+    """
+    Recompute every score from the Reaction, Comment and SavedPost rows.
+    Returns the number of rows written.
+    """
+    scores = {}
+    for model, weight in WEIGHTS.items():
+        events = model.objects.values_list('post_id', TIMESTAMP_FIELDS[model]).iterator()
+        for song_id, created in events:
+            for window, half_life in WINDOWS.items():
+                key = (window, song_id)
+                value = log_weight(weight, created.timestamp(), half_life)
+                scores[key] = logaddexp(scores[key], value) if key in scores else value
+    now = time.time() if now is None else now
+    floors = {window: _stored_below(PRUNE_BELOW, window, now) for window in WINDOWS}
+    rows = [
+        TrendingScore(window=window, song_id=song_id, score=score)
+        for (window, song_id), score in scores.items() if score >= floors[window]
+    ]
+    with transaction.atomic():
+        TrendingScore.objects.all().delete()
+        TrendingScore.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
@@ -1,14 +1,11 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include, re_path
-from rest_framework import permissions
-from drf_yasg.views import get_schema_view
-from drf_yasg import openapi
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
 )
-from . import views
+from . import async_views, images, schema, views
 
 # Create a router and register our viewsets with it.
 router = DefaultRouter()
@@ -21,19 +18,9 @@ router.register(r'notebooks', views.NotebookViewSet)
 router.register(r'folders', views.FolderViewSet)
 router.register(r'listitems', views.ListItemViewSet)
 router.register(r'users', views.UserViewSet)
-
-schema_view = get_schema_view(
-   openapi.Info(
-      title="LyricLib API",
-      default_version='v1',
-      description="API documentation for LyricLib",
-      terms_of_service="https://www.google.com/policies/terms/",
-      contact=openapi.Contact(email="contact@lyriclib.local"),
-      license=openapi.License(name="BSD License"),
-   ),
-   public=True,
-   permission_classes=(permissions.AllowAny,),
-)
+router.register(r'feed', views.FeedViewSet, basename='feed')
+router.register(r'credits', views.CreditViewSet, basename='credits')
+router.register(r'tasks', views.TaskViewSet, basename='tasks')
 
 urlpatterns = [
     path('api/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
@@ -43,6 +30,15 @@ urlpatterns = [
     path('profile/', views.profile, name='profile'),
     path('', views.homePage, name='homepage'),
 
+    # Async read endpoints for ASGI deployments
+    path('async/songs/', async_views.song_list, name='async_song_list'),
+    path('async/songs/<int:song_id>/', async_views.song_detail, name='async_song_detail'),
+    path('async/comments/', async_views.comment_list, name='async_comment_list'),
+    path('async/follows/', async_views.follow_list, name='async_follow_list'),
+
+    # Options for the autocomplete form widgets
+    path('autocomplete/<str:kind>/', views.autocomplete, name='autocomplete'),
+
     # Class-based views for SongModel
     path('songs/create/', views.SongCreateView.as_view(), name='song_create'),
     path('songs/edit/<int:song_id>/', views.create_or_edit_song, name='song_edit'),
@@ -70,8 +66,11 @@ urlpatterns = [
     # Include the router URLs
     path('', include(router.urls)),
 
-    re_path(r'^swagger/$', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
-    re_path(r'^redoc/$', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
+    re_path(r'^swagger/$', schema.swagger_ui, name='schema-swagger-ui'),
+    re_path(r'^redoc/$', schema.redoc_ui, name='schema-redoc'),
+
+    # Profile images, see images.py
+    path('media/<path:path>', images.serve_media, name='media'),
 
     # At the very end of your urlpatterns list
     path('<path:request_path>', views.catch_all, name='catch_all'),
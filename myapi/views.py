@@ -1,15 +1,42 @@
 import logging
+import hashlib
+from django.db import OperationalError, transaction
+from django.db.models import Count, Max, Sum
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 from django.shortcuts import render, redirect, HttpResponse
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.decorators import login_required
 from django.utils.decorators import method_decorator
-from rest_framework import viewsets
-from rest_framework.permissions import IsAuthenticated
+from rest_framework import viewsets, status
+from rest_framework.decorators import action
+from rest_framework.exceptions import APIException, PermissionDenied, ValidationError
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
 from django.contrib.auth.models import User
 from .forms import SongModelForm, ArtistForm, ComposerForm, LyricistForm, LanguageForm, TagForm
 from django.views.generic.edit import CreateView, UpdateView
 from django.urls import reverse_lazy
 from .permissions import IsOwnerOrReadOnly
+from . import cache as response_cache
+from .counters import COUNTER_FIELDS
+from .search import get_backend, parse_query, search_songs
+from .feed import get_feed
+from .credits import CREDIT_MODELS, MAX_RESULTS as MAX_CREDIT_RESULTS, lookup as credit_lookup
+from .importer import FORMATS, SongImporter, guess_format
+from .exporter import CONTENT_TYPES as EXPORT_CONTENT_TYPES, iter_lines, iter_songs
+from .pagination import KeysetPagination
+from .fastpath import FastJSONRenderer, FastSerializer, NotCompilable
+from . import sqlite as sqlite_profile
+from .routers import (
+    SAFE_METHODS, is_pinned, primary_reads, reading_from_replicas, start_replica_reads, stop_replica_reads,
+)
+from . import autocomplete as autocomplete_options
+from . import graph, recommendations, taskqueue, tasks, trending
 
 
 from .models import (
@@ -18,25 +45,202 @@ from .models import (
 )
 from .serializers import (
     SongSerializer, FollowSerializer, ReactionSerializer, CommentSerializer, SavedPostSerializer, 
-    NotebookSerializer, FolderSerializer, ListItemSerializer, UserSerializer
+    NotebookSerializer, FolderSerializer, ListItemSerializer, UserSerializer, selection_from_request
 )
 from .forms import ProfileForm, SongModelForm
 logger = logging.getLogger(__name__)
+MAX_RELATIONSHIPS = 100  # user ids per /users/relationships/ request
 # Apply login_required as a method decorator to class-based views
 def login_required_class_decorator(cls):
     decorator = method_decorator(login_required)
     cls.dispatch = decorator(cls.dispatch)
     return cls
 
+class EagerLoadingMixin:
+    """
+    Applies the serializer's select_related/prefetch_related plan to the
+    viewset queryset (see serializers.EagerLoadingMixin).
+    """
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        serializer_class = self.get_serializer_class()
+        if hasattr(serializer_class, 'setup_eager_loading'):
+            # plan for the fields this request selects
+            queryset = serializer_class.setup_eager_loading(queryset, self.get_serializer())
+        return queryset
+
+
+class FastSerializationMixin:
+    """
+    Renders list pages with fastpath.FastSerializer (values() rows instead of
+    field-by-field serializer rendering) and JSON with FastJSONRenderer.
+    Viewsets opt in with fast_serialization = True; selections the fast path
+    can't compile fall back to the serializer.
+    """
+    fast_serialization = False
+    renderer_classes = [FastJSONRenderer] + [
+        renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if renderer is not JSONRenderer
+    ]
+
+    def list(self, request, *args, **kwargs):
+        if not self.fast_serialization:
+            return super().list(request, *args, **kwargs)
+        try:
+            fast = FastSerializer(self.get_serializer())
+        except NotCompilable as error:
+            logger.info('%s falls back to the serializer: %s', type(self).__name__, error)
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+        # the page only needs the keys, the rows come from FastSerializer's values() query
+        ordering = getattr(self, 'cursor_ordering', KeysetPagination.ordering)
+        page = self.paginate_queryset(queryset.only('pk', *[field.lstrip('-') for field in ordering]))
+        if page is None:
+            return Response(fast.serialize(queryset))
+        data = fast.serialize_ids([obj.pk for obj in page])
+        return self.get_paginated_response([data[obj.pk] for obj in page if obj.pk in data])
+
+
+class ReplicaReadMixin:
+    """
+    Serve GET/HEAD from a read replica unless the user wrote recently
+    (see routers.py).
+    """
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and not is_pinned(request):
+            self._replica_token = start_replica_reads()
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        token = getattr(self, '_replica_token', None)
+        if token is not None:
+            self._replica_token = None
+            stop_replica_reads(token)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+def filter_relations(queryset, relation_filters, params):
+    """
+    Narrow `queryset` to ?<field>=<id> for each field of `relation_filters`
+    present in `params`. Shared with the /async/ views.
+    """
+    for field in relation_filters:
+        value = params.get(field)
+        if value is None:
+            continue
+        if not value.isdigit():
+            raise ValidationError({field: 'Must be an id.'})
+        queryset = queryset.filter(**{f'{field}_id': int(value)})
+    return queryset
+
+
+class RelationFilterMixin:
+    """
+    Narrows lists to ?<field>=<id> for the foreign keys in `relation_filters`,
+    e.g. /comments/?post=3. Each one has a (field, cursor ordering) index, see
+    models.py.
+    """
+    relation_filters = ()
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return filter_relations(queryset, self.relation_filters, self.request.query_params)
+
+
+class SerializedWriteMixin:
+    """
+    With the SQLite production profile, run creates, updates and deletes
+    through sqlite.write_queue, each in its own transaction so a locked
+    attempt can be retried.
+    """
+    def _write(self, perform, *args):
+        if not sqlite_profile.enabled():
+            return perform(*args)
+
+        def write():
+            with transaction.atomic():
+                perform(*args)
+        try:
+            sqlite_profile.write_queue.run(write)
+        except sqlite_profile.WriteQueueTimeout:
+            raise DatabaseBusy()
+        except OperationalError as error:
+            if sqlite_profile.is_locked(error):
+                raise DatabaseBusy()
+            raise
+
+    def perform_create(self, serializer):
+        self._write(super().perform_create, serializer)
+
+    def perform_update(self, serializer):
+        self._write(super().perform_update, serializer)
+
+    def perform_destroy(self, instance):
+        self._write(super().perform_destroy, instance)
+
+
+class DatabaseBusy(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'The database is busy, try again shortly.'
+    default_code = 'database_busy'
+
+
+# how songs are cached: every nested field expanded
+EXPAND_ALL_SONG_FIELDS = {name: {} for name in SongSerializer.nested_fields()}
+
+
+def cached_song_data(song_ids, context=None):
+    """
+    SongSerializer data for `song_ids`, in order, served from the response
+    cache where possible. Songs that no longer exist are skipped.
+
+    The cache holds songs with every nested field expanded; the ?fields= and
+    ?expand= selection of the request in `context` is applied on the way out.
+    Misses are read from the primary even under replica reads: the cache is
+    shared, and a lagging replica would store a song as it was before the
+    write whose invalidation already ran.
+    """
+    cached = response_cache.get_songs(song_ids)
+    missing = [song_id for song_id in song_ids if song_id not in cached]
+    if missing:
+        serializer = SongSerializer(context=context, fields=None, expand=EXPAND_ALL_SONG_FIELDS)
+        with primary_reads():
+            fresh = FastSerializer(serializer).serialize_ids(missing)
+        response_cache.set_songs(fresh)
+        cached.update(fresh)
+    fields, expand = selection_from_request((context or {}).get('request'))
+    return [SongSerializer.select(cached[song_id], fields, expand) for song_id in song_ids if song_id in cached]
+
+
+def song_etag(*parts, weak=False):
+    digest = hashlib.sha1('|'.join(map(str, parts)).encode('utf-8')).hexdigest()
+    return f'W/"{digest}"' if weak else f'"{digest}"'
+
+
+def with_validators(request, etag, last_modified, build_response):
+    """
+    Answer 304 Not Modified when If-None-Match matches `etag`, otherwise call
+    build_response(). Both carry ETag and Last-Modified. If-Modified-Since is
+    not honoured because counters change without moving song_updated_at.
+    """
+    response = get_conditional_response(request, etag=etag) or build_response()
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    return response
+
+
 def catch_all(request, request_path):
     print(f"Caught unmapped path: {request_path}")
     return HttpResponse(f"Path does not match any pattern: {request_path}", status=404)
 
 
 @login_required_class_decorator
-class UserViewSet(viewsets.ModelViewSet):
+class UserViewSet(FastSerializationMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
+    fast_serialization = True
+    cursor_ordering = ('-id',)
     permission_classes = [IsAuthenticated]  # Adjust permissions as needed
 
     def perform_create(self, serializer):
@@ -44,6 +248,66 @@ class UserViewSet(viewsets.ModelViewSet):
         user = serializer.save()
         user.set_password(serializer.validated_data['password'])
         user.save()
+
+    @action(detail=True, methods=['post', 'delete'])
+    def follow(self, request, pk=None):
+        user = self.get_object()
+        if request.method == 'DELETE':
+            graph.unfollow(request.user.pk, user.pk)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        try:
+            _, created = graph.follow(request.user.pk, user.pk)
+        except graph.SelfFollow as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            graph.summary(request.user.pk, user.pk), status=status.HTTP_201_CREATED if created else status.HTTP_200_OK,
+        )
+
+    @action(detail=True, methods=['get'])
+    def social(self, request, pk=None):
+        """
+        Follower counts, the current user's relationship with this one and a
+        few of their followers the current user follows.
+        """
+        return Response(graph.summary(request.user.pk, self.get_object().pk))
+
+    @action(detail=False, methods=['get'])
+    def relationships(self, request):
+        """
+        Follow button state for a page of users: /users/relationships/?ids=3,5,8
+        """
+        try:
+            user_ids = [int(value) for value in request.query_params.get('ids', '').split(',') if value]
+        except ValueError:
+            return Response({'detail': '"ids" must be comma separated user ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > MAX_RELATIONSHIPS:
+            return Response({'detail': f'At most {MAX_RELATIONSHIPS} ids.'}, status=status.HTTP_400_BAD_REQUEST)
+        relations = graph.relationships(request.user.pk, user_ids)
+        counts = graph.counts(user_ids)
+        return Response({'results': [
+            {'id': user_id, **relations[user_id], **counts.get(user_id, {'follower_count': 0, 'following_count': 0})}
+            for user_id in dict.fromkeys(user_ids)
+        ]})
+
+    @action(detail=True, methods=['get'])
+    def mutuals(self, request, pk=None):
+        page_size = KeysetPagination().get_page_size(request)
+        return Response({'results': list(graph.mutuals(self.get_object().pk)[:page_size])})
+
+    @action(detail=True, methods=['get'])
+    def suggestions(self, request, pk=None):
+        """
+        Who to follow, from the table `manage.py build_recommendations` fills.
+        Only visible to the user themselves.
+        """
+        user = self.get_object()
+        if user.pk != request.user.pk and not request.user.is_staff:
+            raise PermissionDenied("You can only see your own suggestions.")
+        page_size = KeysetPagination().get_page_size(request)
+        return Response({'results': [
+            {'id': user_id, 'username': username, 'score': round(score, 4)}
+            for user_id, username, score in recommendations.follow_suggestions(user.pk, page_size)
+        ]})
         
         
 
@@ -53,57 +317,305 @@ class UserViewSet(viewsets.ModelViewSet):
 
 # Song-related viewsets
 @login_required_class_decorator
-class SongViewSet(viewsets.ModelViewSet):
+class SongViewSet(FastSerializationMixin, ReplicaReadMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = SongModel.objects.all()
     serializer_class = SongSerializer
+    # list() and retrieve() go through cached_song_data, which fills the cache with FastSerializer
+    cursor_ordering = ('-id',)  # song_created_at is a TimeField, ids follow creation order
     permission_classes = [IsOwnerOrReadOnly]  # Adjust permissions as needed
     def get_queryset(self):
         """
         This view should return a list of all the posts
         for the currently authenticated user.
         """
+        if getattr(self, 'swagger_fake_view', False):
+            return super().get_queryset().none()  # schema generation has no user
         user = self.request.user
-        return SongModel.objects.filter(owner=user)
+        return super().get_queryset().filter(song_created_by=user)
 
     def perform_create(self, serializer):
-        serializer.save(owner=self.request.user)
+        serializer.save(song_created_by=self.request.user)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset()).select_related(None).prefetch_related(None)
+        summary = queryset.aggregate(
+            count=Count('pk'), updated=Max('song_updated_at'),
+            **{field: Sum(field) for field in COUNTER_FIELDS},
+        )
+        etag = song_etag(*summary.values(), weak=True)
+        return with_validators(request, etag, summary['updated'], lambda: self._list(request, queryset))
+
+    def _list(self, request, queryset):
+        # the cached page holds only song ids, their data comes from the per-song cache
+        key = response_cache.list_key(request.user.pk, request.build_absolute_uri())
+        page = response_cache.get_list(key)
+        if page is None:
+            queryset = queryset.only('pk')
+            songs = self.paginate_queryset(queryset)
+            if songs is None:
+                page = {'ids': list(queryset.values_list('pk', flat=True)), 'next': None, 'previous': None}
+            else:
+                page = {
+                    'ids': [song.pk for song in songs],
+                    'next': self.paginator.get_next_link(),
+                    'previous': self.paginator.get_previous_link(),
+                }
+            if not reading_from_replicas():  # the ids may lag behind, like the song data
+                response_cache.set_list(key, page)
+
+        results = cached_song_data(page['ids'], self.get_serializer_context())
+        if self.paginator is None:
+            return Response(results)
+        return Response({'next': page['next'], 'previous': page['previous'], 'results': results})
+
+    def retrieve(self, request, *args, **kwargs):
+        try:
+            song_id = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        # IsOwnerOrReadOnly always allows reads, so visibility is all there is to check
+        row = self.get_queryset().filter(pk=song_id).values('song_updated_at', *COUNTER_FIELDS).first()
+        if row is None:
+            raise Http404
+        etag = song_etag(song_id, *row.values())
+        return with_validators(
+            request, etag, row['song_updated_at'],
+            lambda: Response(cached_song_data([song_id], self.get_serializer_context())[0]),
+        )
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk=None):
+        """
+        Songs similar to this one, from the table `manage.py
+        build_recommendations` fills. Like search, any song can be looked up.
+        """
+        try:
+            song_id = int(pk)
+        except ValueError:
+            raise Http404
+        page_size = KeysetPagination().get_page_size(request)
+        neighbours = recommendations.similar_songs(song_id, page_size)
+        if not neighbours and not SongModel.objects.filter(pk=song_id).exists():
+            raise Http404
+        scores = dict(neighbours)
+        songs = cached_song_data([similar_id for similar_id, _ in neighbours], self.get_serializer_context())
+        return Response({'results': [dict(song, score=round(scores[song['id']], 4)) for song in songs]})
+
+    @action(detail=False, methods=['get'])
+    def trending(self, request):
+        """
+        Songs with the most recent activity, e.g. /songs/trending/?window=hour.
+        Windows are hour, day (default) and week; page with `next`.
+        """
+        window = request.query_params.get('window', trending.DEFAULT_WINDOW)
+        if window not in trending.WINDOWS:
+            return Response(
+                {'detail': f'"window" must be one of {", ".join(trending.WINDOWS)}.'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        paginator = KeysetPagination()
+        ranked = trending.page(window, request, paginator)
+        scores = dict(ranked)
+        songs = cached_song_data([song_id for song_id, _ in ranked], self.get_serializer_context())
+        return Response({
+            'window': window,
+            'next': paginator.get_next_link(),
+            'previous': paginator.get_previous_link(),
+            'results': [dict(song, score=round(scores[song['id']], 4)) for song in songs],
+        })
+
+    @action(detail=False, methods=['get'], url_path='cache-stats', permission_classes=[IsAdminUser])
+    def cache_stats(self, request):
+        return Response(response_cache.stats())
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """
+        Import songs owned by the current user from CSV or JSONL, sent either
+        as the raw body (Content-Type text/csv or application/x-ndjson) or as
+        a multipart "file". ?input_format=csv|jsonl overrides the detected
+        format, ?batch_size= sets the rows per insert batch and ?fuzzy=1
+        matches misspelt credit names to existing credits.
+        """
+        if request.content_type.startswith('multipart/form-data'):
+            upload = request.FILES.get('file')
+            if upload is None:
+                return Response({'detail': 'A "file" upload is required.'}, status=status.HTTP_400_BAD_REQUEST)
+            lines, fmt = upload, guess_format(upload.name, upload.content_type or '')
+        else:
+            # read the body line by line instead of letting a parser load it whole
+            lines, fmt = request._request, guess_format(content_type=request.content_type)
+        fmt = request.query_params.get('input_format', fmt)
+        if fmt not in FORMATS:
+            return Response(
+                {'detail': 'Send text/csv or application/x-ndjson, or pass ?input_format=csv|jsonl.'},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            batch_size = min(max(int(request.query_params.get('batch_size', 1000)), 1), 5000)
+        except ValueError:
+            return Response({'detail': '"batch_size" must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        fuzzy = request.query_params.get('fuzzy') in ('1', 'true')
+        result = SongImporter(request.user, batch_size=batch_size, fuzzy=fuzzy).run(lines, fmt)
+        code = status.HTTP_201_CREATED if result.created else status.HTTP_400_BAD_REQUEST
+        return Response(result.as_dict(), status=code)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Stream all of the current user's songs as JSONL (default) or CSV,
+        e.g. /songs/export/?output=csv
+        """
+        fmt = request.query_params.get('output', 'jsonl')
+        if fmt not in FORMATS:
+            return Response({'detail': '"output" must be csv or jsonl.'}, status=status.HTTP_400_BAD_REQUEST)
+        queryset = SongModel.objects.filter(song_created_by=request.user)
+        response = StreamingHttpResponse(iter_lines(iter_songs(queryset), fmt), content_type=EXPORT_CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="songs.{fmt}"'
+        return response
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Full-text search over song titles and lyrics, e.g.
+        /songs/search/?q="hold me" danc*&limit=20&offset=0
+        """
+        query = request.query_params.get('q', '')
+        if not parse_query(query):
+            return Response({'detail': 'A non-empty "q" parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({'detail': '"limit" and "offset" must be integers.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        hits = search_songs(query, limit=limit, offset=offset)
+        scores = dict(hits)
+        songs = cached_song_data([song_id for song_id, _ in hits], self.get_serializer_context())
+        results = [dict(song, score=round(scores[song['id']], 4)) for song in songs]
+        return Response({'query': query, 'backend': get_backend().name, 'results': results})
+
+
+@login_required_class_decorator
+class FeedViewSet(FastSerializationMixin, viewsets.GenericViewSet):
+    """
+    Latest songs from the accounts the current user follows, newest first.
+    Page with ?before=<song id> (the `next` link) and ?page_size=.
+    """
+    serializer_class = SongSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = None
+
+    def list(self, request):
+        try:
+            before = int(request.query_params['before']) if 'before' in request.query_params else None
+        except ValueError:
+            return Response({'detail': '"before" must be a song id.'}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = KeysetPagination().get_page_size(request)
+
+        song_ids = get_feed().page(request.user, before, page_size + 1)
+        has_more = len(song_ids) > page_size
+        song_ids = song_ids[:page_size]
+        results = cached_song_data(song_ids, self.get_serializer_context())
+
+        next_link = None
+        if has_more:
+            next_link = replace_query_param(request.build_absolute_uri(), 'before', song_ids[-1])
+        return Response({'next': next_link, 'results': results})
 
 
+
+@login_required_class_decorator
+class CreditViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+
+    @action(detail=False, methods=['get'])
+    def lookup(self, request):
+        """
+        Artists, composers, lyricists, languages and tags named like "q",
+        typos included, best match first, e.g.
+        /credits/lookup/?q=beyonse&kind=artist&kind=composer&limit=10
+        """
+        query = request.query_params.get('q', '')
+        kinds = request.query_params.getlist('kind') or None
+        if not query.strip():
+            return Response({'detail': 'A non-empty "q" parameter is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        if kinds and not set(kinds) <= set(CREDIT_MODELS):
+            return Response(
+                {'detail': f'"kind" must be one of {", ".join(CREDIT_MODELS)}.'}, status=status.HTTP_400_BAD_REQUEST,
+            )
+        try:
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), MAX_CREDIT_RESULTS)
+        except ValueError:
+            return Response({'detail': '"limit" must be an integer.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'query': query, 'results': credit_lookup(query, kinds=kinds, limit=limit)})
+
+
+@login_required_class_decorator
+class TaskViewSet(viewsets.ViewSet):
+    permission_classes = [IsAdminUser]
+
+    @action(detail=False, methods=['get'])
+    def stats(self, request):
+        """
+        Background task queue depth and latency.
+        """
+        return Response(taskqueue.stats())
+
 # Social feature viewsets
 @login_required_class_decorator
-class FollowViewSet(viewsets.ModelViewSet):
+class FollowViewSet(FastSerializationMixin, RelationFilterMixin, ReplicaReadMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Follow.objects.all()
     serializer_class = FollowSerializer
+    fast_serialization = True
+    relation_filters = ('followed',)
+    cursor_ordering = ('-created_at', '-id')
 
 @login_required_class_decorator
-class ReactionViewSet(viewsets.ModelViewSet):
+class ReactionViewSet(FastSerializationMixin, RelationFilterMixin, SerializedWriteMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Reaction.objects.all()
     serializer_class = ReactionSerializer
+    fast_serialization = True
+    relation_filters = ('post',)
+    cursor_ordering = ('-created_at', '-id')
 
 @login_required_class_decorator
-class CommentViewSet(viewsets.ModelViewSet):
+class CommentViewSet(FastSerializationMixin, RelationFilterMixin, SerializedWriteMixin, ReplicaReadMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
+    fast_serialization = True
+    relation_filters = ('post',)
+    cursor_ordering = ('-created_at', '-id')
 
 @login_required_class_decorator
-class SavedPostViewSet(viewsets.ModelViewSet):
+class SavedPostViewSet(FastSerializationMixin, RelationFilterMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = SavedPost.objects.all()
     serializer_class = SavedPostSerializer
+    fast_serialization = True
+    relation_filters = ('user',)
+    cursor_ordering = ('-saved_at', '-id')
 
 @login_required_class_decorator
-class NotebookViewSet(viewsets.ModelViewSet):
+class NotebookViewSet(FastSerializationMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Notebook.objects.all()
     serializer_class = NotebookSerializer
+    fast_serialization = True
+    cursor_ordering = ('-id',)
 
 @login_required_class_decorator
-class FolderViewSet(viewsets.ModelViewSet):
+class FolderViewSet(FastSerializationMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = Folder.objects.all()
     serializer_class = FolderSerializer
+    fast_serialization = True
+    cursor_ordering = ('-id',)
 
 @login_required_class_decorator
-class ListItemViewSet(viewsets.ModelViewSet):
+class ListItemViewSet(FastSerializationMixin, RelationFilterMixin, EagerLoadingMixin, viewsets.ModelViewSet):
     queryset = ListItem.objects.all()
     serializer_class = ListItemSerializer
+    fast_serialization = True
+    relation_filters = ('folder',)
+    cursor_ordering = ('-added_at', '-id')
 
 # Function-based views
 def register(request):
@@ -122,15 +634,37 @@ def register(request):
 
 @login_required
 def profile(request):
+    user_profile = request.user.profile
     if request.method == 'POST':
-        form = ProfileForm(request.POST, request.FILES, instance=request.user.profile)
+        form = ProfileForm(request.POST, request.FILES, instance=user_profile)
         if form.is_valid():
-            form.save()
+            user_profile = form.save(commit=False)
+            image = request.FILES.get('image') if 'image' in form.changed_data else None
+            # a new image is stored by the task queue, everything else right away
+            user_profile.save(update_fields=[name for name in form.fields if image is None or name != 'image'])
+            if image is not None:
+                tasks.store_profile_image.delay(user_profile.pk, tasks.stage_upload(image), image.name)
             return redirect('profile')
     else:
-        form = ProfileForm(instance=request.user.profile)
+        form = ProfileForm(instance=user_profile)
     return render(request, 'pages/profile.html', {'form': form})
 
+@login_required
+def autocomplete(request, kind):
+    """
+    Options for the autocomplete form widgets:
+    /autocomplete/artist/?q=Nin&after=<id of the last option shown>
+    """
+    if kind not in autocomplete_options.KINDS:
+        raise Http404
+    after = request.GET.get('after', '')
+    if after and not after.isdigit():
+        return JsonResponse({'detail': '"after" must be an id.'}, status=400)
+    results, next_after = autocomplete_options.lookup(
+        kind, request.GET.get('q', '').strip(), int(after) if after else None,
+    )
+    return JsonResponse({'results': results, 'after': next_after})
+
 def homePage(request):
     return render(request, 'pages/homepage.html')
 
@@ -0,0 +1,65 @@
+// Autocomplete for <select multiple data-autocomplete-url="..."> rendered by
+// myapi.autocomplete.AutocompleteSelectMultiple. The select only holds the
+// chosen options; typing in the search box fetches matching ones page by page.
+(function () {
+  function setup(select) {
+    var url = select.dataset.autocompleteUrl;
+    var input = document.createElement('input');
+    var list = document.createElement('ul');
+    var more = document.createElement('button');
+    var timer = null;
+    var after = null;
+
+    input.type = 'search';
+    input.placeholder = 'Search...';
+    input.autocomplete = 'off';
+    more.type = 'button';
+    more.textContent = 'More';
+    more.hidden = true;
+    select.parentNode.insertBefore(input, select);
+    select.parentNode.insertBefore(list, select.nextSibling);
+    list.parentNode.insertBefore(more, list.nextSibling);
+
+    function choose(option) {
+      for (var i = 0; i < select.options.length; i++) {
+        if (select.options[i].value === String(option.id)) {
+          select.options[i].selected = true;
+          return;
+        }
+      }
+      select.add(new Option(option.text, option.id, true, true));
+    }
+
+    function load(append) {
+      var params = new URLSearchParams({q: input.value.trim()});
+      if (append && after !== null) {
+        params.set('after', after);
+      }
+      fetch(url + '?' + params.toString(), {credentials: 'same-origin'})
+        .then(function (response) { return response.json(); })
+        .then(function (page) {
+          if (!append) {
+            list.innerHTML = '';
+          }
+          page.results.forEach(function (option) {
+            var item = document.createElement('li');
+            item.textContent = option.text;
+            item.addEventListener('click', function () { choose(option); });
+            list.appendChild(item);
+          });
+          after = page.after;
+          more.hidden = after === null;
+        });
+    }
+
+    input.addEventListener('input', function () {
+      clearTimeout(timer);
+      timer = setTimeout(function () { load(false); }, 250);
+    });
+    more.addEventListener('click', function () { load(true); });
+  }
+
+  document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('select[data-autocomplete-url]').forEach(setup);
+  });
+})();